@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from redis.exceptions import RedisError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+
+
+def _fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{payload}".encode()).hexdigest()
+
+
+def _scope(request, key):
+    pos = getattr(request.user, "pos", None)
+    owner = f"pos{pos.id}" if pos else "public"
+    return hashlib.sha256(f"{owner}:{request.path}:{key}".encode()).hexdigest()
+
+
+def _load(key):
+    try:
+        record = cache.get(f"idem:{key}")
+    except RedisError as e:
+        logger.warning("Idempotency store read failed, using DB", extra={"error": str(e)})
+        record = None
+    if record is None:
+        record = (
+            IdempotencyKey.objects.filter(key=key, status_code__isnull=False)
+            .values("fingerprint", "status_code", "body")
+            .first()
+        )
+    return record
+
+
+def _acquire(key, fingerprint):
+    try:
+        return cache.add(f"idem-lock:{key}", fingerprint, timeout=settings.IDEMPOTENCY_LOCK_TTL)
+    except RedisError as e:
+        logger.warning("Idempotency lock failed, using DB", extra={"error": str(e)})
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key=key, fingerprint=fingerprint)
+        return True
+    except IntegrityError:
+        return False
+
+
+def _save(key, record):
+    try:
+        cache.set(f"idem:{key}", record, timeout=settings.IDEMPOTENCY_TTL)
+        cache.delete(f"idem-lock:{key}")
+        return
+    except RedisError as e:
+        logger.warning("Idempotency store write failed, using DB", extra={"error": str(e)})
+    IdempotencyKey.objects.update_or_create(key=key, defaults=record)
+
+
+def _release(key):
+    try:
+        cache.delete(f"idem-lock:{key}")
+    except RedisError:
+        IdempotencyKey.objects.filter(key=key, status_code__isnull=True).delete()
+
+
+def _replay(record, fingerprint):
+    if record["fingerprint"] != fingerprint:
+        return Response({"error": "Idempotency-Key уже использован с другим запросом"}, status=422)
+    response = Response(record["body"], status=record["status_code"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """
+    Supports the Idempotency-Key header on write endpoints. The first response
+    (status below 500) is stored in Redis, or in the DB when Redis is down, and
+    replays are served from the store without running the view. Concurrent
+    duplicates wait for the first request for up to IDEMPOTENCY_WAIT seconds.
+    Must be applied under @api_view so the request is already authenticated.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        raw_key = request.headers.get(HEADER)
+        if not raw_key:
+            return view(request, *args, **kwargs)
+
+        key = _scope(request, raw_key)
+        fingerprint = _fingerprint(request)
+
+        record = _load(key)
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        if not _acquire(key, fingerprint):
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+            delay = 0.05
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                record = _load(key)
+                if record is not None:
+                    return _replay(record, fingerprint)
+                delay = min(delay * 2, 0.5)
+            return Response({"error": "Запрос с этим Idempotency-Key ещё выполняется"}, status=409)
+
+        # Первый запрос мог сохранить ответ и снять блокировку между _load и _acquire.
+        # Ответ записывается до снятия блокировки, поэтому повторная проверка его увидит
+        record = _load(key)
+        if record is not None:
+            _release(key)
+            return _replay(record, fingerprint)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            _release(key)
+            raise
+
+        if response.status_code >= 500:
+            _release(key)
+            return response
+
+        body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+        _save(key, {"fingerprint": fingerprint, "status_code": response.status_code, "body": body})
+        return response
+
+    return wrapper
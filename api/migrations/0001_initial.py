@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(max_length=64, unique=True, verbose_name="Ключ"),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(max_length=64, verbose_name="Отпечаток запроса"),
+                ),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="HTTP статус"
+                    ),
+                ),
+                (
+                    "body",
+                    models.JSONField(blank=True, null=True, verbose_name="Тело ответа"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Создано"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ключ идемпотентности",
+                "verbose_name_plural": "Ключи идемпотентности",
+            },
+        ),
+    ]
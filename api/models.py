@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField("Ключ", max_length=64, unique=True)
+    fingerprint = models.CharField("Отпечаток запроса", max_length=64)
+    status_code = models.PositiveSmallIntegerField("HTTP статус", null=True, blank=True)
+    body = models.JSONField("Тело ответа", null=True, blank=True)
+    created_at = models.DateTimeField("Создано", auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+
+    def __str__(self):
+        return self.key
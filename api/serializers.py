@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from pos.models import Product, Stock, Order, OrderItem
 
@@ -11,13 +12,21 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "weight", "category", "price", "barcode", "quantity"]
 
     def get_quantity(self, obj):
+        stock = self.context.get("stock")
+        if stock is not None:
+            return stock.current_quantity
         pos = self.context.get("pos")
         if pos:
             stock = obj.stocks.filter(pos=pos).first()
-            return stock.quantity if stock else 0
+            return stock.current_quantity if stock else 0
         return 0
 
 
+class ProductBatchSerializer(serializers.Serializer):
+    pos_code = serializers.CharField()
+    barcodes = serializers.ListField(child=serializers.CharField(), allow_empty=False, max_length=300)
+
+
 class OrderItemCreateSerializer(serializers.Serializer):
     barcode = serializers.CharField()
     quantity = serializers.IntegerField(min_value=1)
@@ -26,3 +35,12 @@ class OrderItemCreateSerializer(serializers.Serializer):
 class OrderCreateSerializer(serializers.Serializer):
     pos_code = serializers.CharField()
     order = OrderItemCreateSerializer(many=True)
+
+
+class PaymentOutcomeSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=["paid", "failed"])
+
+
+class PaymentOutcomeBatchSerializer(serializers.Serializer):
+    outcomes = PaymentOutcomeSerializer(many=True, allow_empty=False, max_length=settings.PAYMENT_WEBHOOK_BATCH_SIZE)
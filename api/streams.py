@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import weakref
+from contextlib import suppress
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from redis.exceptions import RedisError
+from core.auth import aauthenticate
+from core.utils.redis_client import get_async_redis
+from pos.events import FINAL_STATES, order_channel
+from pos.models import Order
+
+logger = logging.getLogger(__name__)
+
+
+async def _authenticate(request):
+    try:
+        return await aauthenticate(request)
+    except AuthenticationFailed:
+        return None
+
+
+def _event(state):
+    return f"event: state\ndata: {json.dumps({'state': state})}\n\n"
+
+
+class _Subscriber:
+    """
+    One pub/sub connection per event loop shared by every open stream. Channels are
+    subscribed while a stream listens to them, a reader task fans messages out to the
+    stream queues. The connection is closed with the last stream; if it breaks, the
+    streams get None and end, and kiosks reconnect to a new subscriber.
+    """
+
+    def __init__(self):
+        self.pubsub = get_async_redis().pubsub()
+        self.queues = {}
+        self.lock = asyncio.Lock()
+        self.reader = None
+        self.closed = False
+
+    async def subscribe(self, channel):
+        queue = asyncio.Queue()
+        async with self.lock:
+            if self.closed:
+                return None
+            if channel not in self.queues:
+                await self.pubsub.subscribe(channel)
+                self.queues[channel] = set()
+            self.queues[channel].add(queue)
+            if self.reader is None:
+                self.reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, channel, queue):
+        async with self.lock:
+            listeners = self.queues.get(channel, set())
+            listeners.discard(queue)
+            if listeners or self.closed:
+                return
+            del self.queues[channel]
+            if not self.queues:
+                await self._close()
+                return
+            try:
+                await self.pubsub.unsubscribe(channel)
+            except RedisError as e:
+                logger.warning("Order events unsubscribe failed", extra={"error": str(e)})
+
+    async def _read(self):
+        try:
+            while True:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    for queue in self.queues.get(message["channel"], ()):
+                        queue.put_nowait(message["data"])
+        except (RedisError, OSError) as e:
+            logger.warning("Order events subscriber failed", extra={"error": str(e), "channels": len(self.queues)})
+            self._forget()
+            for listeners in self.queues.values():
+                for queue in listeners:
+                    queue.put_nowait(None)
+            await self.pubsub.aclose()
+
+    def _forget(self):
+        self.closed = True
+        loop = asyncio.get_running_loop()
+        if _subscribers.get(loop) is self:
+            del _subscribers[loop]
+
+    async def _close(self):
+        self._forget()
+        if self.reader is not None and not self.reader.done():
+            self.reader.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.reader
+        await self.pubsub.aclose()
+
+
+_subscribers = weakref.WeakKeyDictionary()
+
+
+async def _listen(channel):
+    while True:
+        loop = asyncio.get_running_loop()
+        subscriber = _subscribers.get(loop)
+        if subscriber is None:
+            subscriber = _subscribers[loop] = _Subscriber()
+        queue = await subscriber.subscribe(channel)
+        if queue is not None:
+            return subscriber, queue
+
+
+async def _order_states(order_id):
+    channel = order_channel(order_id)
+    subscriber, queue = await _listen(channel)
+    try:
+        # Читаем статус после подписки, чтобы не пропустить переход между чтением и подпиской
+        state = await Order.objects.filter(id=order_id).values_list("state", flat=True).afirst()
+        yield _event(state)
+        if state in FINAL_STATES:
+            return
+
+        remaining = settings.ORDER_EVENTS_TIMEOUT
+        while remaining > 0:
+            wait = min(remaining, settings.ORDER_EVENTS_KEEPALIVE)
+            remaining -= wait
+            try:
+                data = await asyncio.wait_for(queue.get(), wait)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            # Соединение с Redis потеряно, киоск переподключится
+            if data is None:
+                return
+            state = json.loads(data)["state"]
+            yield _event(state)
+            if state in FINAL_STATES:
+                return
+    finally:
+        await subscriber.unsubscribe(channel, queue)
+
+
+@require_GET
+async def order_events(request, order_id):
+    """
+    Server-Sent Events stream of order states, replaces polling order_status.
+    Sends the current state, then every transition until a final state or
+    ORDER_EVENTS_TIMEOUT, after which the kiosk reconnects. Needs an ASGI server (SERVER_MODE=asgi).
+    """
+    if await _authenticate(request) is None:
+        return JsonResponse({"error": "Требуется авторизация"}, status=401)
+
+    if not await Order.objects.filter(id=order_id).aexists():
+        return JsonResponse({"error": "Заказ не найден"}, status=404)
+
+    response = StreamingHttpResponse(_order_states(order_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
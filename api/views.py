@@ -1,47 +1,75 @@
 import logging
-import uuid
 from django.db import transaction
-from rest_framework import serializers, status
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from core.auth import POSTokenAuthentication
-from pos.models import Product, PointOfSale, Stock, Order, OrderItem, Payment, Receipt
+from core.auth import POSTokenAuthentication, WebhookSignature, async_authenticated
+from core.utils.querystats import query_budget
+from core.utils.acquiring import AcquiringUnavailable, get_gateway
+from pos.models import PointOfSale, Order, Payment
+from pos import catalog, checkout, payments, reservations
+from pos.checkout import CheckoutError
 from pos.flow import OrderFlow, PaymentFlow
-from .serializers import ProductSerializer, OrderCreateSerializer
+from .idempotency import idempotent
+from .serializers import ProductBatchSerializer, OrderCreateSerializer, PaymentOutcomeBatchSerializer
 
 logger = logging.getLogger(__name__)
 
-def send_to_acquiring(payment: Payment):
-    return f"https://fake-acquiring.com/pay/{uuid.uuid4()}"
+@query_budget(7)
+@require_GET
+@async_authenticated
+async def product_by_barcode(request, barcode):
+    pos_code = request.GET.get("pos_code")
+
+    if not pos_code:
+        return JsonResponse({"error": "Не указан код точки продаж"}, status=400)
+
+    pos = await catalog.aget_pos(pos_code)
+    if pos is None:
+        return JsonResponse({"error": "Точка продаж не найдена"}, status=404)
 
+    product = await catalog.aget_product(pos, barcode)
+    if product is None:
+        return JsonResponse({"error": "Товар не найден или недоступен"}, status=404)
 
-@api_view(['GET'])
+    return JsonResponse((await reservations.awith_available(pos["id"], [product]))[0])
+
+
+@query_budget(8)
+@api_view(['POST'])
 @authentication_classes([SessionAuthentication, POSTokenAuthentication])
 @permission_classes([IsAuthenticated])
-def product_by_barcode(request, barcode):
-    pos_code = request.GET.get("pos_code")
-
-    if not pos_code:
-        return Response({"error": "Не указан код точки продаж"}, status=400)
+def product_batch(request):
+    serializer = ProductBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
 
-    try:
-        pos = PointOfSale.objects.get(code=pos_code)
-    except PointOfSale.DoesNotExist:
+    pos = catalog.get_pos(serializer.validated_data["pos_code"])
+    if pos is None:
         return Response({"error": "Точка продаж не найдена"}, status=404)
 
-    stock = Stock.objects.filter(pos=pos, product__barcode=barcode).first()
-    if not stock or not stock.is_active:
-        return Response({"error": "Товар не найден или недоступен"}, status=404)
+    barcodes = list(dict.fromkeys(serializer.validated_data["barcodes"]))
+    products = catalog.get_products(pos, barcodes)
+    found = reservations.with_available(pos["id"], [product for product in products.values() if product])
+    products.update({product["barcode"]: product for product in found})
 
-    serializer = ProductSerializer(stock.product, context={"pos": pos})
-    return Response(serializer.data)
+    results = []
+    for barcode in barcodes:
+        product = products[barcode]
+        if product is None:
+            results.append({"barcode": barcode, "status": "unavailable"})
+        else:
+            results.append({"barcode": barcode, "status": "found", "product": product})
+    return Response({"results": results})
 
 
+@query_budget(12)
 @api_view(['POST'])
 @authentication_classes([SessionAuthentication, POSTokenAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order(request):
     serializer = OrderCreateSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -55,26 +83,8 @@ def create_order(request):
         return Response({"error": "Точка продаж не найдена"}, status=404)
 
     try:
-        with transaction.atomic():
-            order = Order.objects.create(pos=pos)
-            for item_data in order_items_data:
-                product = Product.objects.select_for_update().filter(barcode=item_data['barcode']).first()
-                if not product:
-                    logger.warning(f"Продукт с штрихкодом {item_data['barcode']} не найден")
-                    raise serializers.ValidationError(f"Продукт с штрихкодом {item_data['barcode']} не найден")
-                stock = Stock.objects.select_for_update().filter(pos=pos, product=product).first()
-                if not stock or stock.quantity < item_data['quantity'] or not stock.is_active:
-                    logger.warning(f"Заказ №{order.id}, Недостаточно товара {product.name}")
-                order_item = OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=item_data['quantity'],
-                    price=product.price
-                )
-                stock.quantity -= item_data['quantity']
-                stock.save()
-            order.save()
-    except serializers.ValidationError as e:
+        order = checkout.create_order(pos, order_items_data)
+    except CheckoutError as e:
         logger.info("Create order validation failed", extra={"error": str(e)})
         return Response({"error": str(e)}, status=400)
 
@@ -82,9 +92,11 @@ def create_order(request):
     return Response({"order_id": order.id, "total_price": order.total_price})
 
 
+@query_budget(13)
 @api_view(['POST'])
 @authentication_classes([SessionAuthentication, POSTokenAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_payment(request):
     order_id = request.data.get("order_id")
     payment_type = request.data.get("payment_type")
@@ -107,7 +119,13 @@ def create_payment(request):
             "payment_link": existing_payment.link
         })
 
-    payment = Payment.objects.create(order=order, type=payment_type, link=send_to_acquiring(payment_type))
+    try:
+        link = get_gateway().create_payment_link(order, payment_type)
+    except AcquiringUnavailable as e:
+        logger.error("Acquiring unavailable", extra={"order_id": order.id, "error": str(e)})
+        return Response({"error": "Эквайринг недоступен, попробуйте позже"}, status=503)
+
+    payment = Payment.objects.create(order=order, type=payment_type, link=link)
 
     return Response({
         "payment_id": payment.id,
@@ -115,22 +133,23 @@ def create_payment(request):
     })
 
 
-@api_view(['GET'])
-@authentication_classes([SessionAuthentication, POSTokenAuthentication])
-@permission_classes([IsAuthenticated])
-def order_status(request, order_id):
+@query_budget(6)
+@require_GET
+@async_authenticated
+async def order_status(request, order_id):
     if not order_id:
-        return Response({"error": "order_id обязателен"}, status=400)
+        return JsonResponse({"error": "order_id обязателен"}, status=400)
 
-    try:
-        order = Order.objects.get(id=order_id)
-    except Order.DoesNotExist:
-        return Response({"error": "Заказ не найден"}, status=404)
+    state = await Order.objects.filter(id=order_id).values_list("state", flat=True).afirst()
+    if state is None:
+        return JsonResponse({"error": "Заказ не найден"}, status=404)
 
-    return Response({"state": order.state})
+    return JsonResponse({"state": state})
 
 
+@query_budget(18)
 @api_view(['POST'])
+@idempotent
 def mark_payment_paid(request):
     order_id = request.data.get("order_id")
     if not order_id:
@@ -150,11 +169,7 @@ def mark_payment_paid(request):
             order_flow.mark_paid()
             payment_flow = PaymentFlow(payment)
             payment_flow.mark_paid()
-            Receipt.objects.create(
-                payment=payment,
-                receipt_number=str(uuid.uuid4()),
-                fiscal_data=[{"name": item.product.name, "qty": item.quantity, "price": float(item.price)} for item in order.items.all()]
-            )
+            payments.create_receipts([payment])
     except Order.DoesNotExist:
         return Response({"error": "Заказ не найден"}, status=404)
 
@@ -162,7 +177,9 @@ def mark_payment_paid(request):
     return Response({"message": "Оплата помечена как PAID"})
 
 
+@query_budget(7)
 @api_view(['POST'])
+@idempotent
 def mark_payment_failed(request):
     order_id = request.data.get("order_id")
     if not order_id:
@@ -173,13 +190,17 @@ def mark_payment_failed(request):
             order = Order.objects.select_for_update().get(id=order_id)
             payment = order.payments.select_for_update().filter(state=Payment.PaymentState.PENDING).first()
             if not payment:
-                existing_failed = order.payments.filter(state=Payment.PaymentState.FAILED).first()
-                if existing_failed:
-                    logger.info("Payment already failed", extra={"order_id": order.id, "payment_id": existing_failed.id})
+                # Первый по id платёж каждого статуса одним запросом
+                settled = dict(
+                    order.payments.filter(state__in=[Payment.PaymentState.FAILED, Payment.PaymentState.PAID])
+                    .order_by("-id")
+                    .values_list("state", "id")
+                )
+                if Payment.PaymentState.FAILED in settled:
+                    logger.info("Payment already failed", extra={"order_id": order.id, "payment_id": settled[Payment.PaymentState.FAILED]})
                     return Response({"message": "Оплата уже помечена как FAILED"})
-                existing_paid = order.payments.filter(state=Payment.PaymentState.PAID).first()
-                if existing_paid:
-                    logger.warning("Tried to mark payment failed, but already paid", extra={"order_id": order.id, "payment_id": existing_paid.id})
+                if Payment.PaymentState.PAID in settled:
+                    logger.warning("Tried to mark payment failed, but already paid", extra={"order_id": order.id, "payment_id": settled[Payment.PaymentState.PAID]})
                     return Response({"error": "Оплата уже проведена (PAID), нельзя пометить как FAILED"}, status=400)
                 return Response({"error": "Нет PENDING платежа"}, status=404)
 
@@ -192,3 +213,21 @@ def mark_payment_failed(request):
 
     logger.info("Payment marked failed", extra={"order_id": order.id, "payment_id": payment.id})
     return Response({"message": "Оплата помечена как FAILED"})
+
+
+@query_budget(16)
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([WebhookSignature])
+@idempotent
+def mark_payments_batch(request):
+    """
+    Batch webhook for replayed acquirer callbacks: {"outcomes": [{"order_id", "status"}]}.
+    Responds with a result per entry in the same order.
+    """
+    serializer = PaymentOutcomeBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    results = payments.settle_outcomes(serializer.validated_data["outcomes"])
+    return Response({"results": results})
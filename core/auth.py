@@ -1,44 +1,158 @@
+import copy
+import hashlib
+import hmac
 import logging
+from functools import wraps
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import JsonResponse
 from rest_framework.authentication import BaseAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.permissions import BasePermission
+from core.utils.cache import TwoTierCache
 from pos.models import PointOfSaleToken
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+POS_USERNAME = "pos_system"
 
-class POSTokenAuthentication(BaseAuthentication):
-    def authenticate(self, request):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return None
+auth_cache = TwoTierCache(
+    "pos_auth",
+    local_ttl=settings.POS_AUTH_CACHE_LOCAL_TTL,
+    shared_ttl=settings.POS_AUTH_CACHE_TTL,
+)
 
-        try:
-            prefix, token = auth_header.split(" ")
-        except ValueError:
-            logger.warning("Authorization header has invalid format")
-            raise AuthenticationFailed("Неправильный формат токена")
 
-        if prefix.lower() != "token":
-            logger.warning("Authorization header has invalid prefix")
-            raise AuthenticationFailed("Неправильный тип токена")
+def invalidate_pos_token(token):
+    auth_cache.delete(f"token:{token}")
+    logger.info("POS token evicted from auth cache")
+
+
+def get_pos_user():
+    pos_user = auth_cache.get("user")
+    if pos_user is None:
+        pos_user, _ = User.objects.get_or_create(
+            username=POS_USERNAME,
+            defaults={"is_active": True, "is_staff": False, "is_superuser": False},
+        )
+        auth_cache.set("user", pos_user)
+    return copy.copy(pos_user)
+
 
+async def aget_pos_user():
+    pos_user = await auth_cache.aget("user")
+    if pos_user is None:
+        pos_user, _ = await User.objects.aget_or_create(
+            username=POS_USERNAME,
+            defaults={"is_active": True, "is_staff": False, "is_superuser": False},
+        )
+        await auth_cache.aset("user", pos_user)
+    return copy.copy(pos_user)
+
+
+def _token(request):
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return None
+
+    try:
+        prefix, token = auth_header.split(" ")
+    except ValueError:
+        logger.warning("Authorization header has invalid format")
+        raise AuthenticationFailed("Неправильный формат токена")
+
+    if prefix.lower() != "token":
+        logger.warning("Authorization header has invalid prefix")
+        raise AuthenticationFailed("Неправильный тип токена")
+    return token
+
+
+async def aauthenticate(request):
+    """
+    POSTokenAuthentication for plain async views, falling back to the session user.
+    Returns the user or None, raises AuthenticationFailed for a bad token.
+    """
+    token = _token(request)
+    if token is None:
+        user = await request.auser()
+        return user if user.is_authenticated else None
+
+    pos = await auth_cache.aget(f"token:{token}")
+    if pos is None:
         try:
-            pos_token = PointOfSaleToken.objects.select_related("pos").get(token=token, pos__is_active=True)
+            pos_token = await PointOfSaleToken.objects.select_related("pos").aget(token=token, pos__is_active=True)
         except PointOfSaleToken.DoesNotExist:
             logger.warning("Invalid POS token attempted authentication")
             raise AuthenticationFailed("Токен недействителен")
+        pos = pos_token.pos
+        await auth_cache.aset(f"token:{token}", pos)
 
-        pos_user, _ = User.objects.get_or_create(
-            username="pos_system",
-            defaults={"is_active": True, "is_staff": False, "is_superuser": False},
-        )
+    pos_user = await aget_pos_user()
+    logger.info("POS authenticated", extra={"pos_id": pos.id, "pos_name": pos.name})
+    pos_user.pos = pos
+    return pos_user
+
+
+def async_authenticated(view):
+    """Requires a POS token or a session for an async view, answering 403 like the DRF views."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await aauthenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=403)
+        if user is None:
+            return JsonResponse({"detail": str(NotAuthenticated.default_detail)}, status=403)
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class POSTokenAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        token = _token(request)
+        if token is None:
+            return None
+
+        pos = auth_cache.get(f"token:{token}")
+        if pos is None:
+            try:
+                pos_token = PointOfSaleToken.objects.select_related("pos").get(token=token, pos__is_active=True)
+            except PointOfSaleToken.DoesNotExist:
+                logger.warning("Invalid POS token attempted authentication")
+                raise AuthenticationFailed("Токен недействителен")
+            pos = pos_token.pos
+            auth_cache.set(f"token:{token}", pos)
+
+        pos_user = get_pos_user()
 
         logger.info(
             "POS authenticated",
-            extra={"pos_id": pos_token.pos.id, "pos_name": pos_token.pos.name}
+            extra={"pos_id": pos.id, "pos_name": pos.name}
         )
 
-        pos_user.pos = pos_token.pos
+        pos_user.pos = pos
         return (pos_user, None)
+
+
+def sign_webhook(body):
+    """Hex HMAC-SHA256 of the raw request body with PAYMENT_WEBHOOK_SECRET, sent as X-Signature."""
+    return hmac.new(settings.PAYMENT_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookSignature(BasePermission):
+    """Admits acquirer callbacks whose X-Signature matches the body; refuses all while no secret is set."""
+
+    message = "Неверная подпись запроса"
+
+    def has_permission(self, request, view):
+        if not settings.PAYMENT_WEBHOOK_SECRET:
+            logger.error("Payment webhook refused: PAYMENT_WEBHOOK_SECRET is not configured")
+            return False
+        signature = request.headers.get("X-Signature", "")
+        if not hmac.compare_digest(signature, sign_webhook(request.body)):
+            logger.warning("Payment webhook signature mismatch", extra={"path": request.path})
+            return False
+        return True
@@ -1,9 +1,64 @@
 from __future__ import absolute_import
 import os
+import time
 from celery import Celery
+from celery.signals import task_prerun, task_postrun, worker_ready, worker_shutdown
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
 app = Celery("core")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+_query_stats = {}
+_task_started = {}
+
+
+@task_prerun.connect
+def start_history_batch(**kwargs):
+    from core.utils.history import start_batch
+
+    start_batch()
+
+
+@task_postrun.connect
+def flush_history_batch(**kwargs):
+    from core.utils.history import finish_batch
+
+    finish_batch()
+
+
+@task_prerun.connect
+def start_task_stats(task_id, **kwargs):
+    from core.utils import querystats
+
+    _query_stats[task_id] = querystats.start()
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def finish_task_stats(task_id, task, state=None, **kwargs):
+    from core.utils import metrics, querystats
+
+    token = _query_stats.pop(task_id, None)
+    if token is not None:
+        stats = querystats.finish(token)
+        querystats.check(task.name, getattr(task.run, "query_budget", None), stats)
+        metrics.record_queries(task.name, stats)
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        metrics.celery_task_duration.observe(time.perf_counter() - started, task=task.name, state=state or "UNKNOWN")
+
+
+@worker_ready.connect
+def start_worker_heartbeat(sender, **kwargs):
+    from core.utils.health import start_heartbeat
+
+    start_heartbeat(sender.hostname)
+
+
+@worker_shutdown.connect
+def stop_worker_heartbeat(**kwargs):
+    from core.utils.health import stop_heartbeat
+
+    stop_heartbeat()
@@ -0,0 +1,29 @@
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from core.utils.stubs import StubServer
+
+
+class Command(BaseCommand):
+    help = "Запускает локальную заглушку эквайринга для тестов и нагрузочных прогонов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument("--delay-ms", type=int, default=50, help="Задержка ответа")
+        parser.add_argument("--jitter-ms", type=int, default=20)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503")
+
+    def handle(self, *args, **options):
+        def respond(method, path, payload):
+            time.sleep((options["delay_ms"] + random.uniform(0, options["jitter_ms"])) / 1000)
+            if random.random() < options["error_rate"]:
+                return 503, {"error": "unavailable"}
+            return 200, {"payment_url": f"http://127.0.0.1:{options['port']}/pay/{uuid.uuid4()}"}
+
+        server = StubServer(respond, host="0.0.0.0", port=options["port"])
+        self.stdout.write(self.style.SUCCESS(f"Заглушка эквайринга слушает порт {options['port']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,99 @@
+import time
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from core.utils import metrics, querystats
+from core.utils.history import finish_batch, flush, start_batch, take_batch
+
+
+@sync_and_async_middleware
+def deferred_history_middleware(get_response):
+    """Writes the history rows committed during a request in one batch after the view returns."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = start_batch()
+            try:
+                return await get_response(request)
+            finally:
+                # Токен сбрасывается в этом же контексте, запись — в потоке ORM
+                rows = take_batch(token)
+                if rows:
+                    await sync_to_async(flush)(rows)
+
+        return middleware
+
+    def middleware(request):
+        token = start_batch()
+        try:
+            return get_response(request)
+        finally:
+            finish_batch(token)
+
+    return middleware
+
+
+def _view_name(request):
+    match = request.resolver_match
+    # Неразобранные пути (сканеры, опечатки) собираются в одну серию
+    return match.view_name if match is not None else "unmatched"
+
+
+def _report_queries(request, response, stats):
+    match = request.resolver_match
+    if match is not None:
+        querystats.check(match.view_name, getattr(match.func, "query_budget", None), stats)
+    metrics.record_queries(_view_name(request), stats)
+    if settings.QUERY_STATS_HEADER:
+        response["X-DB-Queries"] = str(stats.count)
+        response["X-DB-Time"] = f"{stats.time_ms:.1f}"
+        response["X-DB-Duplicates"] = str(len(stats.duplicates))
+    return response
+
+
+@sync_and_async_middleware
+def query_stats_middleware(get_response):
+    """Counts the queries of a request and checks them against the view's @query_budget."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = querystats.start()
+            try:
+                response = await get_response(request)
+            finally:
+                stats = querystats.finish(token)
+            return _report_queries(request, response, stats)
+
+        return middleware
+
+    def middleware(request):
+        token = querystats.start()
+        try:
+            response = get_response(request)
+        finally:
+            stats = querystats.finish(token)
+        return _report_queries(request, response, stats)
+
+    return middleware
+
+
+def _observe_request(request, response, started):
+    metrics.http_request_duration.observe(
+        time.perf_counter() - started, view=_view_name(request), method=request.method, status=response.status_code
+    )
+    return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Records request latency per URL name."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            return _observe_request(request, await get_response(request), started)
+
+        return middleware
+
+    def middleware(request):
+        started = time.perf_counter()
+        return _observe_request(request, get_response(request), started)
+
+    return middleware
@@ -21,6 +21,89 @@ CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = env("CELERY_RESULT_BACKEND")
 CELERY_TASK_ALWAYS_EAGER = env.bool("CELERY_TASK_ALWAYS_EAGER")
 
+REDIS_URL = env("REDIS_URL", default=CELERY_BROKER_URL)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
+POS_AUTH_CACHE_LOCAL_TTL = env.int("POS_AUTH_CACHE_LOCAL_TTL", default=30)
+POS_AUTH_CACHE_TTL = env.int("POS_AUTH_CACHE_TTL", default=600)
+
+CATALOG_CACHE_LOCAL_TTL = env.int("CATALOG_CACHE_LOCAL_TTL", default=5)
+CATALOG_CACHE_TTL = env.int("CATALOG_CACHE_TTL", default=3600)
+CATALOG_CACHE_LOCAL_SIZE = env.int("CATALOG_CACHE_LOCAL_SIZE", default=50000)
+
+RESERVATION_TTL = env.int("RESERVATION_TTL", default=900)
+# Неоплаченный заказ архивируется тогда же, когда истекает резерв его товаров
+ORDER_TTL = env.int("ORDER_TTL", default=RESERVATION_TTL)
+ORDER_EXPIRY_BATCH_SIZE = env.int("ORDER_EXPIRY_BATCH_SIZE", default=500)
+
+ORDER_EVENTS_TIMEOUT = env.int("ORDER_EVENTS_TIMEOUT", default=60)
+ORDER_EVENTS_KEEPALIVE = env.int("ORDER_EVENTS_KEEPALIVE", default=15)
+
+ACQUIRING_URL = env("ACQUIRING_URL", default="")
+ACQUIRING_TOKEN = env("ACQUIRING_TOKEN", default="")
+ACQUIRING_BACKEND = env(
+    "ACQUIRING_BACKEND",
+    default="core.utils.acquiring.HttpAcquiringGateway" if ACQUIRING_URL else "core.utils.acquiring.FakeAcquiringGateway",
+)
+ACQUIRING_CONNECT_TIMEOUT = env.float("ACQUIRING_CONNECT_TIMEOUT", default=1.0)
+ACQUIRING_READ_TIMEOUT = env.float("ACQUIRING_READ_TIMEOUT", default=3.0)
+ACQUIRING_TOTAL_TIMEOUT = env.float("ACQUIRING_TOTAL_TIMEOUT", default=5.0)
+ACQUIRING_RETRIES = env.int("ACQUIRING_RETRIES", default=2)
+ACQUIRING_POOL_SIZE = env.int("ACQUIRING_POOL_SIZE", default=10)
+ACQUIRING_BREAKER_THRESHOLD = env.int("ACQUIRING_BREAKER_THRESHOLD", default=5)
+ACQUIRING_BREAKER_RESET = env.int("ACQUIRING_BREAKER_RESET", default=30)
+# Общий секрет с эквайером: пакетный колбэк mark_batch подписан HMAC-SHA256 тела, без секрета он отклоняется
+PAYMENT_WEBHOOK_SECRET = env("PAYMENT_WEBHOOK_SECRET", default="")
+
+IDEMPOTENCY_TTL = env.int("IDEMPOTENCY_TTL", default=86400)
+IDEMPOTENCY_LOCK_TTL = env.int("IDEMPOTENCY_LOCK_TTL", default=60)
+IDEMPOTENCY_WAIT = env.int("IDEMPOTENCY_WAIT", default=10)
+
+PAYMENT_WEBHOOK_BATCH_SIZE = env.int("PAYMENT_WEBHOOK_BATCH_SIZE", default=5000)
+PAYMENT_WEBHOOK_CHUNK_SIZE = env.int("PAYMENT_WEBHOOK_CHUNK_SIZE", default=200)
+
+ARCHIVE_BATCH_SIZE = env.int("ARCHIVE_BATCH_SIZE", default=1000)
+
+TELEGRAM_API_URL = env("TELEGRAM_API_URL", default="https://api.telegram.org")
+TELEGRAM_BOT_TOKEN = env("TELEGRAM_BOT_TOKEN", default="")
+# TELEGRAM_CHAT_ID — прежняя переменная с одним чатом
+TELEGRAM_CHAT_IDS = env.list("TELEGRAM_CHAT_IDS", default=env.list("TELEGRAM_CHAT_ID", default=[]))
+NOTIFY_CONNECT_TIMEOUT = env.float("NOTIFY_CONNECT_TIMEOUT", default=3.0)
+NOTIFY_READ_TIMEOUT = env.float("NOTIFY_READ_TIMEOUT", default=10.0)
+NOTIFY_POOL_SIZE = env.int("NOTIFY_POOL_SIZE", default=4)
+NOTIFY_MAX_RETRIES = env.int("NOTIFY_MAX_RETRIES", default=6)
+NOTIFY_RETRY_BACKOFF = env.int("NOTIFY_RETRY_BACKOFF", default=10)
+NOTIFY_RETRY_BACKOFF_MAX = env.int("NOTIFY_RETRY_BACKOFF_MAX", default=900)
+
+HEALTH_CHECK_TIMEOUT = env.float("HEALTH_CHECK_TIMEOUT", default=0.5)
+HEALTH_CACHE_TTL = env.float("HEALTH_CACHE_TTL", default=2.0)
+HEALTH_HEARTBEAT_INTERVAL = env.int("HEALTH_HEARTBEAT_INTERVAL", default=10)
+HEALTH_HEARTBEAT_TTL = env.int("HEALTH_HEARTBEAT_TTL", default=30)
+
+# Заголовки X-DB-* с числом запросов и временем в БД, включаются на стейджинге
+QUERY_STATS_HEADER = env.bool("QUERY_STATS_HEADER", default=False)
+# Сколько раз должен повториться один запрос, чтобы считаться N+1
+QUERY_DUPLICATE_THRESHOLD = env.int("QUERY_DUPLICATE_THRESHOLD", default=3)
+# Превышение бюджета запросов роняет тест, в остальных окружениях только пишется в лог
+QUERY_BUDGET_STRICT = env.bool("QUERY_BUDGET_STRICT", default=False)
+
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=5.0)
+# Если задан, /metrics отдаётся только с заголовком Authorization: Bearer <токен>
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+STOCK_SNAPSHOT_RETENTION_DAYS = env.int("STOCK_SNAPSHOT_RETENTION_DAYS", default=90)
+STOCK_COMPACTION_BATCH_SIZE = env.int("STOCK_COMPACTION_BATCH_SIZE", default=5000)
+
+HISTORY_PARTITIONS_AHEAD = env.int("HISTORY_PARTITIONS_AHEAD", default=3)
+# 0 — хранить историю бессрочно
+HISTORY_RETENTION_MONTHS = env.int("HISTORY_RETENTION_MONTHS", default=0)
+
 INSTALLED_APPS = [
     "django.contrib.admin",
     "django.contrib.auth",
@@ -39,6 +122,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "core.middleware.metrics_middleware",
+    "core.middleware.query_stats_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -47,6 +132,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "simple_history.middleware.HistoryRequestMiddleware",
+    "core.middleware.deferred_history_middleware",
     "rollbar.contrib.django.middleware.RollbarNotifierMiddleware",
 ]
 
@@ -77,6 +163,13 @@ DATABASES = {
         "PASSWORD": env("POSTGRES_PASSWORD"),
         "HOST": env("POSTGRES_HOST"),
         "PORT": env("POSTGRES_PORT"),
+        # Соединение живёт между запросами и задачами, 0 — новое на каждый запрос, None — без ограничения.
+        # Задаётся отдельно для web и celery через окружение процесса
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", default=60),
+        "CONN_HEALTH_CHECKS": env.bool("DB_CONN_HEALTH_CHECKS", default=True),
+        "OPTIONS": {
+            "connect_timeout": env.int("DB_CONNECT_TIMEOUT", default=5),
+        },
     }
 }
 
@@ -107,11 +200,44 @@ else:
     CORS_ALLOW_CREDENTIALS = True
     CORS_ALLOW_HEADERS = list(default_headers) + ["Authorization"]
 
+# Уведомления идут отдельной очередью, медленный Telegram не занимает воркеры основных задач
+CELERY_TASK_ROUTES = {
+    "send_notification": {"queue": "notifications"},
+}
+
 CELERY_BEAT_SCHEDULE = {
     "archive-created-orders-every-hour": {
         "task": "archive_created_orders",
         "schedule": crontab(minute=0, hour="*"),
     },
+    "expire-due-orders": {
+        "task": "expire_due_orders",
+        "schedule": 15.0,
+    },
+    "release-expired-reservations-every-minute": {
+        "task": "release_expired_reservations",
+        "schedule": crontab(minute="*"),
+    },
+    "rebuild-reservation-counters-every-10-minutes": {
+        "task": "rebuild_reservation_counters",
+        "schedule": crontab(minute="*/10"),
+    },
+    "compact-stock-movements": {
+        "task": "compact_stock_movements",
+        "schedule": 30.0,
+    },
+    "snapshot-stocks-hourly": {
+        "task": "snapshot_stocks",
+        "schedule": crontab(minute=5),
+    },
+    "maintain-history-partitions-daily": {
+        "task": "maintain_history_partitions",
+        "schedule": crontab(hour=2, minute=30),
+    },
+    "purge-idempotency-keys-daily": {
+        "task": "purge_idempotency_keys",
+        "schedule": crontab(hour=3, minute=0),
+    },
     "daily-orders-report": {
         "task": "daily_orders_report",
         "schedule": crontab(hour=22, minute=0),
@@ -1,42 +1,93 @@
 import logging
-import requests
+from datetime import timedelta
 from celery import shared_task
 from celery.exceptions import Retry
-from django.db import transaction
+from django.conf import settings
 from django.utils import timezone
 from django.utils.formats import date_format
 from django.db.models import Count, Sum
-from pos.models import Order, Payment
-from pos.flow import OrderFlow, PaymentFlow
-from core.utils.notifications import send_telegram_message
+from api.models import IdempotencyKey
+from pos import archival, expiry, ledger, partitions, reservations, snapshots
+from core.utils import notifications
+from core.utils.notifications import NotificationError, NotificationRejected
+from core.utils.querystats import query_budget
 from core.utils.reports import build_daily_report
 
 logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True, name="archive_created_orders", max_retries=3, default_retry_delay=300)
+@query_budget(12, duplicates=True)
 def archive_created_orders(self):
-    orders = Order.objects.filter(state=Order.OrderState.CREATED)
-    logger.info(f"Found {orders.count()} orders to archive")
+    stats = archival.archive_created_orders()
+    logger.info(
+        f"Archived {stats['orders']} orders and failed {stats['payments']} payments "
+        f"in {stats['seconds']}s ({stats['orders_per_sec']} orders/s)"
+    )
+    return stats
 
-    for order in orders:
-        try:
-            with transaction.atomic():
-                order = Order.objects.select_for_update().get(id=order.id)
-                order_flow = OrderFlow(order)
-                order_flow.archive()
-
-                for payment in order.payments.all():
-                    payment_flow = PaymentFlow(payment)
-                    if payment.state == Payment.PaymentState.PENDING:
-                        payment_flow.mark_failed()
-                        logger.info(f"Payment {payment.id} marked as FAILED due to order archive")
-        except Exception as e:
-            logger.error(f"Failed to archive order {order.id}", exc_info=e)
-
-
-@shared_task(bind=True, name="daily_orders_report", max_retries=3, default_retry_delay=300)
-def daily_orders_report(self):
+
+@shared_task(name="expire_due_orders")
+@query_budget(9)
+def expire_due_orders():
+    archived = expiry.expire_due()
+    if archived:
+        logger.info(f"Archived {len(archived)} expired orders")
+
+
+@shared_task(name="release_expired_reservations")
+@query_budget(0)
+def release_expired_reservations():
+    released = reservations.release_expired()
+    logger.info(f"Released {len(released)} expired stock reservations")
+
+
+@shared_task(name="rebuild_reservation_counters")
+@query_budget(0)
+def rebuild_reservation_counters():
+    fixed = reservations.rebuild_counters()
+    logger.info(f"Rebuilt {fixed} stock reservation counters")
+
+
+# На таблицу: две проверки, создание секции на новый месяц и удаление устаревшей
+@shared_task(name="maintain_history_partitions")
+@query_budget(len(partitions.HISTORY_TABLES) * 10, duplicates=True)
+def maintain_history_partitions():
+    created = partitions.ensure_partitions(settings.HISTORY_PARTITIONS_AHEAD)
+    dropped = []
+    if settings.HISTORY_RETENTION_MONTHS:
+        cutoff = partitions.add_months(partitions.month_start(timezone.localdate()), -settings.HISTORY_RETENTION_MONTHS)
+        dropped = partitions.drop_partitions_before(cutoff)
+    logger.info(f"History partitions: created {len(created)}, dropped {len(dropped)}")
+
+
+@shared_task(name="compact_stock_movements")
+@query_budget(7)
+def compact_stock_movements():
+    stats = ledger.compact()
+    if stats["movements"]:
+        logger.info(f"Compacted {stats['movements']} stock movements into {stats['stocks']} stocks")
+    return stats
+
+
+@shared_task(name="snapshot_stocks")
+@query_budget(4)
+def snapshot_stocks():
+    taken, purged = snapshots.snapshot_stocks()
+    logger.info(f"Stock snapshot: {taken} rows taken, {purged} purged")
+
+
+@shared_task(name="purge_idempotency_keys")
+@query_budget(1)
+def purge_idempotency_keys():
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    logger.info(f"Purged {deleted} idempotency keys")
+
+
+@shared_task(name="daily_orders_report")
+@query_budget(2)
+def daily_orders_report():
     data = build_daily_report()
     today_str = data["date"]
 
@@ -53,9 +104,29 @@ def daily_orders_report(self):
     )
 
     logger.info(f"daily_orders_report: подготовлен отчет за {today_str}")
-    try:
-        send_telegram_message(message)
-        logger.info("daily_orders_report: отчет успешно отправлен в Telegram")
-    except requests.RequestException as exc:
-        logger.exception("daily_orders_report: ошибка при отправке в Telegram")
-        raise self.retry(exc=exc)
\ No newline at end of file
+    chats = notifications.notify(message)
+    logger.info(f"daily_orders_report: отчет поставлен в очередь отправки для {chats} чатов")
+
+
+@shared_task(bind=True, name="send_notification", max_retries=settings.NOTIFY_MAX_RETRIES)
+@query_budget(0)
+def send_notification(self, chat_id, parts):
+    """Sends the parts in order; a retry resumes from the part that failed."""
+    if not settings.TELEGRAM_BOT_TOKEN:
+        logger.warning(f"send_notification: TELEGRAM_BOT_TOKEN не задан, сообщение для чата {chat_id} не отправлено")
+        return 0
+    client = notifications.get_client()
+    for index, part in enumerate(parts):
+        try:
+            client.send_message(chat_id, part)
+        except NotificationRejected:
+            logger.exception(f"send_notification: Telegram отклонил сообщение для чата {chat_id}")
+            return index
+        except NotificationError as exc:
+            countdown = exc.retry_after or notifications.retry_delay(self.request.retries)
+            logger.warning(
+                f"send_notification: ошибка отправки в чат {chat_id}, повтор через {countdown:.0f} с",
+                extra={"error": str(exc), "attempt": self.request.retries + 1},
+            )
+            raise self.retry(exc=exc, args=[chat_id, parts[index:]], countdown=countdown)
+    return len(parts)
@@ -1,9 +1,12 @@
 from django.urls import path, include
 from django.contrib import admin
-from .views import health
+from .views import health, live, metrics, ready
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
     path("health/", health, name="health"),
+    path("health/live/", live, name="health-live"),
+    path("health/ready/", ready, name="health-ready"),
+    path("metrics", metrics, name="metrics"),
 ]
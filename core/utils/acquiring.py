@@ -0,0 +1,215 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class AcquiringUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms, ok):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+            self._latencies.append(elapsed_ms)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {"calls": self.calls, "errors": self.errors, "rejected": self.rejected}
+        for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            stats[name] = round(latencies[min(int(len(latencies) * q), len(latencies) - 1)], 2) if latencies else 0
+        return stats
+
+
+class FakeAcquiringGateway:
+    """Generates payment links locally, for development without an acquirer."""
+
+    def __init__(self):
+        self.stats = LatencyStats()
+
+    def create_payment_link(self, order, payment_type):
+        return f"https://fake-acquiring.com/pay/{uuid.uuid4()}"
+
+
+class HttpAcquiringGateway:
+    """
+    Acquirer client with a persistent connection pool, strict connect/read timeouts,
+    retries with jittered exponential backoff inside ACQUIRING_TOTAL_TIMEOUT and a
+    circuit breaker, so a slow acquirer cannot hold request workers indefinitely.
+    """
+
+    def __init__(self):
+        self.base_url = settings.ACQUIRING_URL.rstrip("/")
+        self.timeout = (settings.ACQUIRING_CONNECT_TIMEOUT, settings.ACQUIRING_READ_TIMEOUT)
+        self.retries = settings.ACQUIRING_RETRIES
+        self.total_timeout = settings.ACQUIRING_TOTAL_TIMEOUT
+        self.breaker = CircuitBreaker(settings.ACQUIRING_BREAKER_THRESHOLD, settings.ACQUIRING_BREAKER_RESET)
+        self.stats = LatencyStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.ACQUIRING_POOL_SIZE,
+            max_retries=0,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if settings.ACQUIRING_TOKEN:
+            self.session.headers["Authorization"] = f"Bearer {settings.ACQUIRING_TOKEN}"
+
+    def _backoff(self, attempt):
+        return min(0.1 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.0)
+
+    def _post(self, path, payload, deadline, idempotency_key):
+        started = time.monotonic()
+        connect_timeout, read_timeout = self.timeout
+        timeout = (connect_timeout, max(min(read_timeout, deadline - started), 0.05))
+        try:
+            resp = self.session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                timeout=timeout,
+                headers={"Idempotency-Key": idempotency_key},
+            )
+            if resp.status_code >= 500:
+                raise requests.HTTPError(f"Acquirer responded {resp.status_code}", response=resp)
+            resp.raise_for_status()
+            data = resp.json()
+        except (requests.RequestException, ValueError):
+            self.stats.record((time.monotonic() - started) * 1000, ok=False)
+            raise
+        self.stats.record((time.monotonic() - started) * 1000, ok=True)
+        return data
+
+    def create_payment_link(self, order, payment_type):
+        payload = {"order_id": order.id, "amount": str(order.total_price), "type": payment_type}
+        # После таймаута чтения или 5xx платёж мог уже создаться: повтор с тем же ключом вернёт его, а не создаст второй
+        idempotency_key = f"order-{order.id}-{payment_type}"
+        deadline = time.monotonic() + self.total_timeout
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.stats.reject()
+                raise AcquiringUnavailable("Circuit breaker is open")
+            try:
+                data = self._post("/payments", payload, deadline, idempotency_key)
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    self.breaker.success()
+                    raise AcquiringUnavailable(str(e)) from e
+                self.breaker.failure()
+                error = e
+            except (requests.RequestException, ValueError) as e:
+                self.breaker.failure()
+                error = e
+            else:
+                payment_url = data.get("payment_url") if isinstance(data, dict) else None
+                if not payment_url:
+                    # Ответ без ссылки — сбой эквайера, повтор с тем же ключом вернёт то же самое
+                    self.breaker.failure()
+                    logger.error("Acquirer response has no payment_url", extra={"order_id": order.id})
+                    raise AcquiringUnavailable("Acquirer response has no payment_url")
+                self.breaker.success()
+                return payment_url
+
+            delay = self._backoff(attempt)
+            logger.warning(
+                "Acquiring call failed",
+                extra={"order_id": order.id, "attempt": attempt + 1, "error": str(error)},
+            )
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+
+        raise AcquiringUnavailable(str(error)) from error
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = import_string(settings.ACQUIRING_BACKEND)()
+        return _gateway
+
+
+def reset_gateway():
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
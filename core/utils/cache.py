@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from redis.exceptions import RedisError
+from core.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_RESULTS = {"local_hits": "local_hit", "shared_hits": "shared_hit", "misses": "miss"}
+
+
+class TwoTierCache:
+    """
+    Per-process LRU with TTL in front of the shared Django cache (Redis).
+
+    Values returned from the local tier are shared between threads of a worker,
+    callers must not mutate them. Other workers see an invalidation only after
+    their local entry expires, so ``local_ttl`` bounds cross-process staleness.
+    """
+
+    def __init__(self, prefix, local_ttl, shared_ttl, maxsize=1024, alias="default"):
+        self.prefix = prefix
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.maxsize = maxsize
+        self.alias = alias
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+        metrics.cache_requests.inc(cache=self.prefix, result=_RESULTS[name])
+
+    def _local_get(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def get(self, key, default=None):
+        value = self._local_get(key)
+        if value is not _MISSING:
+            self._count("local_hits")
+            return value
+
+        try:
+            value = self.shared.get(self._key(key), _MISSING)
+        except RedisError as e:
+            logger.warning("Shared cache get failed", extra={"prefix": self.prefix, "error": str(e)})
+            value = _MISSING
+
+        if value is not _MISSING:
+            self._local_set(key, value)
+            self._count("shared_hits")
+            return value
+
+        self._count("misses")
+        return default
+
+    async def aget(self, key, default=None):
+        value = self._local_get(key)
+        if value is not _MISSING:
+            self._count("local_hits")
+            return value
+
+        try:
+            value = await self.shared.aget(self._key(key), _MISSING)
+        except RedisError as e:
+            logger.warning("Shared cache get failed", extra={"prefix": self.prefix, "error": str(e)})
+            value = _MISSING
+
+        if value is not _MISSING:
+            self._local_set(key, value)
+            self._count("shared_hits")
+            return value
+
+        self._count("misses")
+        return default
+
+    def set(self, key, value):
+        self._local_set(key, value)
+        try:
+            self.shared.set(self._key(key), value, timeout=self.shared_ttl)
+        except RedisError as e:
+            logger.warning("Shared cache set failed", extra={"prefix": self.prefix, "error": str(e)})
+
+    async def aset(self, key, value):
+        self._local_set(key, value)
+        try:
+            await self.shared.aset(self._key(key), value, timeout=self.shared_ttl)
+        except RedisError as e:
+            logger.warning("Shared cache set failed", extra={"prefix": self.prefix, "error": str(e)})
+
+    def set_many(self, mapping):
+        for key, value in mapping.items():
+            self._local_set(key, value)
+        try:
+            self.shared.set_many({self._key(key): value for key, value in mapping.items()}, timeout=self.shared_ttl)
+        except RedisError as e:
+            logger.warning("Shared cache set failed", extra={"prefix": self.prefix, "error": str(e)})
+
+    def delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        try:
+            self.shared.delete(self._key(key))
+        except RedisError as e:
+            logger.warning("Shared cache delete failed", extra={"prefix": self.prefix, "error": str(e)})
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_size"] = len(self._local)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0
+        return stats
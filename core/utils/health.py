@@ -1,21 +1,119 @@
-import os
-import redis
+import asyncio
+import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import connections
-from celery import Celery
+from redis.exceptions import RedisError
+from core.utils.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_KEY = "health:celery:workers"
+
+_results = {}
+_heartbeat = {"stop": threading.Event(), "thread": None}
+
+
+class CheckFailed(Exception):
+    pass
 
-app = Celery("core")
-REDIS_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 
 def check_db():
-    connections["default"].cursor()
+    with connections["default"].cursor() as cursor:
+        cursor.execute("SELECT 1")
     return True
 
-def check_redis():
-    r = redis.Redis.from_url(REDIS_URL)
-    r.ping()
-    return True
 
-def check_celery():
-    insp = app.control.inspect(timeout=1)
-    return bool(insp.ping())
+async def acheck_db():
+    await sync_to_async(check_db)()
+
+
+async def acheck_redis():
+    await get_async_redis().ping()
+
+
+async def acheck_celery():
+    """Workers refresh their heartbeat in Redis, so the check costs one ZCOUNT instead of a broker broadcast."""
+    alive = await get_async_redis().zcount(HEARTBEAT_KEY, time.time() - settings.HEALTH_HEARTBEAT_TTL, "+inf")
+    if not alive:
+        raise CheckFailed("no worker heartbeat")
+
+
+CHECKS = {
+    "db": acheck_db,
+    "redis": acheck_redis,
+    "celery": acheck_celery,
+}
+
+
+async def _run(name):
+    started = time.perf_counter()
+    result = {"ok": True}
+    try:
+        await asyncio.wait_for(CHECKS[name](), settings.HEALTH_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": "timeout"}
+        logger.error(f"{name} health check timed out")
+    except Exception as e:
+        result = {"ok": False, "error": str(e) or type(e).__name__}
+        logger.error(f"{name} health check failed", exc_info=e)
+    result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return name, result
+
+
+async def run_checks(names):
+    """
+    Runs the checks concurrently, each bounded by HEALTH_CHECK_TIMEOUT. Results are
+    reused for HEALTH_CACHE_TTL seconds, so frequent probes from several balancers
+    cost one round of checks per window.
+    """
+    key = tuple(names)
+    cached = _results.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    results = dict(await asyncio.gather(*(_run(name) for name in names)))
+    _results[key] = (time.monotonic() + settings.HEALTH_CACHE_TTL, results)
+    return results
+
+
+def clear_cache():
+    _results.clear()
+
+
+def beat(hostname):
+    redis = get_redis()
+    now = time.time()
+    pipe = redis.pipeline()
+    pipe.zadd(HEARTBEAT_KEY, {hostname: now})
+    pipe.zremrangebyscore(HEARTBEAT_KEY, "-inf", now - settings.HEALTH_HEARTBEAT_TTL)
+    pipe.execute()
+
+
+def start_heartbeat(hostname):
+    """Refreshes the worker heartbeat every HEALTH_HEARTBEAT_INTERVAL seconds from a daemon thread."""
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                beat(hostname)
+            except RedisError as e:
+                logger.warning("Worker heartbeat failed", extra={"error": str(e)})
+            stop.wait(settings.HEALTH_HEARTBEAT_INTERVAL)
+        try:
+            get_redis().zrem(HEARTBEAT_KEY, hostname)
+        except RedisError:
+            pass
+
+    thread = threading.Thread(target=run, name="health-heartbeat", daemon=True)
+    _heartbeat.update(stop=stop, thread=thread)
+    thread.start()
+
+
+def stop_heartbeat():
+    """Stops the heartbeat and withdraws the worker at once instead of waiting for the TTL."""
+    _heartbeat["stop"].set()
+    if _heartbeat["thread"] is not None:
+        _heartbeat["thread"].join(timeout=2)
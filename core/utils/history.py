@@ -0,0 +1,108 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from django.db import transaction
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import pre_create_historical_record
+from core.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_batch = ContextVar("deferred_history_batch", default=None)
+
+
+def flush(rows):
+    """
+    Writes buffered history rows, one bulk_create per historical model. Runs after the
+    business transaction committed, so a failure must not fail the request or skip the
+    remaining on_commit callbacks: it is logged to Rollbar and counted in
+    history_rows_lost_total, and the rows of that model are lost.
+    """
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(type(row), []).append(row)
+    for model, model_rows in by_model.items():
+        try:
+            model.objects.bulk_create(model_rows)
+        except Exception:
+            logger.exception("Deferred history flush failed", extra={"model": model.__name__, "rows": len(model_rows)})
+            metrics.history_rows_lost.inc(len(model_rows), model=model.__name__)
+
+
+def start_batch():
+    return _batch.set([])
+
+
+def take_batch(token=None):
+    """Closes the current batch and returns its rows without writing them."""
+    rows = _batch.get() or []
+    if token is not None:
+        _batch.reset(token)
+    else:
+        _batch.set(None)
+    return rows
+
+
+def finish_batch(token=None):
+    rows = take_batch(token)
+    if rows:
+        flush(rows)
+
+
+@contextmanager
+def deferred_history():
+    """Collects committed history rows of DeferredHistoricalRecords models and writes them on exit."""
+    if _batch.get() is not None:
+        yield
+        return
+    token = start_batch()
+    try:
+        yield
+    finally:
+        finish_batch(token)
+
+
+def _committed(row):
+    rows = _batch.get()
+    if rows is None:
+        flush([row])
+    else:
+        rows.append(row)
+
+
+class DeferredHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords that builds the history row at save time but inserts it only
+    after the transaction commits, so hot-path transactions hold their locks for
+    less time. Rows of a rolled back transaction or savepoint are dropped with its
+    on_commit callbacks. Inside deferred_history() (every request and Celery task)
+    the rows are written together on exit, otherwise right after commit.
+    """
+
+    def create_historical_record(self, instance, history_type, using=None):
+        using = using if self.use_base_model_db else None
+        history_date = getattr(instance, "_history_date", timezone.now())
+        history_user = self.get_history_user(instance)
+        history_change_reason = self.get_change_reason_for_object(instance, history_type, using)
+        manager = getattr(instance, self.manager_name)
+
+        attrs = {field.attname: getattr(instance, field.attname) for field in self.fields_included(instance)}
+        history_instance = manager.model(
+            history_date=history_date,
+            history_type=history_type,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            **attrs,
+        )
+        pre_create_historical_record.send(
+            sender=manager.model,
+            instance=instance,
+            history_date=history_date,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            history_instance=history_instance,
+            using=using,
+        )
+        transaction.on_commit(partial(_committed, history_instance), using=using)
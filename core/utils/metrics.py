@@ -0,0 +1,232 @@
+"""
+Prometheus-style metrics shared by all gunicorn and Celery worker processes.
+
+Each process adds increments to a local buffer and a daemon thread folds it into
+Redis hashes every METRICS_FLUSH_INTERVAL seconds with HINCRBYFLOAT, so workers
+never contend on a lock and a scrape of any node sees the totals of every process.
+Gauges such as queue depths are read at scrape time.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import redis
+from django.conf import settings
+from redis.exceptions import RedisError
+from core.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "metrics"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+REGISTRY = {}
+
+_buffer = {}
+_lock = threading.Lock()
+_flusher = {"pid": None}
+
+
+def _add(key, field, amount):
+    if _flusher["pid"] != os.getpid():
+        _start_flusher()
+    with _lock:
+        _buffer[(key, field)] = _buffer.get((key, field), 0) + amount
+
+
+def _start_flusher():
+    """Starts the flush thread once per process; a forked worker inherits neither the thread nor the buffer."""
+    with _lock:
+        if _flusher["pid"] == os.getpid():
+            return
+        if _flusher["pid"] is not None:
+            _buffer.clear()
+        stop = threading.Event()
+        _flusher["pid"] = os.getpid()
+
+    def run():
+        while not stop.wait(settings.METRICS_FLUSH_INTERVAL):
+            flush()
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+
+def flush():
+    with _lock:
+        pending = dict(_buffer)
+        _buffer.clear()
+    if not pending:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    for (key, field), amount in pending.items():
+        pipe.hincrbyfloat(key, field, amount)
+    try:
+        pipe.execute()
+    except RedisError as e:
+        # Теряем интервал, а не копим буфер без ограничений
+        logger.warning("Metrics flush failed", extra={"error": str(e), "series": len(pending)})
+
+
+atexit.register(flush)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        REGISTRY[name] = self
+
+    @property
+    def key(self):
+        return f"{KEY_PREFIX}:{self.name}"
+
+    def _field(self, labels):
+        return json.dumps([str(labels[label]) for label in self.labels])
+
+    def samples(self, client):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        _add(self.key, self._field(labels), amount)
+
+    def samples(self, client):
+        for field, value in sorted(client.hgetall(self.key).items()):
+            yield self.name, dict(zip(self.labels, json.loads(field))), float(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        field = self._field(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        bucket = str(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+        _add(f"{self.key}:bucket", json.dumps([*json.loads(field), bucket]), 1)
+        _add(f"{self.key}:sum", field, value)
+        _add(f"{self.key}:count", field, 1)
+
+    def samples(self, client):
+        pipe = client.pipeline(transaction=False)
+        for part in ("bucket", "sum", "count"):
+            pipe.hgetall(f"{self.key}:{part}")
+        buckets, sums, counts = pipe.execute()
+
+        per_series = {}
+        for field, value in buckets.items():
+            *values, bucket = json.loads(field)
+            per_series.setdefault(json.dumps(values), {})[bucket] = float(value)
+        for field in sorted(counts):
+            labels = dict(zip(self.labels, json.loads(field)))
+            observed = per_series.get(field, {})
+            total = 0
+            for bucket in self.buckets:
+                total += observed.get(str(bucket), 0)
+                yield f"{self.name}_bucket", {**labels, "le": str(bucket)}, total
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, float(counts[field])
+            yield f"{self.name}_sum", labels, float(sums.get(field, 0))
+            yield f"{self.name}_count", labels, float(counts[field])
+
+
+class Gauge(Metric):
+    """Value read at scrape time: ``collect()`` returns [(labels, value)]."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, collect, labels=()):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def samples(self, client):
+        for labels, value in self.collect():
+            yield self.name, labels, float(value)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(name, labels, value):
+    if labels:
+        rendered = ",".join(f'{label}="{_escape(str(label_value))}"' for label, label_value in labels.items())
+        name = f"{name}{{{rendered}}}"
+    return f"{name} {value:g}" if value != int(value) else f"{name} {int(value)}"
+
+
+def render():
+    """Text exposition format of every registered metric."""
+    client = get_redis()
+    lines = []
+    for metric in REGISTRY.values():
+        try:
+            samples = list(metric.samples(client))
+        except (RedisError, OSError) as e:
+            logger.warning("Metric collection failed", extra={"metric": metric.name, "error": str(e)})
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(_format(name, labels, value) for name, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drops buffered and stored values, for tests."""
+    with _lock:
+        _buffer.clear()
+    keys = list(get_redis().scan_iter(f"{KEY_PREFIX}:*"))
+    if keys:
+        get_redis().delete(*keys)
+
+
+_broker = {"client": None}
+
+
+def queue_lengths():
+    """Messages waiting in each Celery queue, counted on the Redis broker including its priority lists."""
+    if _broker["client"] is None:
+        _broker["client"] = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    queues = {"celery"} | {route["queue"] for route in settings.CELERY_TASK_ROUTES.values()}
+    pipe = _broker["client"].pipeline(transaction=False)
+    for queue in sorted(queues):
+        for name in [queue] + [f"{queue}\x06\x16{priority}" for priority in (3, 6, 9)]:
+            pipe.llen(name)
+    lengths = pipe.execute()
+    return [({"queue": queue}, sum(lengths[index * 4:index * 4 + 4])) for index, queue in enumerate(sorted(queues))]
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by URL name", labels=("view", "method", "status")
+)
+db_queries = Counter("db_queries_total", "Database queries by view or task", labels=("target",))
+db_query_duration = Counter(
+    "db_query_duration_seconds_total", "Time spent in database queries by view or task", labels=("target",)
+)
+cache_requests = Counter(
+    "cache_requests_total", "Two-tier cache lookups by result: local_hit, shared_hit or miss", labels=("cache", "result")
+)
+fsm_transitions = Counter("fsm_transitions_total", "Order and payment state transitions", labels=("model", "source", "target"))
+celery_task_duration = Histogram(
+    "celery_task_duration_seconds", "Celery task runtime by final state", labels=("task", "state"), buckets=TASK_BUCKETS
+)
+history_rows_lost = Counter(
+    "history_rows_lost_total", "Deferred history rows dropped because their insert failed", labels=("model",)
+)
+celery_queue_length = Gauge("celery_queue_length", "Messages waiting in the Celery queue", queue_lengths, labels=("queue",))
+
+
+def record_queries(target, stats):
+    db_queries.inc(stats.count, target=target)
+    db_query_duration.inc(stats.time_ms / 1000, target=target)
@@ -1,17 +1,112 @@
 import logging
+import random
+import threading
 import requests
-import os
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-def send_telegram_message(message: str):
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        data = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-        resp = requests.post(url, data=data)
-        resp.raise_for_status()
-    except Exception as e:
-        logger.info("Telegram notification send failed", extra={"error": str(e)})
+MESSAGE_LIMIT = 4096
+
+
+class NotificationError(Exception):
+    """Delivery failed but may succeed later: network errors, 5xx and 429."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class NotificationRejected(Exception):
+    """Telegram refused the message for good (bad token, unknown chat), retrying will not help."""
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Splits text into parts of at most ``limit`` characters, on line breaks where possible."""
+    parts, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ""
+        current += line
+    if current.strip():
+        parts.append(current)
+    return [part.rstrip("\n") for part in parts]
+
+
+class TelegramClient:
+    """Bot API client with a persistent connection pool and strict timeouts."""
+
+    def __init__(self):
+        self.base_url = f"{settings.TELEGRAM_API_URL.rstrip('/')}/bot{settings.TELEGRAM_BOT_TOKEN}"
+        self.timeout = (settings.NOTIFY_CONNECT_TIMEOUT, settings.NOTIFY_READ_TIMEOUT)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.NOTIFY_POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send_message(self, chat_id, text):
+        try:
+            resp = self.session.post(
+                f"{self.base_url}/sendMessage", json={"chat_id": chat_id, "text": text}, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise NotificationError(str(e)) from e
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            try:
+                retry_after = resp.json().get("parameters", {}).get("retry_after")
+            except ValueError:
+                retry_after = None
+            raise NotificationError(f"Telegram responded {resp.status_code}", retry_after=retry_after)
+        if resp.status_code >= 400:
+            raise NotificationRejected(f"Telegram responded {resp.status_code}: {resp.text[:200]}")
+
+
+def retry_delay(retries):
+    """Exponential backoff with jitter, capped at NOTIFY_RETRY_BACKOFF_MAX seconds."""
+    delay = min(settings.NOTIFY_RETRY_BACKOFF * 2 ** retries, settings.NOTIFY_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TelegramClient()
+        return _client
+
+
+def reset_client():
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def notify(message, chat_ids=None):
+    """
+    Queues the message for every chat on the notifications queue. Long messages are
+    split into parts sent in order; each chat is delivered and retried on its own.
+    The bot token is checked by send_notification on the notifications worker.
+    """
+    from core.tasks import send_notification
+
+    chat_ids = chat_ids or settings.TELEGRAM_CHAT_IDS
+    if not chat_ids:
+        logger.warning("Telegram notification skipped: chats are not configured")
+        return 0
+    parts = split_message(message)
+    for chat_id in chat_ids:
+        send_notification.delay(chat_id, parts)
+    return len(chat_ids)
@@ -0,0 +1,142 @@
+"""
+Query count, DB time and repeated-query (N+1) accounting per request and Celery task.
+
+Every connection gets an execute wrapper on creation; it adds each query to the
+QueryStats of the current context, so queries made from sync_to_async threads of
+async views land in the same request. Views and tasks declare their limits with
+@query_budget; an exceeded budget is logged, and with QUERY_BUDGET_STRICT (the test
+suite) collected so the test that caused it fails.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("query_stats", default=None)
+_violations = []
+_violations_lock = threading.Lock()
+
+_PLACEHOLDERS = re.compile(r"\((?:%s, )*%s\)(?:, \((?:%s, )*%s\))*")
+_TRANSACTION = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b", re.IGNORECASE)
+
+
+def signature(sql):
+    """SQL with IN lists and multi-row VALUES collapsed, so batches of any size share a signature."""
+    return _PLACEHOLDERS.sub("(...)", sql)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.signatures = Counter()
+
+    def record(self, sql, elapsed_ms):
+        self.count += 1
+        self.time_ms += elapsed_ms
+        if not _TRANSACTION.match(sql):
+            self.signatures[signature(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Signatures run at least QUERY_DUPLICATE_THRESHOLD times, {sql: count}."""
+        return {sql: count for sql, count in self.signatures.items() if count >= settings.QUERY_DUPLICATE_THRESHOLD}
+
+    def as_dict(self):
+        return {"queries": self.count, "db_ms": round(self.time_ms, 2), "duplicates": self.duplicates}
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, (time.perf_counter() - started) * 1000)
+
+
+def install(sender, connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+connection_created.connect(install)
+
+
+def start():
+    return _current.set(QueryStats())
+
+
+def finish(token):
+    stats = _current.get()
+    _current.reset(token)
+    return stats
+
+
+@contextmanager
+def track():
+    """Collects the queries run inside the block: ``with track() as stats: ...``."""
+    token = start()
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+class QueryBudget:
+    def __init__(self, queries, db_ms=None, duplicates=False):
+        self.queries = queries
+        self.db_ms = db_ms
+        self.duplicates = duplicates
+
+    def problems(self, stats):
+        problems = []
+        if stats.count > self.queries:
+            problems.append(f"{stats.count} queries, budget {self.queries}")
+        if self.db_ms is not None and stats.time_ms > self.db_ms:
+            problems.append(f"{stats.time_ms:.1f} ms in DB, budget {self.db_ms} ms")
+        if not self.duplicates:
+            problems.extend(f"{count}x {sql}" for sql, count in stats.duplicates.items())
+        return problems
+
+
+def query_budget(queries, db_ms=None, duplicates=False):
+    """
+    Declares the query budget of a view or a task function: at most ``queries``
+    queries, ``db_ms`` milliseconds in the database and, unless ``duplicates``,
+    no repeated query signature. Apply it above @api_view and below @shared_task.
+    """
+    def decorator(func):
+        func.query_budget = QueryBudget(queries, db_ms, duplicates)
+        return func
+
+    return decorator
+
+
+def check(name, budget, stats):
+    """Logs an exceeded budget; in strict mode also keeps it for take_violations()."""
+    if budget is None or stats is None:
+        return []
+    problems = budget.problems(stats)
+    if problems:
+        logger.warning("Query budget exceeded", extra={"target": name, "problems": problems, **stats.as_dict()})
+        if settings.QUERY_BUDGET_STRICT:
+            with _violations_lock:
+                _violations.append(f"{name}: {'; '.join(problems)}")
+    return problems
+
+
+def take_violations():
+    with _violations_lock:
+        violations = list(_violations)
+        _violations.clear()
+    return violations
@@ -0,0 +1,25 @@
+import asyncio
+import weakref
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """Shared client for the process, redis-py pools connections per client."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_async_redis():
+    """Shared asyncio client of the running event loop, its connections cannot cross loops."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return client
@@ -1,36 +1,66 @@
-from django.db.models import Sum, Count
+from datetime import datetime, time, timedelta
+from django.db.models import Sum
 from django.utils import timezone
 from django.utils.formats import date_format
-from pos.models import Order, OrderItem
+from pos.models import PosDailySales, ProductDailySales
 
-def build_daily_report(date=None):
-	today = date or timezone.localdate()
-	today_str = date_format(today, format="j E Y", use_l10n=True)
+def local_day_range(start_date, end_date=None):
+	"""[start, end) timestamps covering local days start_date..end_date, so created_at can use its index."""
+	end_date = end_date or start_date
+	start = timezone.make_aware(datetime.combine(start_date, time.min))
+	end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+	return start, end
 
-	orders = Order.objects.filter(created_at__date=today)
+def build_daily_report(date=None, end_date=None, pos_ids=None):
+	"""
+	Sales report for the local days date..end_date (today by default), optionally for
+	a subset of POS. Reads the daily rollups maintained by pos.rollups, two queries
+	over O(POS × days) rows whatever the order volume.
+	"""
+	start_date = date or timezone.localdate()
+	end_date = end_date or start_date
+	today_str = date_format(start_date, format="j E Y", use_l10n=True)
+	if end_date != start_date:
+		today_str = f"{today_str} — {date_format(end_date, format='j E Y', use_l10n=True)}"
 
-	total_orders = orders.count()
-	total_paid = orders.filter(state=Order.OrderState.PAID).count()
-	total_cancelled = orders.filter(state=Order.OrderState.CANCELLED).count()
-	total_archived = orders.filter(state=Order.OrderState.ARCHIEVE).count()
-	total_revenue = orders.filter(state=Order.OrderState.PAID).aggregate(total=Sum("total_price"))["total"] or 0
-	avg_check = round(total_revenue / total_paid, 2) if total_paid else 0
-	cancel_pct = round((total_cancelled / total_orders) * 100, 1) if total_orders else 0
+	sales = PosDailySales.objects.filter(day__gte=start_date, day__lte=end_date)
+	product_sales = ProductDailySales.objects.filter(day__gte=start_date, day__lte=end_date)
+	if pos_ids is not None:
+		sales = sales.filter(pos_id__in=pos_ids)
+		product_sales = product_sales.filter(pos_id__in=pos_ids)
+
+	rows = (
+		sales.values("pos_id", "pos__name")
+		.annotate(
+			count=Sum("orders"),
+			paid=Sum("paid"),
+			cancelled=Sum("cancelled"),
+			archived=Sum("archived"),
+			revenue=Sum("revenue"),
+		)
+		.filter(count__gt=0)
+		.order_by("pos__name", "pos_id")
+	)
 
 	pos_stats = []
-	for pos_id in orders.values_list("pos_id", flat=True).distinct():
-		pos_orders_qs = orders.filter(pos_id=pos_id)
-		pos_name = pos_orders_qs.first().pos.name if pos_orders_qs.exists() else f"POS {pos_id}"
-		pos_count = pos_orders_qs.count()
-		pos_revenue = pos_orders_qs.filter(state=Order.OrderState.PAID).aggregate(total=Sum("total_price"))["total"] or 0
-		pos_stats.append({"pos_id": pos_id, "pos_name": pos_name, "count": pos_count, "revenue": pos_revenue})
+	total_orders = total_paid = total_cancelled = total_archived = total_revenue = 0
+	for row in rows:
+		total_orders += row["count"]
+		total_paid += row["paid"]
+		total_cancelled += row["cancelled"]
+		total_archived += row["archived"]
+		total_revenue += row["revenue"]
+		pos_stats.append({"pos_id": row["pos_id"], "pos_name": row["pos__name"], "count": row["count"], "revenue": row["revenue"]})
+
+	avg_check = round(total_revenue / total_paid, 2) if total_paid else 0
+	cancel_pct = round((total_cancelled / total_orders) * 100, 1) if total_orders else 0
 
 	pos_lines = "\n".join([f"{s['pos_name']}: {s['count']} заказов, {s['revenue']} руб." for s in pos_stats]) if pos_stats else "Нет заказов по POS"
 
 	top_products = (
-		OrderItem.objects.filter(order__created_at__date=today, order__state=Order.OrderState.PAID)
-		.values("product__name")
-		.annotate(count=Count("id"))
+		product_sales.values("product__name")
+		.annotate(count=Sum("units"))
+		.filter(count__gt=0)
 		.order_by("-count")[:3]
 	)
 	top_lines = "\n".join([f"{i+1}. {p['product__name']} — {p['count']} шт." for i, p in enumerate(top_products)]) or "Нет продаж"
@@ -0,0 +1,72 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    Local HTTP server standing in for external APIs in tests and benchmarks.
+    ``responder(method, path, payload)`` returns ``(status, body)`` and may sleep
+    to simulate a slow upstream. Received requests are kept in ``calls`` and
+    their headers, in the same order, in ``headers``.
+    """
+
+    def __init__(self, responder, host="127.0.0.1", port=0):
+        self.responder = responder
+        self.calls = []
+        self.headers = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                content_type = self.headers.get("Content-Type", "")
+                if "json" in content_type and raw:
+                    payload = json.loads(raw)
+                else:
+                    payload = raw.decode()
+                stub.calls.append((self.command, self.path, payload))
+                stub.headers.append(dict(self.headers))
+                status, body = stub.responder(self.command, self.path, payload)
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,39 +1,46 @@
 import logging
-import redis
-from django.db.utils import OperationalError
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from core.utils.health import check_db, check_redis, check_celery
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from core.auth import auth_cache
+from core.utils import health as checks
+from core.utils import metrics as registry
+from core.utils.acquiring import get_gateway
 
 logger = logging.getLogger(__name__)
 
+READINESS_CHECKS = ["db", "redis"]
 
-@api_view(['GET'])
-def health(request):
-    status = {"db": True, "redis": True, "celery": True, "status": "ok"}
-
-    try:
-        check_db()
-    except OperationalError as e:
-        status["db"] = False
-        status["status"] = "error"
-        logger.error("DB health check failed", exc_info=e)
-
-    try:
-        check_redis()
-    except redis.exceptions.RedisError as e:
-        status["redis"] = False
-        status["status"] = "error"
-        logger.error("Redis health check failed", exc_info=e)
-
-    try:
-        if not check_celery():
-            status["celery"] = False
-            status["status"] = "error"
-            logger.error("Celery health check failed: no workers responding")
-    except Exception as e:
-        status["celery"] = False
-        status["status"] = "error"
-        logger.error("Celery health check failed", exc_info=e)
-
-    return Response(status)
+
+@require_GET
+async def live(request):
+    """Liveness: the process serves requests. Nothing external is touched, so a broken database never restarts the pod."""
+    return JsonResponse({"status": "ok"})
+
+
+@require_GET
+async def ready(request):
+    """Readiness: database and Redis answer, 503 takes the node out of the balancer."""
+    results = await checks.run_checks(READINESS_CHECKS)
+    ok = all(result["ok"] for result in results.values())
+    return JsonResponse({"status": "ok" if ok else "error", "checks": results}, status=200 if ok else 503)
+
+
+@require_GET
+async def health(request):
+    results = await checks.run_checks(list(checks.CHECKS))
+    status = {name: result["ok"] for name, result in results.items()}
+    status["status"] = "ok" if all(status.values()) else "error"
+    status["checks"] = results
+    status["cache"] = {"pos_auth": auth_cache.stats()}
+    status["acquiring"] = get_gateway().stats.snapshot()
+    return JsonResponse(status)
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape target with the totals of every web and Celery process."""
+    if settings.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        return JsonResponse({"detail": "Недействительный токен"}, status=403)
+    registry.flush()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
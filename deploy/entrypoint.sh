@@ -2,4 +2,14 @@
 set -e
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput
-exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --workers ${GUNICORN_WORKERS:-3} --log-file -
+
+# По умолчанию синхронные воркеры gunicorn: только они переиспользуют соединения с базой (DB_CONN_MAX_AGE).
+# SERVER_MODE=asgi включает uvicorn-воркеры, включать вместе с пулом соединений перед PostgreSQL (pgbouncer)
+if [ "${SERVER_MODE:-wsgi}" != "asgi" ]; then
+	exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --workers ${GUNICORN_WORKERS:-3} --log-file -
+fi
+
+# Под ASGI синхронный ORM работает в потоках asgiref, постоянные соединения там не переиспользуются
+export DB_CONN_MAX_AGE=${DB_CONN_MAX_AGE:-0}
+exec gunicorn core.asgi:application --bind 0.0.0.0:8000 --workers ${GUNICORN_WORKERS:-3} \
+	--worker-class uvicorn_worker.UvicornWorker --log-file -
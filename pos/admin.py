@@ -3,9 +3,11 @@ import logging
 from django.contrib import admin
 from django.http import HttpResponseRedirect
 from simple_history.admin import SimpleHistoryAdmin
+from core.auth import invalidate_pos_token
 from .flow import OrderFlow, PaymentFlow
+from . import ledger
 from .models import (
-    PointOfSale, PointOfSaleToken, Category, Product, Stock,
+    PointOfSale, PointOfSaleToken, Category, Product, Stock, StockMovement,
     Order, OrderItem, OrderComment,
     Payment, Receipt
 )
@@ -37,9 +39,11 @@ class PointOfSaleTokenAdmin(admin.ModelAdmin):
         if '_gen_token' in request.POST:
             pos_token = self.get_object(request, object_id)
             if pos_token:
+                old_token = pos_token.token
                 new_token = str(uuid.uuid4())
                 pos_token.token = new_token
                 pos_token.save(update_fields=["token"])
+                invalidate_pos_token(old_token)
                 self.message_user(request, f"Новый токен сгенерирован: {new_token}")
                 logger.info(f"Token for POS {pos_token.pos.name} (id={pos_token.pos.id}) was changed")
             return HttpResponseRedirect(request.path)
@@ -67,10 +71,51 @@ class ProductAdmin(SimpleHistoryAdmin):
 
 @admin.register(Stock)
 class StockAdmin(SimpleHistoryAdmin):
-    list_display = ["product", "pos", "quantity", "is_active"]
-    list_filter = ["pos", "is_active"]
+    list_display = ["product", "pos", "current_quantity", "is_active", "oversold"]
+    list_filter = ["pos", "is_active", "oversold"]
     search_fields = ["product__name", "pos__name"]
 
+    def get_queryset(self, request):
+        return ledger.with_pending(super().get_queryset(request))
+
+    def get_readonly_fields(self, request, obj=None):
+        # Остаток существующей позиции меняется только движениями
+        return ["quantity", "current_quantity"] if obj else []
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
+
+    @admin.display(description="Текущий остаток")
+    def current_quantity(self, obj):
+        return obj.current_quantity
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ["id", "stock", "kind", "delta", "order", "compacted", "created_at"]
+    list_select_related = ["stock__product", "stock__pos", "order__pos"]
+    list_filter = ["kind", "compacted", "stock__pos"]
+    search_fields = ["stock__product__name", "order__id"]
+    raw_id_fields = ["stock", "order"]
+    fields = ["stock", "kind", "delta", "comment"]
+
+    def formfield_for_choice_field(self, db_field, request, **kwargs):
+        if db_field.name == "kind":
+            # Продажи записывает только оплата заказа
+            kwargs["choices"] = [
+                choice for choice in StockMovement.MovementKind.choices if choice[0] != StockMovement.MovementKind.SALE
+            ]
+        return super().formfield_for_choice_field(db_field, request, **kwargs)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
     def has_delete_permission(self, request, obj=None):
         return False
 
@@ -0,0 +1,150 @@
+import logging
+import time
+from django.conf import settings
+from core.utils.cache import TwoTierCache
+from . import ledger
+from .models import PointOfSale, Stock
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SCHEMA = 1
+
+catalog_cache = TwoTierCache(
+    f"catalog:v{CATALOG_SCHEMA}",
+    local_ttl=settings.CATALOG_CACHE_LOCAL_TTL,
+    shared_ttl=settings.CATALOG_CACHE_TTL,
+    maxsize=settings.CATALOG_CACHE_LOCAL_SIZE,
+)
+
+UNAVAILABLE = {"is_active": False}
+
+
+def _pos_key(code):
+    return f"pos:{code}"
+
+
+def _entry_key(pos, barcode):
+    return f"{pos['id']}:{pos['version']}:{barcode}"
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def build_entry(stock):
+    from api.serializers import ProductSerializer
+
+    entry = dict(ProductSerializer(stock.product, context={"stock": stock}).data)
+    entry["is_active"] = stock.is_active
+    return entry
+
+
+def get_pos(code):
+    """
+    Returns {"id", "code", "version"} for the point of sale or None. Entries are
+    keyed by version, so dropping the record orphans the whole per-POS index.
+    """
+    pos = catalog_cache.get(_pos_key(code))
+    if pos is None:
+        pos_id = PointOfSale.objects.filter(code=code).values_list("id", flat=True).first()
+        if pos_id is None:
+            return None
+        pos = {"id": pos_id, "code": code, "version": _new_version()}
+        catalog_cache.set(_pos_key(code), pos)
+    return pos
+
+
+async def aget_pos(code):
+    pos = await catalog_cache.aget(_pos_key(code))
+    if pos is None:
+        pos_id = await PointOfSale.objects.filter(code=code).values_list("id", flat=True).afirst()
+        if pos_id is None:
+            return None
+        pos = {"id": pos_id, "code": code, "version": _new_version()}
+        await catalog_cache.aset(_pos_key(code), pos)
+    return pos
+
+
+def get_product(pos, barcode):
+    entry = catalog_cache.get(_entry_key(pos, barcode))
+    if entry is None:
+        stock = (
+            ledger.with_pending(Stock.objects.select_related("product__category"))
+            .filter(pos_id=pos["id"], product__barcode=barcode)
+            .first()
+        )
+        entry = build_entry(stock) if stock else UNAVAILABLE
+        catalog_cache.set(_entry_key(pos, barcode), entry)
+
+    if not entry["is_active"]:
+        return None
+    return {key: value for key, value in entry.items() if key != "is_active"}
+
+
+async def aget_product(pos, barcode):
+    entry = await catalog_cache.aget(_entry_key(pos, barcode))
+    if entry is None:
+        stock = await (
+            ledger.with_pending(Stock.objects.select_related("product__category"))
+            .filter(pos_id=pos["id"], product__barcode=barcode)
+            .afirst()
+        )
+        entry = build_entry(stock) if stock else UNAVAILABLE
+        await catalog_cache.aset(_entry_key(pos, barcode), entry)
+
+    if not entry["is_active"]:
+        return None
+    return {key: value for key, value in entry.items() if key != "is_active"}
+
+
+def get_products(pos, barcodes):
+    """Resolves barcodes with one query and warms the index with the result."""
+    stocks = (
+        ledger.with_pending(Stock.objects.select_related("product__category"))
+        .filter(pos_id=pos["id"], product__barcode__in=barcodes)
+    )
+    entries = {barcode: UNAVAILABLE for barcode in barcodes}
+    for stock in stocks:
+        entries[stock.product.barcode] = build_entry(stock)
+    catalog_cache.set_many({_entry_key(pos, barcode): entry for barcode, entry in entries.items()})
+
+    return {
+        barcode: {key: value for key, value in entry.items() if key != "is_active"} if entry["is_active"] else None
+        for barcode, entry in entries.items()
+    }
+
+
+def refresh_stocks(stocks):
+    """Stocks must come with pos and product__category loaded and with_pending() applied."""
+    entries = {}
+    for stock in stocks:
+        if not stock.product.barcode:
+            continue
+        pos = get_pos(stock.pos.code)
+        if pos is None:
+            continue
+        entries[_entry_key(pos, stock.product.barcode)] = build_entry(stock)
+    if entries:
+        catalog_cache.set_many(entries)
+    logger.info("Catalog index refreshed", extra={"entries": len(entries)})
+
+
+def refresh_stock_ids(stock_ids):
+    refresh_stocks(ledger.with_pending(Stock.objects.select_related("pos", "product__category")).filter(id__in=stock_ids))
+
+
+def forget_barcode(pos_codes, barcode):
+    entries = {}
+    for code in pos_codes:
+        pos = get_pos(code)
+        if pos is not None:
+            entries[_entry_key(pos, barcode)] = UNAVAILABLE
+    if entries:
+        catalog_cache.set_many(entries)
+
+
+def reset_pos(code, old_code=None):
+    if old_code and old_code != code:
+        catalog_cache.delete(_pos_key(old_code))
+    catalog_cache.delete(_pos_key(code))
+    logger.info("Catalog index reset", extra={"pos_code": code})
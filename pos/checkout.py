@@ -0,0 +1,88 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import expiry, ledger, reservations
+from .models import Product, Stock, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def merge_items(items):
+    quantities = {}
+    for item in items:
+        quantities[item["barcode"]] = quantities.get(item["barcode"], 0) + item["quantity"]
+    return quantities
+
+
+def create_order(pos, items):
+    """
+    Creates an order with a fixed number of queries regardless of basket size:
+    duplicate barcodes are merged, products and stocks are read without locks,
+    items are bulk inserted and the total is computed in memory, so the order
+    row is written once. Stock is not touched here: the basket is held in Redis
+    until the order is paid, cancelled or expires after ORDER_TTL.
+    """
+    quantities = merge_items(items)
+
+    products = {
+        product.barcode: product
+        for product in Product.objects.select_related("category").filter(barcode__in=quantities)
+    }
+    for barcode in quantities:
+        if barcode not in products:
+            logger.warning(f"Продукт с штрихкодом {barcode} не найден")
+            raise CheckoutError(f"Продукт с штрихкодом {barcode} не найден")
+
+    stocks = {stock.product_id: stock for stock in Stock.objects.filter(pos=pos, product__in=products.values())}
+
+    order_items = []
+    for barcode, quantity in quantities.items():
+        product = products[barcode]
+        stock = stocks.get(product.id)
+        if not stock or not stock.is_active:
+            logger.warning(f"Точка {pos.code}, Недостаточно товара {product.name}")
+            raise CheckoutError(f"Недостаточно товара {product.name}")
+        order_items.append(OrderItem(
+            product=product,
+            quantity=quantity,
+            price=product.price,
+            total_price=quantity * product.price,
+        ))
+
+    order = None
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                pos=pos,
+                total_price=sum(item.total_price for item in order_items),
+                expires_at=timezone.now() + timedelta(seconds=settings.ORDER_TTL),
+            )
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            # Остаток читается после резерва, иначе продажа между чтением и резервом не будет видна
+            reservations.reserve(
+                order,
+                {item.product_id: item.quantity for item in order_items},
+                lambda: {
+                    stock.product_id: stock.current_quantity
+                    for stock in ledger.with_pending(Stock.objects.filter(id__in=[stock.id for stock in stocks.values()]))
+                },
+            )
+            transaction.on_commit(lambda: expiry.schedule(order))
+    except reservations.InsufficientStock as e:
+        names = ", ".join(product.name for product in products.values() if product.id in e.product_ids)
+        logger.warning(f"Точка {pos.code}, Недостаточно товара {names}")
+        raise CheckoutError(f"Недостаточно товара {names}")
+    except Exception:
+        if order is not None and order.id is not None:
+            reservations.release([order.id])
+        raise
+
+    return order
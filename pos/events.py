@@ -0,0 +1,24 @@
+import json
+import logging
+from redis.exceptions import RedisError
+from core.utils.redis_client import get_redis
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATES = {Order.OrderState.PAID, Order.OrderState.CANCELLED, Order.OrderState.ARCHIEVE}
+
+
+def order_channel(order_id):
+    return f"order:{order_id}:state"
+
+
+def publish_states(orders, state):
+    """Wakes up kiosks waiting on order_events. Delivery is best effort, kiosks reconnect."""
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for order in orders:
+            pipe.publish(order_channel(order.id), json.dumps({"state": state}))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Order state publish failed", extra={"error": str(e)})
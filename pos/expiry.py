@@ -0,0 +1,53 @@
+import logging
+import time
+from django.conf import settings
+from django.db import transaction
+from core.utils.redis_client import get_redis
+from .archival import archive_locked
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_KEY = "orders:expiry"
+
+
+def schedule(order):
+    """Queues the order for archival at order.expires_at. Called after the order is committed."""
+    get_redis().zadd(SCHEDULE_KEY, {order.id: order.expires_at.timestamp()})
+
+
+def unschedule(order_ids):
+    if order_ids:
+        get_redis().zrem(SCHEDULE_KEY, *order_ids)
+
+
+def expire_due(limit=None):
+    """
+    Archives the orders whose expiry has passed, taking at most ``limit`` from the
+    schedule. Orders locked by a running payment are skipped and stay queued;
+    orders that are no longer CREATED are just dropped from the schedule.
+    """
+    redis = get_redis()
+    order_ids = [
+        int(order_id)
+        for order_id in redis.zrangebyscore(
+            SCHEDULE_KEY, "-inf", time.time(), start=0, num=limit or settings.ORDER_EXPIRY_BATCH_SIZE
+        )
+    ]
+    if not order_ids:
+        return []
+
+    with transaction.atomic():
+        orders = list(Order.objects.select_for_update(skip_locked=True).filter(id__in=order_ids).order_by("id"))
+        archived, _ = archive_locked(orders)
+
+    done = {order.id for order in orders}
+    missing = set(order_ids) - done
+    if missing:
+        locked = set(Order.objects.filter(id__in=missing).values_list("id", flat=True))
+        done |= missing - locked
+    unschedule(list(done))
+
+    if archived:
+        logger.info("Expired orders archived", extra={"orders": len(archived)})
+    return [order.id for order in archived]
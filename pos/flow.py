@@ -1,7 +1,9 @@
 import logging
 from django.utils import timezone
+from core.utils import metrics
 from viewflow import fsm
 from .models import Order, Payment
+from .signals import order_state_changed
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +37,7 @@ class OrderFlow:
     @state.on_success()
     def _on_success(self, descriptor, source, target):
         self.order.save()
+        order_state_changed.send(sender=Order, orders=[self.order], source=source, target=target)
 
 
 class PaymentFlow:
@@ -64,3 +67,60 @@ class PaymentFlow:
         if target in [Payment.PaymentState.PAID, Payment.PaymentState.FAILED]:
             self.payment.processed_at = timezone.now()
         self.payment.save()
+        metrics.fsm_transitions.inc(model="payment", source=source, target=target)
+
+
+# Source states of the OrderFlow transitions, by target.
+ORDER_TRANSITIONS = {
+    Order.OrderState.PAID: [Order.OrderState.CREATED],
+    Order.OrderState.CANCELLED: [Order.OrderState.CREATED, Order.OrderState.PAID],
+    Order.OrderState.ARCHIEVE: [Order.OrderState.CREATED],
+}
+
+
+def bulk_transition_orders(orders, target):
+    """
+    Set-based counterpart of OrderFlow for batch jobs. The orders must be locked by
+    the caller. Each source state is moved with one conditional UPDATE, history rows
+    are bulk inserted and order_state_changed is sent once per source state.
+    Orders whose state does not allow the transition are left untouched.
+    """
+    by_source = {}
+    for order in orders:
+        if order.state in ORDER_TRANSITIONS[target]:
+            by_source.setdefault(order.state, []).append(order)
+
+    now = timezone.now()
+    moved = []
+    for source, group in by_source.items():
+        Order.objects.filter(id__in=[order.id for order in group], state=source).update(state=target, updated_at=now)
+        for order in group:
+            order.state = target
+            order.updated_at = now
+        Order.history.bulk_history_create(group, update=True)
+        order_state_changed.send(sender=Order, orders=group, source=source, target=target)
+        moved.extend(group)
+
+    if moved:
+        logger.info(f"{len(moved)} orders moved to {target}")
+    return moved
+
+
+def bulk_transition_payments(payments, target):
+    """Set-based counterpart of PaymentFlow for PENDING payments locked by the caller."""
+    payments = [payment for payment in payments if payment.state == Payment.PaymentState.PENDING]
+    if not payments:
+        return []
+
+    now = timezone.now()
+    Payment.objects.filter(
+        id__in=[payment.id for payment in payments], state=Payment.PaymentState.PENDING
+    ).update(state=target, processed_at=now)
+    for payment in payments:
+        payment.state = target
+        payment.processed_at = now
+    Payment.history.bulk_history_create(payments, update=True)
+    metrics.fsm_transitions.inc(len(payments), model="payment", source=Payment.PaymentState.PENDING, target=target)
+
+    logger.info(f"{len(payments)} payments marked as {target}")
+    return payments
@@ -0,0 +1,84 @@
+"""
+Append-only stock movement ledger.
+
+Sales, restocks and corrections only insert StockMovement rows, so concurrent
+checkouts of a popular product never wait on the lock of its Stock row. The
+current quantity is Stock.quantity plus the movements not yet compacted; the
+compaction task folds them into Stock.quantity in the background, one short
+UPDATE per batch instead of one per sale. Folded movements stay as the audit trail.
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from .models import Stock, StockMovement
+
+logger = logging.getLogger(__name__)
+
+
+def _pending_sum():
+    return Coalesce(
+        Subquery(
+            StockMovement.objects.filter(stock=OuterRef("pk"), compacted=False)
+            .order_by()
+            .values("stock")
+            .annotate(total=Sum("delta"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def with_pending(queryset):
+    """Annotates stocks with pending_quantity, the sum read by Stock.current_quantity."""
+    return queryset.annotate(pending_quantity=_pending_sum())
+
+
+def flag_oversold(stock_ids):
+    """Marks stocks whose quantity went below zero, they show up in the admin filter."""
+    if stock_ids:
+        Stock.objects.filter(id__in=stock_ids).update(oversold=True)
+
+
+def record_sales(movements):
+    """Inserts SALE movements from {(stock_id, order_id): quantity} with one statement."""
+    return StockMovement.objects.bulk_create([
+        StockMovement(stock_id=stock_id, order_id=order_id, delta=-quantity, kind=StockMovement.MovementKind.SALE)
+        for (stock_id, order_id), quantity in sorted(movements.items())
+    ])
+
+
+def compact(batch_size=None):
+    """
+    Folds up to ``batch_size`` pending movements into Stock.quantity. Movements are
+    claimed with SKIP LOCKED, so parallel runs split the backlog, and stocks are
+    locked in primary key order. Returns {"movements", "stocks"}.
+    """
+    batch_size = batch_size or settings.STOCK_COMPACTION_BATCH_SIZE
+    with transaction.atomic():
+        movements = list(
+            StockMovement.objects.select_for_update(skip_locked=True)
+            .filter(compacted=False)
+            .order_by("id")
+            .values_list("id", "stock_id", "delta")[:batch_size]
+        )
+        if not movements:
+            return {"movements": 0, "stocks": 0}
+
+        deltas = {}
+        for _, stock_id, delta in movements:
+            deltas[stock_id] = deltas.get(stock_id, 0) + delta
+        stock_ids = sorted(deltas)
+        list(Stock.objects.select_for_update().filter(id__in=stock_ids).order_by("id").values_list("id", flat=True))
+        Stock.objects.filter(id__in=stock_ids).update(
+            quantity=F("quantity") + Case(*[When(id=stock_id, then=Value(deltas[stock_id])) for stock_id in stock_ids])
+        )
+        StockMovement.objects.filter(id__in=[movement_id for movement_id, _, _ in movements]).update(compacted=True)
+
+    oversold = list(Stock.objects.filter(id__in=stock_ids, quantity__lt=0).values_list("id", flat=True))
+    if oversold:
+        flag_oversold(oversold)
+        logger.error("Stock quantity below zero after compaction", extra={"stock_ids": oversold})
+    logger.info("Stock movements compacted", extra={"movements": len(movements), "stocks": len(stock_ids)})
+    return {"movements": len(movements), "stocks": len(stock_ids)}
@@ -0,0 +1,282 @@
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core.utils.acquiring import reset_gateway
+from core.utils.stubs import StubServer
+from pos import catalog, ledger, reservations
+from pos.models import Category, Order, OrderItem, PointOfSale, PointOfSaleToken, Product, Stock
+
+ENDPOINTS = ["product-by-barcode", "create-order", "create-payment", "order-status", "mark-payment-paid"]
+
+
+def percentile(values, share):
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет полный сценарий киоска на локальных Postgres и Redis: сканирование товаров, "
+        "создание заказа и оплаты, опрос статуса и вебхук оплаты. Считает p50/p95/p99, rps и запросы к БД "
+        "по каждому эндпоинту, проверяет остатки на перепродажу и сохраняет результат в JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pos", type=int, default=5, help="Число точек продаж")
+        parser.add_argument("--skus", type=int, default=100, help="Число товаров на каждой точке")
+        parser.add_argument("--kiosks", type=int, default=20, help="Число одновременно работающих киосков")
+        parser.add_argument("--duration", type=float, default=30.0, help="Длительность прогона, секунды")
+        parser.add_argument(
+            "--sessions", type=int, help="Число покупателей на киоск; если задано, прогон идёт до них, а не по времени"
+        )
+        parser.add_argument("--stock", type=int, default=50, help="Начальный остаток каждого товара")
+        parser.add_argument("--basket", type=int, default=3, help="Товаров в корзине")
+        parser.add_argument("--polls", type=int, default=3, help="Опросов статуса до оплаты")
+        parser.add_argument("--acquiring-delay-ms", type=int, default=50, help="Задержка заглушки эквайринга")
+        parser.add_argument(
+            "--compact-every", type=float, default=30.0,
+            help="Интервал сжатия журнала движений, секунды; 0 — только после прогона",
+        )
+        parser.add_argument("--label", default="", help="Метка прогона в отчёте")
+        parser.add_argument("--output", help="Файл отчёта, по умолчанию bench-results/checkout-<время>.json")
+
+    def setup(self, options):
+        """Creates or resets the bench points of sale, products and stocks. Returns [(pos code, token)] and barcodes."""
+        category, _ = Category.objects.get_or_create(name="Нагрузочный тест")
+        barcodes = [f"bench-sku-{index:05d}" for index in range(options["skus"])]
+        Product.objects.bulk_create(
+            [
+                Product(name=f"Тестовый товар {barcode}", barcode=barcode, price=random.randint(50, 500), category=category)
+                for barcode in barcodes
+            ],
+            ignore_conflicts=True,
+        )
+        products = list(Product.objects.filter(barcode__in=barcodes))
+
+        points = []
+        for index in range(options["pos"]):
+            pos, _ = PointOfSale.objects.get_or_create(code=f"bench-{index:03d}", defaults={"name": f"Нагрузочный тест {index}"})
+            token, _ = PointOfSaleToken.objects.update_or_create(pos=pos, defaults={"token": uuid.uuid4().hex})
+            points.append((pos, token.token))
+
+        pos_ids = [pos.id for pos, _ in points]
+        Stock.objects.bulk_create(
+            [Stock(pos=pos, product=product) for pos, _ in points for product in products],
+            ignore_conflicts=True,
+        )
+        # Незакрытые заказы прошлых прогонов держат резерв, а несжатые движения сдвинут сброшенный остаток
+        reservations.release(
+            list(Order.objects.filter(pos_id__in=pos_ids, state=Order.OrderState.CREATED).values_list("id", flat=True))
+        )
+        while ledger.compact()["movements"]:
+            pass
+        stocks = Stock.objects.filter(pos_id__in=pos_ids, product__in=products)
+        stocks.update(quantity=options["stock"], is_active=True)
+        catalog.refresh_stock_ids(list(stocks.values_list("id", flat=True)))
+        return [(pos.code, token) for pos, token in points], barcodes
+
+    def call(self, client, samples, endpoint, method, path, data=None, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if method == "get":
+                response = client.get(path, data, headers=headers)
+            else:
+                response = client.post(path, data, content_type="application/json", headers=headers)
+            elapsed = (time.perf_counter() - started) * 1000
+        samples.append((endpoint, elapsed, response.status_code, len(queries)))
+        return response
+
+    def session(self, client, samples, pos_code, barcodes, options):
+        """One customer at the kiosk. Returns the order id, or None when the basket was refused for lack of stock."""
+        basket = random.sample(barcodes, min(options["basket"], len(barcodes)))
+        for barcode in basket:
+            self.call(client, samples, "product-by-barcode", "get", reverse("product-by-barcode", args=[barcode]), {"pos_code": pos_code})
+
+        response = self.call(
+            client, samples, "create-order", "post", reverse("create-order"),
+            {"pos_code": pos_code, "order": [{"barcode": barcode, "quantity": 1} for barcode in basket]},
+            idempotency_key=uuid.uuid4().hex,
+        )
+        if response.status_code != 200:
+            return None
+        order_id = response.json()["order_id"]
+
+        self.call(
+            client, samples, "create-payment", "post", reverse("create-payment"),
+            {"order_id": order_id, "payment_type": random.choice(["card", "sbp"])}, idempotency_key=uuid.uuid4().hex,
+        )
+        status_url = reverse("order-status", args=[order_id])
+        for _ in range(options["polls"]):
+            self.call(client, samples, "order-status", "get", status_url)
+        self.call(client, samples, "mark-payment-paid", "post", reverse("mark-payment-paid"), {"order_id": order_id})
+        self.call(client, samples, "order-status", "get", status_url)
+        return order_id
+
+    def kiosk(self, pos_code, token, barcodes, options, deadline, results, lock):
+        client = Client(HTTP_AUTHORIZATION=f"Token {token}", raise_request_exception=False)
+        samples, orders, refused = [], [], 0
+        try:
+            while (
+                len(orders) + refused < options["sessions"] if options["sessions"] else time.monotonic() < deadline
+            ):
+                order_id = self.session(client, samples, pos_code, barcodes, options)
+                if order_id is None:
+                    refused += 1
+                else:
+                    orders.append(order_id)
+        finally:
+            connection.close()
+        with lock:
+            results["samples"].extend(samples)
+            results["orders"].extend(orders)
+            results["refused"] += refused
+
+    def compactor(self, interval, stop):
+        try:
+            while not stop.wait(interval):
+                ledger.compact()
+        finally:
+            connection.close()
+
+    def endpoint_stats(self, samples, elapsed):
+        stats = {}
+        for endpoint in ENDPOINTS:
+            calls = [sample for sample in samples if sample[0] == endpoint]
+            if not calls:
+                continue
+            timings = sorted(sample[1] for sample in calls)
+            queries = [sample[3] for sample in calls]
+            # Отказ в заказе из-за нехватки остатка — ожидаемый ответ, а не ошибка
+            errors = sum(1 for sample in calls if sample[2] >= 400 and not (endpoint == "create-order" and sample[2] == 400))
+            stats[endpoint] = {
+                "requests": len(calls),
+                "rps": round(len(calls) / elapsed, 2),
+                "p50_ms": round(percentile(timings, 0.5), 2),
+                "p95_ms": round(percentile(timings, 0.95), 2),
+                "p99_ms": round(percentile(timings, 0.99), 2),
+                "errors": errors,
+                "queries_avg": round(sum(queries) / len(queries), 2),
+                "queries_max": max(queries),
+            }
+        return stats
+
+    def oversold(self, pos_codes, barcodes, orders, initial):
+        """Stocks that went below zero or whose quantity disagrees with the paid orders of the run."""
+        while ledger.compact()["movements"]:
+            pass
+        sold = {}
+        for pos_code, barcode, total in (
+            OrderItem.objects.filter(order_id__in=orders, order__state=Order.OrderState.PAID)
+            .values_list("order__pos__code", "product__barcode")
+            .annotate(total=Sum("quantity"))
+            .order_by()
+        ):
+            sold[(pos_code, barcode)] = total
+
+        problems = []
+        for pos_code, barcode, quantity in Stock.objects.filter(
+            pos__code__in=pos_codes, product__barcode__in=barcodes
+        ).values_list("pos__code", "product__barcode", "quantity"):
+            expected = initial - sold.get((pos_code, barcode), 0)
+            if quantity < 0 or quantity != expected:
+                problems.append({"pos": pos_code, "barcode": barcode, "quantity": quantity, "expected": expected})
+        return problems
+
+    def handle(self, *args, **options):
+        for name in ("pos", "skus", "kiosks", "basket"):
+            if options[name] < 1:
+                raise CommandError(f"--{name} должно быть больше нуля")
+        if options["duration"] <= 0:
+            raise CommandError("--duration должно быть больше нуля")
+        if options["sessions"] is not None and options["sessions"] < 1:
+            raise CommandError("--sessions должно быть больше нуля")
+
+        points, barcodes = self.setup(options)
+        self.stdout.write(
+            f"Точек {len(points)}, товаров {len(barcodes)}, киосков {options['kiosks']}, {options['duration']:.0f} с"
+        )
+
+        def acquirer(method, path, payload):
+            time.sleep(options["acquiring_delay_ms"] / 1000)
+            return 200, {"payment_url": f"https://bench.local/pay/{uuid.uuid4()}"}
+
+        results = {"samples": [], "orders": [], "refused": 0}
+        lock, stop = threading.Lock(), threading.Event()
+        with StubServer(acquirer) as stub, override_settings(
+            ACQUIRING_URL=stub.url, ACQUIRING_BACKEND="core.utils.acquiring.HttpAcquiringGateway"
+        ):
+            reset_gateway()
+            try:
+                deadline = time.monotonic() + options["duration"]
+                threads = [
+                    threading.Thread(
+                        target=self.kiosk,
+                        args=(*points[index % len(points)], barcodes, options, deadline, results, lock),
+                        daemon=True,
+                    )
+                    for index in range(options["kiosks"])
+                ]
+                if options["compact_every"] > 0:
+                    threads.append(
+                        threading.Thread(target=self.compactor, args=(options["compact_every"], stop), daemon=True)
+                    )
+                started = time.monotonic()
+                for thread in threads:
+                    thread.start()
+                for thread in threads[:options["kiosks"]]:
+                    thread.join()
+                elapsed = time.monotonic() - started
+                stop.set()
+                for thread in threads[options["kiosks"]:]:
+                    thread.join()
+            finally:
+                reset_gateway()
+
+        pos_codes = [pos_code for pos_code, _ in points]
+        report = {
+            "label": options["label"],
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "database": connection.vendor,
+            "params": {
+                name: options[name]
+                for name in (
+                    "pos", "skus", "kiosks", "duration", "sessions", "stock", "basket", "polls", "acquiring_delay_ms",
+                    "compact_every",
+                )
+            },
+            "elapsed_s": round(elapsed, 2),
+            "sessions": {
+                "paid": Order.objects.filter(id__in=results["orders"], state=Order.OrderState.PAID).count(),
+                "orders": len(results["orders"]),
+                "refused": results["refused"],
+                "per_second": round((len(results["orders"]) + results["refused"]) / elapsed, 2),
+            },
+            "endpoints": self.endpoint_stats(results["samples"], elapsed),
+            "oversold": self.oversold(pos_codes, barcodes, results["orders"], options["stock"]),
+        }
+
+        for endpoint, stats in report["endpoints"].items():
+            self.stdout.write(
+                f"{endpoint}: {stats['requests']} запросов, {stats['rps']:.1f} rps, p50 {stats['p50_ms']:.1f} мс, "
+                f"p95 {stats['p95_ms']:.1f} мс, p99 {stats['p99_ms']:.1f} мс, запросов к БД {stats['queries_avg']:.1f}, "
+                f"ошибок {stats['errors']}"
+            )
+        sessions = report["sessions"]
+        self.stdout.write(f"Заказов {sessions['orders']}, оплачено {sessions['paid']}, отказов по остатку {sessions['refused']}")
+
+        path = Path(options["output"] or f"bench-results/checkout-{datetime.now():%Y%m%d-%H%M%S}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+        if report["oversold"]:
+            self.stdout.write(self.style.ERROR(f"Перепроданы или расходятся остатки: {len(report['oversold'])}"))
+        self.stdout.write(self.style.SUCCESS(f"Отчёт сохранён в {path}"))
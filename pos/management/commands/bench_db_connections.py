@@ -0,0 +1,56 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает задержку запроса к БД с новым соединением на каждый запрос (CONN_MAX_AGE=0) "
+        "и с постоянным соединением"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Число запросов на режим")
+        parser.add_argument("--max-age", type=int, default=60, help="CONN_MAX_AGE постоянного режима, секунды")
+
+    def run(self, max_age, requests):
+        """Проходит цикл запроса Django: сигналы начала и конца закрывают устаревшее соединение, как в gunicorn."""
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = max_age
+        timings = []
+        for _ in range(requests):
+            request_started.send(sender=self.__class__)
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            timings.append((time.perf_counter() - started) * 1000)
+            request_finished.send(sender=self.__class__)
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f"{label}: среднее {statistics.mean(timings):.3f} мс, "
+            f"p50 {statistics.median(timings):.3f} мс, p95 {p95:.3f} мс"
+        )
+        return statistics.mean(timings)
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests должно быть больше нуля")
+        if connection.in_atomic_block:
+            raise CommandError("Замер нельзя выполнять внутри транзакции")
+
+        original = connection.settings_dict["CONN_MAX_AGE"]
+        try:
+            fresh = self.report("Новое соединение", self.run(0, options["requests"]))
+            persistent = self.report("Постоянное соединение", self.run(options["max_age"], options["requests"]))
+        finally:
+            connection.close()
+            connection.settings_dict["CONN_MAX_AGE"] = original
+
+        self.stdout.write(self.style.SUCCESS(f"Установка соединения: {fresh - persistent:.3f} мс на запрос"))
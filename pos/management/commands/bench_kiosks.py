@@ -0,0 +1,118 @@
+import statistics
+import threading
+import time
+import uuid
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from pos.models import Category, Order, PointOfSale, PointOfSaleToken, Product, Stock
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[max(int(len(values) * share) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает узел растущим числом киосков, которые сканируют товар и опрашивают статус заказа, "
+        "и находит наибольшее число киосков, при котором p95 укладывается в порог. "
+        "Запуск против WSGI и ASGI узла даёт сравнение до и после"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8000", help="Адрес узла")
+        parser.add_argument("--token", help="Токен точки продаж; без него точка, товар и заказ создаются в БД")
+        parser.add_argument("--pos-code")
+        parser.add_argument("--barcode")
+        parser.add_argument("--order-id", type=int)
+        parser.add_argument("--levels", default="10,25,50,100,200", help="Числа киосков через запятую")
+        parser.add_argument("--duration", type=float, default=10.0, help="Длительность ступени, секунды")
+        parser.add_argument("--interval", type=float, default=1.0, help="Пауза киоска между запросами, секунды")
+        parser.add_argument("--p95-ms", type=float, default=500.0, help="Порог p95, мс")
+        parser.add_argument("--max-errors", type=float, default=0.01, help="Допустимая доля ошибок")
+
+    def setup(self):
+        pos, _ = PointOfSale.objects.get_or_create(code="bench", defaults={"name": "Нагрузочный тест"})
+        token, _ = PointOfSaleToken.objects.update_or_create(pos=pos, defaults={"token": uuid.uuid4().hex})
+        category, _ = Category.objects.get_or_create(name="Нагрузочный тест")
+        product, _ = Product.objects.get_or_create(
+            barcode="bench-0001", defaults={"name": "Тестовый товар", "price": 100, "category": category}
+        )
+        Stock.objects.update_or_create(pos=pos, product=product, defaults={"quantity": 1000000, "is_active": True})
+        order = Order.objects.create(pos=pos)
+        return token.token, pos.code, product.barcode, order.id
+
+    def kiosk(self, options, deadline, samples, lock):
+        session = requests.Session()
+        session.headers["Authorization"] = f"Token {options['token']}"
+        urls = [
+            (f"{options['url']}/api/product/{options['barcode']}/", {"pos_code": options["pos_code"]}),
+            (f"{options['url']}/api/order/status/{options['order_id']}/", None),
+        ]
+        step = 0
+        while time.monotonic() < deadline:
+            url, params = urls[step % len(urls)]
+            step += 1
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, params=params, timeout=10).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.append((elapsed, ok))
+            time.sleep(max(options["interval"] - elapsed / 1000, 0))
+
+    def run_level(self, options, kiosks):
+        samples, lock = [], threading.Lock()
+        deadline = time.monotonic() + options["duration"]
+        threads = [
+            threading.Thread(target=self.kiosk, args=(options, deadline, samples, lock), daemon=True)
+            for _ in range(kiosks)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        timings = [sample[0] for sample in samples]
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "kiosks": kiosks,
+            "requests": len(samples),
+            "rps": len(samples) / elapsed if elapsed else 0,
+            "p50": statistics.median(timings) if timings else 0,
+            "p95": percentile(timings, 0.95) if timings else 0,
+            "errors": errors / len(samples) if samples else 1,
+        }
+
+    def handle(self, *args, **options):
+        try:
+            levels = sorted({int(level) for level in options["levels"].split(",")})
+        except ValueError:
+            raise CommandError("--levels: числа через запятую")
+        if not levels or levels[0] < 1:
+            raise CommandError("--levels: числа должны быть больше нуля")
+
+        if not options["token"]:
+            options["token"], options["pos_code"], options["barcode"], options["order_id"] = self.setup()
+        elif not (options["pos_code"] and options["barcode"] and options["order_id"]):
+            raise CommandError("С --token нужны --pos-code, --barcode и --order-id")
+
+        options["url"] = options["url"].rstrip("/")
+        sustained = 0
+        for kiosks in levels:
+            result = self.run_level(options, kiosks)
+            passed = result["p95"] <= options["p95_ms"] and result["errors"] <= options["max_errors"]
+            self.stdout.write(
+                f"{kiosks} киосков: {result['requests']} запросов, {result['rps']:.1f} rps, "
+                f"p50 {result['p50']:.1f} мс, p95 {result['p95']:.1f} мс, ошибок {result['errors']:.1%}"
+                f" — {'держит' if passed else 'не держит'}"
+            )
+            if not passed:
+                break
+            sustained = kiosks
+
+        self.stdout.write(self.style.SUCCESS(f"Узел выдерживает киосков: {sustained}"))
@@ -0,0 +1,29 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from pos import rollups
+from pos.models import PointOfSale
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает дневные сводки продаж за период по заказам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=date.fromisoformat, help="Первый день, YYYY-MM-DD (по умолчанию сегодня)")
+        parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Последний день, YYYY-MM-DD (по умолчанию --from)")
+        parser.add_argument("--pos", nargs="+", metavar="CODE", help="Коды точек продаж (по умолчанию все)")
+
+    def handle(self, *args, **options):
+        start = options["start"] or timezone.localdate()
+        end = options["end"] or start
+        if end < start:
+            raise CommandError("--to раньше --from")
+
+        pos_ids = None
+        if options["pos"]:
+            pos_ids = list(PointOfSale.objects.filter(code__in=options["pos"]).values_list("id", flat=True))
+            if len(pos_ids) != len(set(options["pos"])):
+                raise CommandError("Точка продаж не найдена")
+
+        rows = rollups.rebuild(start, end, pos_ids)
+        self.stdout.write(self.style.SUCCESS(f"Сводки за {start} — {end} пересчитаны, строк: {rows}"))
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0005_alter_pointofsaletoken_token"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "UPDATE pos_stock SET quantity = 0 WHERE quantity < 0",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="stock",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("quantity__gte", 0)),
+                name="stock_quantity_non_negative",
+            ),
+        ),
+    ]
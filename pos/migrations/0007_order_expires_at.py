@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0006_stock_quantity_non_negative"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalorder",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name="Истекает"),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name="Истекает"),
+        ),
+    ]
@@ -0,0 +1,155 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:54
+
+from decimal import Decimal
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+STATE_FIELDS = {"CREATED": "created", "PAID": "paid", "CANCELLED": "cancelled", "ARCHIEVE": "archived"}
+
+
+def backfill(apps, schema_editor):
+    """Fills the rollups from existing orders, the reports read only them. Frozen copy of rollups.rebuild."""
+    Order = apps.get_model("pos", "Order")
+    OrderItem = apps.get_model("pos", "OrderItem")
+    PosDailySales = apps.get_model("pos", "PosDailySales")
+    ProductDailySales = apps.get_model("pos", "ProductDailySales")
+
+    pos_rows = {
+        (row["day"], row["pos_id"]): row
+        for row in Order.objects.annotate(day=TruncDate("created_at")).values("day", "pos_id").annotate(
+            orders=Count("id"),
+            revenue=Sum("total_price", filter=Q(state="PAID"), default=Decimal(0)),
+            **{field: Count("id", filter=Q(state=state)) for state, field in STATE_FIELDS.items()},
+        )
+    }
+    product_rows = []
+    for row in (
+        OrderItem.objects.filter(order__state="PAID")
+        .annotate(day=TruncDate("order__created_at"))
+        .values("day", "order__pos_id", "product_id")
+        .annotate(orders=Count("id"), units=Sum("quantity"), revenue=Sum("total_price"))
+    ):
+        pos_id = row.pop("order__pos_id")
+        pos_row = pos_rows[(row["day"], pos_id)]
+        pos_row["units"] = pos_row.get("units", 0) + row["units"]
+        product_rows.append(ProductDailySales(pos_id=pos_id, **row))
+
+    PosDailySales.objects.bulk_create([PosDailySales(**row) for row in pos_rows.values()], batch_size=1000)
+    ProductDailySales.objects.bulk_create(product_rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0007_order_expires_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PosDailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                ("orders", models.IntegerField(default=0, verbose_name="Заказов")),
+                ("created", models.IntegerField(default=0, verbose_name="Создано")),
+                ("paid", models.IntegerField(default=0, verbose_name="Оплачено")),
+                ("cancelled", models.IntegerField(default=0, verbose_name="Отменено")),
+                (
+                    "archived",
+                    models.IntegerField(default=0, verbose_name="Архивировано"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Выручка",
+                    ),
+                ),
+                ("units", models.IntegerField(default=0, verbose_name="Продано штук")),
+                (
+                    "pos",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="pos.pointofsale",
+                        verbose_name="Точка продаж",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продажи точки за день",
+                "verbose_name_plural": "Продажи точек по дням",
+                "constraints": [models.UniqueConstraint(fields=("day", "pos"), name="pos_daily_sales_unique")],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductDailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "orders",
+                    models.IntegerField(default=0, verbose_name="Оплаченных заказов"),
+                ),
+                ("units", models.IntegerField(default=0, verbose_name="Продано штук")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Выручка",
+                    ),
+                ),
+                (
+                    "pos",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="product_daily_sales",
+                        to="pos.pointofsale",
+                        verbose_name="Точка продаж",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="pos.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продажи товара за день",
+                "verbose_name_plural": "Продажи товаров по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "pos", "product"),
+                        name="product_daily_sales_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
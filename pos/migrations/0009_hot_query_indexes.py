@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:57
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, без блокировки записи в pos_order на больших таблицах
+    atomic = False
+
+    dependencies = [
+        ("pos", "0008_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="historicalorder",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Истекает"),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Истекает"),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(fields=["created_at"], name="order_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["pos", "created_at"], name="order_pos_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["state", "created_at"], name="order_state_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("state", "CREATED")),
+                fields=["expires_at"],
+                name="order_open_expires_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("state", "CREATED")),
+                fields=["created_at"],
+                name="order_open_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(
+                fields=["order", "state"], name="payment_order_state_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,141 @@
+from datetime import date
+from django.db import migrations
+
+# DDL заморожен на момент миграции, pos.partitions может меняться дальше
+PARTITION_COLUMN = "history_date"
+MONTHS_AHEAD = 3
+HISTORY_TABLES = [
+    "pos_historicalpointofsale",
+    "pos_historicalcategory",
+    "pos_historicalproduct",
+    "pos_historicalstock",
+    "pos_historicalorder",
+    "pos_historicalpayment",
+]
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def create_partition(cursor, qn, table, month):
+    name = f"{table}_p{month:%Y%m}"
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {qn(table + '_default')} "
+        f"WHERE {PARTITION_COLUMN} >= %s AND {PARTITION_COLUMN} < %s RETURNING *) "
+        f"INSERT INTO {qn(name)} SELECT * FROM moved",
+        [start, end],
+    )
+    cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)", [start, end])
+
+
+def table_ddl(cursor, table):
+    cursor.execute(
+        """
+        SELECT indexdef FROM pg_indexes
+        WHERE tablename = %s AND indexname NOT IN (
+            SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'
+        )
+        """,
+        [table, table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+        [table],
+    )
+    primary_key = cursor.fetchone()[0]
+    return indexes, foreign_keys, primary_key
+
+
+def rebuild(cursor, qn, table, partitioned):
+    indexes, foreign_keys, primary_key = table_ddl(cursor, table)
+    old = f"{table}_old"
+    cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+    cursor.execute(f"ALTER TABLE {qn(old)} RENAME CONSTRAINT {qn(primary_key)} TO {qn(primary_key + '_old')}")
+    # Освобождаем имя sequence ключа для новой таблицы
+    cursor.execute(f"ALTER TABLE {qn(old)} ALTER COLUMN history_id DROP IDENTITY IF EXISTS")
+    cursor.execute(f"ALTER TABLE {qn(old)} ALTER COLUMN history_id DROP DEFAULT")
+    cursor.execute(f"DROP SEQUENCE IF EXISTS {qn(table + '_history_id_seq')}")
+
+    if partitioned:
+        # До PostgreSQL 17 у секционированной таблицы не может быть IDENTITY, ключ берём из sequence
+        sequence = qn(f"{table}_history_id_seq")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS) PARTITION BY RANGE ({PARTITION_COLUMN})"
+        )
+        cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {qn(table)}.history_id")
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN history_id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(primary_key)} PRIMARY KEY (history_id, {PARTITION_COLUMN})")
+        cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+        cursor.execute(f"SELECT MIN({PARTITION_COLUMN}) FROM {qn(old)}")
+        first = cursor.fetchone()[0]
+        month = month_start(first.date() if first else date.today())
+        last = add_months(month_start(date.today()), MONTHS_AHEAD)
+        while month <= last:
+            create_partition(cursor, qn, table, month)
+            month = add_months(month, 1)
+    else:
+        cursor.execute(f"CREATE TABLE {qn(table)} (LIKE {qn(old)})")
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN history_id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(primary_key)} PRIMARY KEY (history_id)")
+
+    cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+    cursor.execute(f"DROP TABLE {qn(old)} CASCADE")
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'history_id'), COALESCE(MAX(history_id), 0) + 1, false) FROM {qn(table)}",
+        [table],
+    )
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+def partition_history(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in HISTORY_TABLES:
+            if not is_partitioned(cursor, table):
+                rebuild(cursor, schema_editor.quote_name, table, partitioned=True)
+
+
+def unpartition_history(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in HISTORY_TABLES:
+            if is_partitioned(cursor, table):
+                rebuild(cursor, schema_editor.quote_name, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0009_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history, unpartition_history),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0010_partition_history_tables"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="historicalstock",
+            name="quantity",
+        ),
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.IntegerField(verbose_name="Количество")),
+                ("taken_at", models.DateTimeField(db_index=True, verbose_name="Снято")),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="pos.stock",
+                        verbose_name="Остаток",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Снимок остатка",
+                "verbose_name_plural": "Снимки остатков",
+                "indexes": [
+                    models.Index(
+                        fields=["stock", "taken_at"], name="stock_snapshot_idx"
+                    )
+                ],
+            },
+        ),
+    ]
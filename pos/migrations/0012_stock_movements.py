@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0011_stock_snapshots"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("SALE", "Продажа"),
+                            ("RESTOCK", "Поступление"),
+                            ("CORRECTION", "Корректировка"),
+                        ],
+                        max_length=20,
+                        verbose_name="Тип",
+                    ),
+                ),
+                ("delta", models.IntegerField(verbose_name="Изменение")),
+                (
+                    "comment",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Комментарий"
+                    ),
+                ),
+                (
+                    "compacted",
+                    models.BooleanField(default=False, verbose_name="Учтено в остатке"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создано"),
+                ),
+            ],
+            options={
+                "verbose_name": "Движение остатка",
+                "verbose_name_plural": "Движения остатков",
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name="stock",
+            name="stock_quantity_non_negative",
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="order",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="stock_movements",
+                to="pos.order",
+                verbose_name="Заказ",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="stock",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="movements",
+                to="pos.stock",
+                verbose_name="Остаток",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                condition=models.Q(("compacted", False)),
+                fields=["stock"],
+                name="stock_movement_pending_idx",
+            ),
+        ),
+    ]
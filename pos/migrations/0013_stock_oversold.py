@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pos", "0012_stock_movements"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalstock",
+            name="oversold",
+            field=models.BooleanField(
+                default=False, verbose_name="Продано сверх остатка"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="oversold",
+            field=models.BooleanField(
+                default=False, verbose_name="Продано сверх остатка"
+            ),
+        ),
+    ]
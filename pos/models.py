@@ -1,6 +1,7 @@
 import uuid
 from django.db import models
 from simple_history.models import HistoricalRecords
+from core.utils.history import DeferredHistoricalRecords
 
 
 class PointOfSale(models.Model):
@@ -67,15 +68,45 @@ class Stock(models.Model):
     product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.CASCADE, related_name="stocks")
     quantity = models.IntegerField("Количество", default=0)
     is_active = models.BooleanField("Доступно к продаже", default=True)
-    history = HistoricalRecords()
+    # Оплата проводится и сверх остатка, такие позиции отмечаются для пересчёта и снимаются вручную
+    oversold = models.BooleanField("Продано сверх остатка", default=False)
+    # Количество меняется каждой продажей, его фиксируют почасовые StockSnapshot
+    history = DeferredHistoricalRecords(excluded_fields=["quantity"])
 
     class Meta:
         verbose_name = "Остаток"
         verbose_name_plural = "Остатки"
         unique_together = ("pos", "product")
 
+    @property
+    def current_quantity(self):
+        """
+        Quantity folded by the last compaction plus the movements recorded since.
+        Querysets from pos.ledger.with_pending() carry the sum, otherwise it is queried.
+        """
+        pending = getattr(self, "pending_quantity", None)
+        if pending is None:
+            pending = self.movements.filter(compacted=False).aggregate(total=models.Sum("delta"))["total"] or 0
+        return self.quantity + pending
+
+    def __str__(self):
+        return f"{self.product.name} на {self.pos.name}"
+
+
+class StockSnapshot(models.Model):
+    stock = models.ForeignKey(Stock, verbose_name="Остаток", on_delete=models.CASCADE, related_name="snapshots")
+    quantity = models.IntegerField("Количество")
+    taken_at = models.DateTimeField("Снято", db_index=True)
+
+    class Meta:
+        verbose_name = "Снимок остатка"
+        verbose_name_plural = "Снимки остатков"
+        indexes = [
+            models.Index(fields=["stock", "taken_at"], name="stock_snapshot_idx"),
+        ]
+
     def __str__(self):
-        return f"{self.product.name} на {self.pos.name}: {self.quantity}"
+        return f"{self.stock_id}: {self.quantity} на {self.taken_at}"
 
 
 class Order(models.Model):
@@ -90,11 +121,20 @@ class Order(models.Model):
     total_price = models.DecimalField("Итоговая сумма", max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField("Создано", auto_now_add=True)
     updated_at = models.DateTimeField("Обновлено", auto_now=True)
-    history = HistoricalRecords()
+    expires_at = models.DateTimeField("Истекает", null=True, blank=True)
+    history = DeferredHistoricalRecords()
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            models.Index(fields=["created_at"], name="order_created_idx"),
+            models.Index(fields=["pos", "created_at"], name="order_pos_created_idx"),
+            models.Index(fields=["state", "created_at"], name="order_state_created_idx"),
+            # Только открытые заказы: их мало, а архивация ищет именно их
+            models.Index(fields=["expires_at"], condition=models.Q(state="CREATED"), name="order_open_expires_idx"),
+            models.Index(fields=["created_at"], condition=models.Q(state="CREATED"), name="order_open_created_idx"),
+        ]
 
     def recalculate_total(self):
         total = sum(item.total_price for item in self.items.all())
@@ -142,6 +182,34 @@ class OrderComment(models.Model):
         return f"Комментарий к заказу №{self.order.id}"
 
 
+class StockMovement(models.Model):
+    class MovementKind(models.TextChoices):
+        SALE = 'SALE', 'Продажа'
+        RESTOCK = 'RESTOCK', 'Поступление'
+        CORRECTION = 'CORRECTION', 'Корректировка'
+
+    stock = models.ForeignKey(Stock, verbose_name="Остаток", on_delete=models.CASCADE, related_name="movements")
+    kind = models.CharField("Тип", max_length=20, choices=MovementKind.choices)
+    delta = models.IntegerField("Изменение")
+    order = models.ForeignKey(
+        Order, verbose_name="Заказ", on_delete=models.SET_NULL, null=True, blank=True, related_name="stock_movements"
+    )
+    comment = models.CharField("Комментарий", max_length=255, blank=True)
+    compacted = models.BooleanField("Учтено в остатке", default=False)
+    created_at = models.DateTimeField("Создано", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Движение остатка"
+        verbose_name_plural = "Движения остатков"
+        indexes = [
+            # Несвёрнутых движений немного, по ним считается текущий остаток
+            models.Index(fields=["stock"], condition=models.Q(compacted=False), name="stock_movement_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.delta:+d}: {self.stock_id}"
+
+
 class Payment(models.Model):
     class PaymentState(models.TextChoices):
         PENDING = "PENDING", "В ожидании"
@@ -158,11 +226,14 @@ class Payment(models.Model):
     type = models.CharField("Метод оплаты", max_length=20, choices=PAYMENT_METHODS)
     link = models.URLField("Ссылка на оплату (эквайринг)", blank=True, null=True)
     processed_at = models.DateTimeField("Дата обработки", auto_now_add=True)
-    history = HistoricalRecords()
+    history = DeferredHistoricalRecords()
 
     class Meta:
         verbose_name = "Оплата"
         verbose_name_plural = "Оплаты"
+        indexes = [
+            models.Index(fields=["order", "state"], name="payment_order_state_idx"),
+        ]
 
     def __str__(self):
         return f"Оплата заказа №{self.order.id} ({self.get_state_display()})"
@@ -181,3 +252,44 @@ class Receipt(models.Model):
 
     def __str__(self):
         return f"Чек {self.receipt_number}"
+
+
+class PosDailySales(models.Model):
+    day = models.DateField("День")
+    pos = models.ForeignKey(PointOfSale, verbose_name="Точка продаж", on_delete=models.CASCADE, related_name="daily_sales")
+    orders = models.IntegerField("Заказов", default=0)
+    created = models.IntegerField("Создано", default=0)
+    paid = models.IntegerField("Оплачено", default=0)
+    cancelled = models.IntegerField("Отменено", default=0)
+    archived = models.IntegerField("Архивировано", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField("Продано штук", default=0)
+
+    class Meta:
+        verbose_name = "Продажи точки за день"
+        verbose_name_plural = "Продажи точек по дням"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "pos"], name="pos_daily_sales_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.pos_id} {self.day}"
+
+
+class ProductDailySales(models.Model):
+    day = models.DateField("День")
+    pos = models.ForeignKey(PointOfSale, verbose_name="Точка продаж", on_delete=models.CASCADE, related_name="product_daily_sales")
+    product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.CASCADE, related_name="daily_sales")
+    orders = models.IntegerField("Оплаченных заказов", default=0)
+    units = models.IntegerField("Продано штук", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи товара за день"
+        verbose_name_plural = "Продажи товаров по дням"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "pos", "product"], name="product_daily_sales_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.pos_id} {self.day}"
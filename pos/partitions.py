@@ -0,0 +1,199 @@
+"""
+Monthly range partitioning of the simple_history tables on PostgreSQL.
+
+History tables are append-only and have no inbound foreign keys, so they can be
+partitioned by history_date: queries filtered by date prune partitions and a closed
+month is removed with DROP TABLE instead of row deletes. Order, OrderItem, Payment
+and Receipt stay regular tables: they are referenced by foreign keys on their id,
+which PostgreSQL cannot point at a partitioned table whose key includes the date.
+"""
+import logging
+from datetime import date
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = "history_date"
+HISTORY_TABLES = [
+    "pos_historicalpointofsale",
+    "pos_historicalcategory",
+    "pos_historicalproduct",
+    "pos_historicalstock",
+    "pos_historicalorder",
+    "pos_historicalpayment",
+]
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def partitions(cursor, table):
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [table],
+    )
+    return sorted(row[0] for row in cursor.fetchall())
+
+
+def create_partition(cursor, table, month):
+    """
+    Creates the partition of ``month``. Rows already sitting in the default partition
+    for that month are moved into it, so a late run never fails on overlap.
+    """
+    name = partition_name(table, month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    default = _qn(f"{table}_default")
+    cursor.execute(f"CREATE TABLE {_qn(name)} (LIKE {_qn(table)} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {default} WHERE {PARTITION_COLUMN} >= %s AND {PARTITION_COLUMN} < %s RETURNING *) "
+        f"INSERT INTO {_qn(name)} SELECT * FROM moved",
+        [start, end],
+    )
+    cursor.execute(f"ALTER TABLE {_qn(table)} ATTACH PARTITION {_qn(name)} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    return name
+
+
+def _table_ddl(cursor, table):
+    cursor.execute(
+        """
+        SELECT indexdef FROM pg_indexes
+        WHERE tablename = %s AND indexname NOT IN (
+            SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'
+        )
+        """,
+        [table, table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+        [table],
+    )
+    primary_key = cursor.fetchone()[0]
+    return indexes, foreign_keys, primary_key
+
+
+def _rebuild(cursor, table, partitioned, months_ahead):
+    indexes, foreign_keys, primary_key = _table_ddl(cursor, table)
+    old = f"{table}_old"
+    cursor.execute(f"ALTER TABLE {_qn(table)} RENAME TO {_qn(old)}")
+    cursor.execute(f"ALTER TABLE {_qn(old)} RENAME CONSTRAINT {_qn(primary_key)} TO {_qn(primary_key + '_old')}")
+    # Освобождаем имя sequence ключа для новой таблицы
+    cursor.execute(f"ALTER TABLE {_qn(old)} ALTER COLUMN history_id DROP IDENTITY IF EXISTS")
+    cursor.execute(f"ALTER TABLE {_qn(old)} ALTER COLUMN history_id DROP DEFAULT")
+    cursor.execute(f"DROP SEQUENCE IF EXISTS {_qn(table + '_history_id_seq')}")
+
+    if partitioned:
+        # До PostgreSQL 17 у секционированной таблицы не может быть IDENTITY, ключ берём из sequence
+        sequence = _qn(f"{table}_history_id_seq")
+        cursor.execute(
+            f"CREATE TABLE {_qn(table)} (LIKE {_qn(old)} INCLUDING DEFAULTS) PARTITION BY RANGE ({PARTITION_COLUMN})"
+        )
+        cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {_qn(table)}.history_id")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ALTER COLUMN history_id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(primary_key)} PRIMARY KEY (history_id, {PARTITION_COLUMN})")
+        cursor.execute(f"CREATE TABLE {_qn(table + '_default')} PARTITION OF {_qn(table)} DEFAULT")
+        cursor.execute(f"SELECT MIN({PARTITION_COLUMN}) FROM {_qn(old)}")
+        first = cursor.fetchone()[0]
+        month = month_start(first.date() if first else date.today())
+        last = add_months(month_start(date.today()), months_ahead)
+        while month <= last:
+            create_partition(cursor, table, month)
+            month = add_months(month, 1)
+    else:
+        cursor.execute(f"CREATE TABLE {_qn(table)} (LIKE {_qn(old)})")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ALTER COLUMN history_id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(primary_key)} PRIMARY KEY (history_id)")
+
+    cursor.execute(f"INSERT INTO {_qn(table)} SELECT * FROM {_qn(old)}")
+    cursor.execute(f"DROP TABLE {_qn(old)} CASCADE")
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'history_id'), COALESCE(MAX(history_id), 0) + 1, false) FROM {_qn(table)}",
+        [table],
+    )
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(name)} {definition}")
+
+
+def convert_to_partitioned(cursor, table, months_ahead=3):
+    """Rebuilds a history table as a partitioned one, with a partition per month of its data plus a default."""
+    if not is_partitioned(cursor, table):
+        _rebuild(cursor, table, partitioned=True, months_ahead=months_ahead)
+
+
+def convert_to_regular(cursor, table):
+    if is_partitioned(cursor, table):
+        _rebuild(cursor, table, partitioned=False, months_ahead=0)
+
+
+def ensure_partitions(months_ahead, today=None):
+    """Creates missing monthly partitions from the current month up to ``months_ahead`` months ahead."""
+    if connection.vendor != "postgresql":
+        return []
+    current = month_start(today or date.today())
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in HISTORY_TABLES:
+            if not is_partitioned(cursor, table):
+                continue
+            existing = set(partitions(cursor, table))
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                if partition_name(table, month) not in existing:
+                    created.append(create_partition(cursor, table, month))
+    if created:
+        logger.info("History partitions created", extra={"partitions": created})
+    return created
+
+
+def drop_partitions_before(month):
+    """Drops whole monthly partitions older than ``month``, the bulk replacement for deleting old history rows."""
+    if connection.vendor != "postgresql":
+        return []
+    dropped = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in HISTORY_TABLES:
+            if not is_partitioned(cursor, table):
+                continue
+            cutoff = partition_name(table, month)
+            for name in partitions(cursor, table):
+                if name.startswith(f"{table}_p") and name < cutoff:
+                    cursor.execute(f"ALTER TABLE {_qn(table)} DETACH PARTITION {_qn(name)}")
+                    cursor.execute(f"DROP TABLE {_qn(name)}")
+                    dropped.append(name)
+    if dropped:
+        logger.info("History partitions dropped", extra={"partitions": dropped})
+    return dropped
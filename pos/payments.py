@@ -0,0 +1,128 @@
+import logging
+import uuid
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from .flow import bulk_transition_orders, bulk_transition_payments
+from .models import Order, OrderItem, Payment, Receipt
+
+logger = logging.getLogger(__name__)
+
+PAID = "paid"
+FAILED = "failed"
+ALREADY_PAID = "already_paid"
+ALREADY_FAILED = "already_failed"
+NOT_FOUND = "not_found"
+NO_PENDING = "no_pending"
+CONFLICT = "conflict"
+ERROR = "error"
+
+
+def fiscal_data(order_ids):
+    """Receipt lines of the orders, {order_id: [{"name", "qty", "price"}]}, in one query."""
+    lines = {order_id: [] for order_id in order_ids}
+    items = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .order_by("id")
+        .values_list("order_id", "product__name", "quantity", "price")
+    )
+    for order_id, name, quantity, price in items:
+        lines[order_id].append({"name": name, "qty": quantity, "price": float(price)})
+    return lines
+
+
+def create_receipts(payments):
+    lines = fiscal_data([payment.order_id for payment in payments])
+    return Receipt.objects.bulk_create([
+        Receipt(payment=payment, receipt_number=str(uuid.uuid4()), fiscal_data=lines[payment.order_id])
+        for payment in payments
+    ])
+
+
+def _settle_chunk(outcomes):
+    results = []
+    with transaction.atomic():
+        orders = {
+            order.id: order
+            for order in Order.objects.select_for_update().filter(
+                id__in={outcome["order_id"] for outcome in outcomes}
+            ).order_by("id")
+        }
+        pending = {}
+        for payment in Payment.objects.select_for_update().filter(
+            order_id__in=orders, state=Payment.PaymentState.PENDING
+        ).order_by("id"):
+            pending.setdefault(payment.order_id, payment)
+        settled = {order_id: set() for order_id in orders}
+        for order_id, state in Payment.objects.filter(order_id__in=orders).exclude(
+            state=Payment.PaymentState.PENDING
+        ).values_list("order_id", "state"):
+            settled[order_id].add(state)
+
+        to_pay, to_fail = [], []
+        for outcome in outcomes:
+            order_id = outcome["order_id"]
+            order = orders.get(order_id)
+            payment = pending.get(order_id)
+            if order is None:
+                result = NOT_FOUND
+            elif outcome["status"] == PAID:
+                if payment is None:
+                    result = ALREADY_PAID if Payment.PaymentState.PAID in settled[order_id] else NO_PENDING
+                elif order.state != Order.OrderState.CREATED:
+                    result = CONFLICT
+                else:
+                    to_pay.append((order, payment))
+                    result = PAID
+            else:
+                if payment is None:
+                    if Payment.PaymentState.FAILED in settled[order_id]:
+                        result = ALREADY_FAILED
+                    elif Payment.PaymentState.PAID in settled[order_id]:
+                        result = CONFLICT
+                    else:
+                        result = NO_PENDING
+                elif order.state not in (Order.OrderState.CREATED, Order.OrderState.PAID):
+                    result = CONFLICT
+                else:
+                    to_fail.append((order, payment))
+                    result = FAILED
+
+            # Повторы в одном пакете видят результат предыдущей записи
+            if result in (PAID, FAILED):
+                del pending[order_id]
+                settled[order_id].add(Payment.PaymentState.PAID if result == PAID else Payment.PaymentState.FAILED)
+            results.append({"order_id": order_id, "result": result})
+
+        if to_pay:
+            bulk_transition_orders([order for order, _ in to_pay], Order.OrderState.PAID)
+            paid = bulk_transition_payments([payment for _, payment in to_pay], Payment.PaymentState.PAID)
+            create_receipts(paid)
+        if to_fail:
+            bulk_transition_orders([order for order, _ in to_fail], Order.OrderState.CANCELLED)
+            bulk_transition_payments([payment for _, payment in to_fail], Payment.PaymentState.FAILED)
+
+    return results
+
+
+def settle_outcomes(outcomes):
+    """
+    Applies acquirer outcomes [{"order_id", "status": "paid" | "failed"}] in chunks of
+    PAYMENT_WEBHOOK_CHUNK_SIZE, one transaction per chunk, with the same rules as the
+    single mark_paid / mark_failed webhooks. Returns a result per entry, in input order.
+    A chunk that fails on the database is reported as "error" and can be replayed.
+    """
+    size = settings.PAYMENT_WEBHOOK_CHUNK_SIZE
+    results = []
+    for start in range(0, len(outcomes), size):
+        chunk = outcomes[start:start + size]
+        try:
+            results.extend(_settle_chunk(chunk))
+        except DatabaseError:
+            logger.exception("Payment outcomes chunk failed", extra={"order_ids": [o["order_id"] for o in chunk]})
+            results.extend({"order_id": outcome["order_id"], "result": ERROR} for outcome in chunk)
+
+    counts = {}
+    for result in results:
+        counts[result["result"]] = counts.get(result["result"], 0) + 1
+    logger.info("Payment outcomes settled", extra={"total": len(results), **counts})
+    return results
@@ -0,0 +1,219 @@
+import logging
+import time
+from django.conf import settings
+from django.db import transaction
+from core.utils.redis_client import get_async_redis, get_redis
+from . import catalog, ledger
+from .models import Stock, OrderItem
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_KEY = "holds:expiry"
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Not enough stock for products {product_ids}")
+        self.product_ids = product_ids
+
+
+def _counter_key(pos_id, product_id):
+    return f"reserved:{pos_id}:{product_id}"
+
+
+def _hold_key(order_id):
+    return f"hold:{order_id}"
+
+
+def reserved_quantities(pos_id, product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    values = get_redis().mget([_counter_key(pos_id, product_id) for product_id in product_ids])
+    return {product_id: int(value or 0) for product_id, value in zip(product_ids, values)}
+
+
+async def areserved_quantities(pos_id, product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    values = await get_async_redis().mget([_counter_key(pos_id, product_id) for product_id in product_ids])
+    return {product_id: int(value or 0) for product_id, value in zip(product_ids, values)}
+
+
+def _subtract(products, reserved):
+    return [{**product, "quantity": max(product["quantity"] - reserved[product["id"]], 0)} for product in products]
+
+
+def with_available(pos_id, products):
+    """Subtracts held quantities from the stock quantity of catalog entries."""
+    return _subtract(products, reserved_quantities(pos_id, [product["id"] for product in products]))
+
+
+async def awith_available(pos_id, products):
+    return _subtract(products, await areserved_quantities(pos_id, [product["id"] for product in products]))
+
+
+def reserve(order, quantities, available):
+    """
+    Places a hold for the order: {product_id: quantity} is added to the per-(pos, product)
+    counters and rolled back if any counter would exceed the stock quantity. ``available()``
+    returns {product_id: quantity} and is read after the counters are incremented: a paid
+    order releases its hold only after its sale commits, so the read sees either the hold
+    or the sale and stock is never counted twice as free. The hold expires after
+    RESERVATION_TTL seconds and is then released by the sweeper.
+    """
+    redis = get_redis()
+    pos_id = order.pos_id
+    product_ids = list(quantities)
+    expires_at = time.time() + settings.RESERVATION_TTL
+
+    pipe = redis.pipeline()
+    for product_id in product_ids:
+        pipe.incrby(_counter_key(pos_id, product_id), quantities[product_id])
+    pipe.hset(_hold_key(order.id), mapping={"pos": pos_id, **{str(k): v for k, v in quantities.items()}})
+    pipe.expire(_hold_key(order.id), settings.RESERVATION_TTL + 86400)
+    pipe.zadd(EXPIRY_KEY, {order.id: expires_at})
+    reserved = pipe.execute()[:len(product_ids)]
+
+    try:
+        stock_quantities = available()
+    except Exception:
+        release([order.id])
+        raise
+    short = [
+        product_id for product_id, total in zip(product_ids, reserved)
+        if total > stock_quantities.get(product_id, 0)
+    ]
+    if short:
+        release([order.id])
+        raise InsufficientStock(short)
+
+    logger.info("Stock reserved", extra={"order_id": order.id, "items": len(product_ids)})
+
+
+# Забирает удержание и возвращает его количества в счётчики одной операцией: падение
+# процесса между снятием удержания и уменьшением счётчиков оставило бы их завышенными
+_RELEASE = """
+local hold = redis.call('HGETALL', KEYS[1])
+if #hold == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 0
+end
+local pos_id
+for i = 1, #hold, 2 do
+    if hold[i] == 'pos' then pos_id = hold[i + 1] end
+end
+for i = 1, #hold, 2 do
+    if hold[i] ~= 'pos' then
+        redis.call('DECRBY', 'reserved:' .. pos_id .. ':' .. hold[i], hold[i + 1])
+    end
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+# Пересчитывает счётчики по живым удержаниям из EXPIRY_KEY. Скрипт атомарен, поэтому
+# резервирования и снятия не вклиниваются между подсчётом и записью
+_REBUILD = """
+local expected = {}
+for _, order_id in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    local hold = redis.call('HGETALL', 'hold:' .. order_id)
+    local pos_id
+    for i = 1, #hold, 2 do
+        if hold[i] == 'pos' then pos_id = hold[i + 1] end
+    end
+    for i = 1, #hold, 2 do
+        if hold[i] ~= 'pos' then
+            local key = 'reserved:' .. pos_id .. ':' .. hold[i]
+            expected[key] = (expected[key] or 0) + tonumber(hold[i + 1])
+        end
+    end
+end
+local fixed = 0
+local cursor = '0'
+repeat
+    local page = redis.call('SCAN', cursor, 'MATCH', 'reserved:*', 'COUNT', 1000)
+    cursor = page[1]
+    for _, key in ipairs(page[2]) do
+        if expected[key] == nil then
+            if tonumber(redis.call('GET', key) or '0') ~= 0 then fixed = fixed + 1 end
+            redis.call('DEL', key)
+        end
+    end
+until cursor == '0'
+for key, quantity in pairs(expected) do
+    if tonumber(redis.call('GET', key) or '0') ~= quantity then
+        redis.call('SET', key, quantity)
+        fixed = fixed + 1
+    end
+end
+return fixed
+"""
+
+
+def release(order_ids):
+    """Returns held quantities to the pool. Each hold is claimed once, repeated calls are no-ops."""
+    script = get_redis().register_script(_RELEASE)
+    released = [
+        order_id for order_id in order_ids
+        if script(keys=[_hold_key(order_id), EXPIRY_KEY], args=[order_id])
+    ]
+    if released:
+        logger.info("Stock reservations released", extra={"orders": len(released)})
+    return released
+
+
+def rebuild_counters():
+    """
+    Recomputes every reserved:* counter from the live holds and returns how many were
+    wrong. Counters drift when Redis loses writes, for example on failover to a replica.
+    """
+    fixed = get_redis().register_script(_REBUILD)(keys=[EXPIRY_KEY])
+    if fixed:
+        logger.warning("Reservation counters rebuilt", extra={"counters": fixed})
+    return fixed
+
+
+def convert(orders):
+    """
+    Turns the holds of paid orders into SALE movements in the stock ledger. Must run
+    inside the transaction that marks the orders paid; counters are released after
+    commit. Stock rows are only read, the quantity is folded in by compaction.
+    """
+    pos_ids = {order.id: order.pos_id for order in orders}
+    order_ids = list(pos_ids)
+    items = list(OrderItem.objects.filter(order_id__in=order_ids).values_list("order_id", "product_id", "quantity"))
+
+    stock_ids = {}
+    if items:
+        stocks = Stock.objects.filter(
+            pos_id__in={pos_ids[order_id] for order_id, _, _ in items},
+            product_id__in={product_id for _, product_id, _ in items},
+        ).values_list("id", "pos_id", "product_id")
+        stock_ids = {(pos_id, product_id): stock_id for stock_id, pos_id, product_id in stocks}
+
+    sales = {}
+    for order_id, product_id, quantity in items:
+        stock_id = stock_ids.get((pos_ids[order_id], product_id))
+        if stock_id is not None:
+            sales[(stock_id, order_id)] = sales.get((stock_id, order_id), 0) + quantity
+    ledger.record_sales(sales)
+
+    if sales:
+        stocks = list(ledger.with_pending(Stock.objects.select_related("pos", "product__category")).filter(
+            id__in={stock_id for stock_id, _ in sales}
+        ))
+        oversold = sorted(stock.id for stock in stocks if stock.current_quantity < 0)
+        if oversold:
+            ledger.flag_oversold(oversold)
+            logger.error("Paid order items exceed stock", extra={"order_ids": order_ids, "stock_ids": oversold})
+        transaction.on_commit(lambda: catalog.refresh_stocks(stocks))
+
+    transaction.on_commit(lambda: release(order_ids))
+
+
+def release_expired(limit=500):
+    order_ids = get_redis().zrangebyscore(EXPIRY_KEY, "-inf", time.time(), start=0, num=limit)
+    return release([int(order_id) for order_id in order_ids])
@@ -0,0 +1,149 @@
+import logging
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from core.utils.reports import local_day_range
+from .models import Order, OrderItem, PosDailySales, ProductDailySales
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDS = {
+    Order.OrderState.CREATED: "created",
+    Order.OrderState.PAID: "paid",
+    Order.OrderState.CANCELLED: "cancelled",
+    Order.OrderState.ARCHIEVE: "archived",
+}
+
+
+def _day(order):
+    return timezone.localdate(order.created_at)
+
+
+def _add(rows, key, **deltas):
+    row = rows.setdefault(key, {})
+    for field, delta in deltas.items():
+        row[field] = row.get(field, 0) + delta
+
+
+def _increment(model, keys, rows):
+    """
+    Adds the counter deltas of {key tuple: {field: delta}} to the rollup rows with
+    one INSERT ... ON CONFLICT DO UPDATE, in key order so concurrent writers touching
+    the same rows cannot deadlock.
+    """
+    if not rows:
+        return
+    opts = model._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    counters = [field.name for field in opts.concrete_fields if not field.primary_key and field.name not in keys]
+    key_columns = [qn(opts.get_field(field).column) for field in keys]
+    counter_columns = [qn(opts.get_field(field).column) for field in counters]
+
+    values, params = [], []
+    for key in sorted(rows):
+        values.append("(" + ", ".join(["%s"] * (len(keys) + len(counters))) + ")")
+        params.extend(key)
+        params.extend(rows[key].get(field, 0) for field in counters)
+
+    updates = ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in counter_columns)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(key_columns + counter_columns)}) VALUES {', '.join(values)} "
+        f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_created(order):
+    """
+    Counts a new order once its transaction commits, so checkout does not hold the
+    rollup row lock of its point of sale until commit. The deltas are taken now:
+    a transition in the same transaction is already counted by record_transition.
+    """
+    deltas = {"orders": 1}
+    if order.state in STATE_FIELDS:
+        deltas[STATE_FIELDS[order.state]] = 1
+    if order.state == Order.OrderState.PAID:
+        deltas["revenue"] = order.total_price
+    rows = {(_day(order), order.pos_id): deltas}
+    transaction.on_commit(lambda: _increment(PosDailySales, ["day", "pos"], rows))
+
+
+def record_transition(orders, source, target):
+    """
+    Moves the orders between state counters; sales figures follow orders in and out of PAID.
+    The deltas are taken in the transaction, the rollup rows are written after commit
+    like in record_created, so concurrent payments of a point do not queue on its row.
+    """
+    pos_rows, product_rows = {}, {}
+    for order in orders:
+        _add(pos_rows, (_day(order), order.pos_id), **{STATE_FIELDS[source]: -1, STATE_FIELDS[target]: 1})
+
+    sign = 1 if target == Order.OrderState.PAID else -1 if source == Order.OrderState.PAID else 0
+    if sign:
+        keys = {order.id: (_day(order), order.pos_id) for order in orders}
+        items = OrderItem.objects.filter(order_id__in=keys).values_list("order_id", "product_id", "quantity", "total_price")
+        for order_id, product_id, quantity, total_price in items:
+            day, pos_id = keys[order_id]
+            _add(pos_rows, (day, pos_id), units=sign * quantity)
+            _add(product_rows, (day, pos_id, product_id), orders=sign, units=sign * quantity, revenue=sign * total_price)
+        for order in orders:
+            _add(pos_rows, keys[order.id], revenue=sign * order.total_price)
+
+    def write():
+        _increment(PosDailySales, ["day", "pos"], pos_rows)
+        _increment(ProductDailySales, ["day", "pos", "product"], product_rows)
+
+    transaction.on_commit(write)
+
+
+def rebuild(start_date, end_date, pos_ids=None):
+    """
+    Recomputes the rollups of local days start_date..end_date from orders, replacing
+    what is stored. Returns the number of rows written.
+    """
+    start, end = local_day_range(start_date, end_date)
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    items = OrderItem.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end, order__state=Order.OrderState.PAID
+    )
+    pos_sales = PosDailySales.objects.filter(day__gte=start_date, day__lte=end_date)
+    product_sales = ProductDailySales.objects.filter(day__gte=start_date, day__lte=end_date)
+    if pos_ids is not None:
+        orders = orders.filter(pos_id__in=pos_ids)
+        items = items.filter(order__pos_id__in=pos_ids)
+        pos_sales = pos_sales.filter(pos_id__in=pos_ids)
+        product_sales = product_sales.filter(pos_id__in=pos_ids)
+
+    paid = Q(state=Order.OrderState.PAID)
+    with transaction.atomic():
+        pos_rows = {
+            (row["day"], row["pos_id"]): row
+            for row in orders.annotate(day=TruncDate("created_at")).values("day", "pos_id").annotate(
+                orders=Count("id"),
+                revenue=Sum("total_price", filter=paid, default=Decimal(0)),
+                **{field: Count("id", filter=Q(state=state)) for state, field in STATE_FIELDS.items()},
+            )
+        }
+        product_rows = []
+        for row in (
+            items.annotate(day=TruncDate("order__created_at"))
+            .values("day", "order__pos_id", "product_id")
+            .annotate(orders=Count("id"), units=Sum("quantity"), revenue=Sum("total_price"))
+        ):
+            pos_id = row.pop("order__pos_id")
+            pos_row = pos_rows[(row["day"], pos_id)]
+            pos_row["units"] = pos_row.get("units", 0) + row["units"]
+            product_rows.append(ProductDailySales(pos_id=pos_id, **row))
+
+        pos_sales.delete()
+        product_sales.delete()
+        PosDailySales.objects.bulk_create([PosDailySales(**row) for row in pos_rows.values()], batch_size=1000)
+        ProductDailySales.objects.bulk_create(product_rows, batch_size=1000)
+
+    rows = len(pos_rows) + len(product_rows)
+    logger.info("Sales rollups rebuilt", extra={"start": str(start_date), "end": str(end_date), "rows": rows})
+    return rows
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from core.utils import metrics
+from . import catalog, events, reservations, rollups
+from .models import PointOfSale, PointOfSaleToken, Category, Product, Stock, StockMovement, Order
+
+# Sent after orders change state: orders (list), source, target.
+order_state_changed = Signal()
+
+
+@receiver(post_save, sender=PointOfSale)
+def evict_pos_tokens(sender, instance, **kwargs):
+    from core.auth import invalidate_pos_token
+
+    tokens = list(PointOfSaleToken.objects.filter(pos=instance).values_list("token", flat=True))
+    transaction.on_commit(lambda: [invalidate_pos_token(token) for token in tokens])
+
+
+@receiver(post_delete, sender=PointOfSaleToken)
+def evict_deleted_token(sender, instance, **kwargs):
+    from core.auth import invalidate_pos_token
+
+    transaction.on_commit(lambda: invalidate_pos_token(instance.token))
+
+
+@receiver(pre_save, sender=PointOfSale)
+@receiver(pre_save, sender=Product)
+def remember_catalog_keys(sender, instance, **kwargs):
+    field = "code" if sender is PointOfSale else "barcode"
+    instance._catalog_old_key = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=PointOfSale)
+def reset_pos_catalog(sender, instance, **kwargs):
+    old_code = getattr(instance, "_catalog_old_key", None)
+    transaction.on_commit(lambda: catalog.reset_pos(instance.code, old_code))
+
+
+@receiver(post_save, sender=Stock)
+def refresh_stock_catalog(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalog.refresh_stock_ids([instance.pk]))
+
+
+@receiver(post_save, sender=StockMovement)
+def refresh_movement_catalog(sender, instance, created, **kwargs):
+    # Продажи пишутся bulk_create и обновляют каталог сами, сюда попадают поступления и корректировки
+    if created:
+        transaction.on_commit(lambda: catalog.refresh_stock_ids([instance.stock_id]))
+
+
+@receiver(post_delete, sender=Stock)
+def forget_stock_catalog(sender, instance, **kwargs):
+    pos_code = PointOfSale.objects.filter(pk=instance.pos_id).values_list("code", flat=True).first()
+    barcode = Product.objects.filter(pk=instance.product_id).values_list("barcode", flat=True).first()
+    if pos_code and barcode:
+        transaction.on_commit(lambda: catalog.forget_barcode([pos_code], barcode))
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_catalog(sender, instance, **kwargs):
+    old_barcode = getattr(instance, "_catalog_old_key", None)
+    stock_ids = list(instance.stocks.values_list("id", flat=True))
+    if old_barcode and old_barcode != instance.barcode:
+        pos_codes = list(instance.stocks.values_list("pos__code", flat=True))
+        transaction.on_commit(lambda: catalog.forget_barcode(pos_codes, old_barcode))
+    transaction.on_commit(lambda: catalog.refresh_stock_ids(stock_ids))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_catalog(sender, instance, **kwargs):
+    stock_ids = list(Stock.objects.filter(product__category=instance).values_list("id", flat=True))
+    transaction.on_commit(lambda: catalog.refresh_stock_ids(stock_ids))
+
+
+@receiver(order_state_changed)
+def settle_reservations(sender, orders, source, target, **kwargs):
+    if target == Order.OrderState.PAID:
+        reservations.convert(orders)
+    elif target in (Order.OrderState.CANCELLED, Order.OrderState.ARCHIEVE):
+        order_ids = [order.id for order in orders]
+        transaction.on_commit(lambda: reservations.release(order_ids))
+
+
+@receiver(order_state_changed)
+def publish_order_states(sender, orders, source, target, **kwargs):
+    transaction.on_commit(lambda: events.publish_states(orders, target))
+
+
+@receiver(order_state_changed)
+def unschedule_expiry(sender, orders, source, target, **kwargs):
+    from .expiry import unschedule
+
+    if source == Order.OrderState.CREATED:
+        order_ids = [order.id for order in orders]
+        transaction.on_commit(lambda: unschedule(order_ids))
+
+
+@receiver(post_save, sender=Order)
+def count_created_order(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_created(instance)
+
+
+@receiver(order_state_changed)
+def count_order_transition(sender, orders, source, target, **kwargs):
+    rollups.record_transition(orders, source, target)
+
+
+@receiver(order_state_changed)
+def meter_order_transition(sender, orders, source, target, **kwargs):
+    metrics.fsm_transitions.inc(len(orders), model="order", source=source, target=target)
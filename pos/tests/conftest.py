@@ -1,7 +1,12 @@
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
 from rest_framework.test import APIClient
 from unittest.mock import patch
+from core.auth import auth_cache, sign_webhook
+from core.utils.querystats import take_violations
+from pos.catalog import catalog_cache
 from .factories import PointOfSaleTokenFactory
 
 @pytest.fixture(autouse=True)
@@ -9,10 +14,37 @@ def disable_rollbar():
     with patch("rollbar.report_message"), patch("rollbar.report_exc_info"):
         yield
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    auth_cache.clear_local()
+    catalog_cache.clear_local()
+    yield
+
+@pytest.fixture(autouse=True)
+def query_budgets(settings):
+    settings.QUERY_BUDGET_STRICT = True
+    take_violations()
+    yield
+    violations = take_violations()
+    assert not violations, "Превышен бюджет запросов:\n" + "\n".join(violations)
+
 @pytest.fixture
 def api_client():
 	return APIClient()
 
+class WebhookClient(APIClient):
+	"""Signs every request body like the acquirer does."""
+
+	def generic(self, method, path, data="", content_type="application/octet-stream", secure=False, **extra):
+		extra.setdefault("HTTP_X_SIGNATURE", sign_webhook(force_bytes(data)))
+		return super().generic(method, path, data, content_type, secure, **extra)
+
+@pytest.fixture
+def webhook_client(settings):
+	settings.PAYMENT_WEBHOOK_SECRET = "test-webhook-secret"
+	return WebhookClient()
+
 @pytest.fixture
 def auth_client(db):
     pos_token = PointOfSaleTokenFactory()
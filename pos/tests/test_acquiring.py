@@ -0,0 +1,102 @@
+import time
+from decimal import Decimal
+import pytest
+from django.urls import reverse
+from core.utils.acquiring import AcquiringUnavailable, HttpAcquiringGateway, reset_gateway
+from core.utils.stubs import StubServer
+from pos.tests.factories import OrderFactory
+
+
+@pytest.fixture
+def gateway_settings(settings):
+	settings.ACQUIRING_CONNECT_TIMEOUT = 0.5
+	settings.ACQUIRING_READ_TIMEOUT = 0.2
+	settings.ACQUIRING_TOTAL_TIMEOUT = 1.0
+	settings.ACQUIRING_RETRIES = 2
+	settings.ACQUIRING_BREAKER_THRESHOLD = 3
+	settings.ACQUIRING_BREAKER_RESET = 30
+	settings.ACQUIRING_TOKEN = ""
+	return settings
+
+
+def gateway_for(stub, settings):
+	settings.ACQUIRING_URL = stub.url
+	return HttpAcquiringGateway()
+
+
+@pytest.mark.django_db
+def test_gateway_returns_link(gateway_settings):
+	order = OrderFactory(total_price=Decimal("150.00"))
+	with StubServer(lambda method, path, payload: (200, {"payment_url": "https://pay.test/1"})) as stub:
+		link = gateway_for(stub, gateway_settings).create_payment_link(order, "card")
+	assert link == "https://pay.test/1"
+	assert stub.calls == [("POST", "/payments", {"order_id": order.id, "amount": "150.00", "type": "card"})]
+
+
+@pytest.mark.django_db
+def test_gateway_retries_server_errors(gateway_settings):
+	order = OrderFactory()
+	responses = iter([(503, {}), (200, {"payment_url": "https://pay.test/2"})])
+	with StubServer(lambda method, path, payload: next(responses)) as stub:
+		gateway = gateway_for(stub, gateway_settings)
+		assert gateway.create_payment_link(order, "sbp") == "https://pay.test/2"
+	assert len(stub.calls) == 2
+	assert [headers["Idempotency-Key"] for headers in stub.headers] == [f"order-{order.id}-sbp"] * 2
+	assert gateway.stats.snapshot()["errors"] == 1
+
+
+@pytest.mark.django_db
+def test_gateway_rejects_response_without_link(gateway_settings):
+	order = OrderFactory()
+	with StubServer(lambda method, path, payload: (200, {"status": "ok"})) as stub:
+		gateway = gateway_for(stub, gateway_settings)
+		with pytest.raises(AcquiringUnavailable):
+			gateway.create_payment_link(order, "card")
+	assert len(stub.calls) == 1
+	assert gateway.breaker.failures == 1
+
+
+@pytest.mark.django_db
+def test_gateway_read_timeout_is_bounded(gateway_settings):
+	order = OrderFactory()
+
+	def slow(method, path, payload):
+		time.sleep(0.5)
+		return 200, {"payment_url": "https://pay.test/3"}
+
+	with StubServer(slow) as stub:
+		gateway = gateway_for(stub, gateway_settings)
+		started = time.monotonic()
+		with pytest.raises(AcquiringUnavailable):
+			gateway.create_payment_link(order, "card")
+		assert time.monotonic() - started < gateway_settings.ACQUIRING_TOTAL_TIMEOUT + 0.3
+
+
+@pytest.mark.django_db
+def test_circuit_breaker_opens(gateway_settings):
+	order = OrderFactory()
+	with StubServer(lambda method, path, payload: (503, {})) as stub:
+		gateway = gateway_for(stub, gateway_settings)
+		with pytest.raises(AcquiringUnavailable):
+			gateway.create_payment_link(order, "card")
+		assert gateway.breaker.state == "open"
+		calls = len(stub.calls)
+		with pytest.raises(AcquiringUnavailable):
+			gateway.create_payment_link(order, "card")
+		assert len(stub.calls) == calls
+	assert gateway.stats.snapshot()["rejected"] == 1
+
+
+@pytest.mark.django_db
+def test_create_payment_acquirer_down(auth_client, gateway_settings):
+	order = OrderFactory()
+	with StubServer(lambda method, path, payload: (503, {})) as stub:
+		gateway_settings.ACQUIRING_URL = stub.url
+		gateway_settings.ACQUIRING_BACKEND = "core.utils.acquiring.HttpAcquiringGateway"
+		reset_gateway()
+		try:
+			res = auth_client.post(reverse("create-payment"), {"order_id": order.id, "payment_type": "card"})
+		finally:
+			reset_gateway()
+	assert res.status_code == 503
+	assert not order.payments.exists()
@@ -0,0 +1,70 @@
+import pytest
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from core.auth import POSTokenAuthentication, auth_cache
+from pos.tests.factories import PointOfSaleTokenFactory
+
+
+def authenticate(token):
+	request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Token {token}")
+	return POSTokenAuthentication().authenticate(request)
+
+
+@pytest.mark.django_db
+def test_auth_cached_after_first_request(django_assert_num_queries):
+	pos_token = PointOfSaleTokenFactory()
+	user, _ = authenticate(pos_token.token)
+	assert user.pos.id == pos_token.pos.id
+
+	auth_cache.clear_local()
+	with django_assert_num_queries(0):
+		user, _ = authenticate(pos_token.token)
+	with django_assert_num_queries(0):
+		user, _ = authenticate(pos_token.token)
+
+	assert user.username == "pos_system"
+	assert user.pos.id == pos_token.pos.id
+	stats = auth_cache.stats()
+	assert stats["shared_hits"] == 2
+	assert stats["local_hits"] == 2
+
+
+@pytest.mark.django_db
+def test_auth_user_copy_not_shared():
+	first = PointOfSaleTokenFactory()
+	second = PointOfSaleTokenFactory()
+	user1, _ = authenticate(first.token)
+	user2, _ = authenticate(second.token)
+	assert user1.pos.id == first.pos.id
+	assert user2.pos.id == second.pos.id
+
+
+@pytest.mark.django_db
+def test_auth_invalidated_on_token_rotation(admin_client):
+	pos_token = PointOfSaleTokenFactory()
+	old_token = pos_token.token
+	authenticate(old_token)
+
+	url = reverse("admin:pos_pointofsaletoken_change", args=[pos_token.id])
+	res = admin_client.post(url, {"_gen_token": "1"})
+	assert res.status_code == 302
+
+	with pytest.raises(AuthenticationFailed):
+		authenticate(old_token)
+	pos_token.refresh_from_db()
+	user, _ = authenticate(pos_token.token)
+	assert user.pos.id == pos_token.pos.id
+
+
+@pytest.mark.django_db
+def test_auth_invalidated_on_pos_deactivation(django_capture_on_commit_callbacks):
+	pos_token = PointOfSaleTokenFactory()
+	authenticate(pos_token.token)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		pos_token.pos.is_active = False
+		pos_token.pos.save()
+
+	with pytest.raises(AuthenticationFailed):
+		authenticate(pos_token.token)
@@ -0,0 +1,37 @@
+import json
+import pytest
+from io import StringIO
+from django.core.management import call_command
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_kiosks_against_live_server(live_server):
+	out = StringIO()
+	call_command(
+		"bench_kiosks", "--url", live_server.url, "--levels", "1,2", "--duration", "0.5", "--interval", "0.05",
+		"--p95-ms", "10000", stdout=out,
+	)
+	assert "2 киосков" in out.getvalue()
+	assert "ошибок 0.0%" in out.getvalue()
+	assert "Узел выдерживает киосков: 2" in out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_checkout_writes_report(tmp_path):
+	output = tmp_path / "report.json"
+	out = StringIO()
+	# Киоск стоит на первой точке: 3 товара по 4 штуки дают не больше 6 корзин по 2 товара из 10
+	call_command(
+		"bench_checkout", "--pos", "2", "--skus", "3", "--kiosks", "1", "--sessions", "10", "--stock", "4",
+		"--basket", "2", "--polls", "1", "--acquiring-delay-ms", "0", "--compact-every", "0", "--output", str(output),
+		stdout=out,
+	)
+	report = json.loads(output.read_text())
+	assert set(report["endpoints"]) == {"product-by-barcode", "create-order", "create-payment", "order-status", "mark-payment-paid"}
+	assert all(stats["errors"] == 0 for stats in report["endpoints"].values())
+	assert report["endpoints"]["create-order"]["queries_avg"] > 0
+	assert report["sessions"]["orders"] + report["sessions"]["refused"] == 10
+	assert report["sessions"]["paid"] == report["sessions"]["orders"] > 0
+	assert report["sessions"]["refused"] >= 4
+	assert report["oversold"] == []
+	assert "Отчёт сохранён" in out.getvalue()
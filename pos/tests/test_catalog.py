@@ -0,0 +1,101 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from pos.catalog import catalog_cache
+from pos.tests.factories import ProductFactory, StockFactory, PointOfSaleFactory
+
+
+def scan(client, pos, barcode):
+	return client.get(reverse("product-by-barcode", args=[barcode]), {"pos_code": pos.code})
+
+
+@pytest.mark.django_db
+def test_warm_scan_without_queries(auth_client, django_assert_num_queries):
+	stock = StockFactory(quantity=7)
+	res = scan(auth_client, stock.pos, stock.product.barcode)
+	assert res.status_code == status.HTTP_200_OK
+
+	catalog_cache.clear_local()
+	with django_assert_num_queries(0):
+		res = scan(auth_client, stock.pos, stock.product.barcode)
+	assert res.status_code == status.HTTP_200_OK
+	assert res.json() == {
+		"id": stock.product.id,
+		"name": stock.product.name,
+		"weight": stock.product.weight,
+		"category": stock.product.category.name,
+		"price": str(stock.product.price),
+		"barcode": stock.product.barcode,
+		"quantity": 7,
+	}
+
+
+@pytest.mark.django_db
+def test_unavailable_scan_is_cached(auth_client, django_assert_num_queries):
+	pos = PointOfSaleFactory()
+	scan(auth_client, pos, "missing")
+	with django_assert_num_queries(0):
+		res = scan(auth_client, pos, "missing")
+	assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_stock_save_refreshes_index(auth_client, django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=7)
+	scan(auth_client, stock.pos, stock.product.barcode)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		stock.quantity = 3
+		stock.save()
+	assert scan(auth_client, stock.pos, stock.product.barcode).json()["quantity"] == 3
+
+	with django_capture_on_commit_callbacks(execute=True):
+		stock.is_active = False
+		stock.save()
+	assert scan(auth_client, stock.pos, stock.product.barcode).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_new_stock_replaces_unavailable_entry(auth_client, django_capture_on_commit_callbacks):
+	pos = PointOfSaleFactory()
+	product = ProductFactory()
+	assert scan(auth_client, pos, product.barcode).status_code == status.HTTP_404_NOT_FOUND
+
+	with django_capture_on_commit_callbacks(execute=True):
+		StockFactory(pos=pos, product=product)
+	assert scan(auth_client, pos, product.barcode).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_product_and_category_changes_refresh_index(auth_client, django_capture_on_commit_callbacks):
+	stock = StockFactory()
+	product = stock.product
+	old_barcode = product.barcode
+	scan(auth_client, stock.pos, old_barcode)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		product.barcode = "renamed-barcode"
+		product.save()
+		product.category.name = "Renamed"
+		product.category.save()
+
+	assert scan(auth_client, stock.pos, old_barcode).status_code == status.HTTP_404_NOT_FOUND
+	res = scan(auth_client, stock.pos, "renamed-barcode")
+	assert res.status_code == status.HTTP_200_OK
+	assert res.json()["category"] == "Renamed"
+
+
+@pytest.mark.django_db
+def test_pos_code_change_resets_index(auth_client, django_capture_on_commit_callbacks):
+	stock = StockFactory()
+	pos = stock.pos
+	old_code = pos.code
+	scan(auth_client, pos, stock.product.barcode)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		pos.code = "renamed-pos"
+		pos.save()
+
+	res = auth_client.get(reverse("product-by-barcode", args=[stock.product.barcode]), {"pos_code": old_code})
+	assert res.status_code == status.HTTP_404_NOT_FOUND
+	assert scan(auth_client, pos, stock.product.barcode).status_code == status.HTTP_200_OK
@@ -0,0 +1,87 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from pos.checkout import CheckoutError, create_order
+from pos.reservations import reserved_quantities
+from pos.models import Stock
+from pos.tests.factories import ProductFactory, StockFactory, PointOfSaleFactory
+
+
+def basket(pos, size):
+	stocks = [StockFactory(pos=pos, product=ProductFactory(price=Decimal("10.50")), quantity=10) for _ in range(size)]
+	return stocks, [{"barcode": stock.product.barcode, "quantity": 2} for stock in stocks]
+
+
+def count_queries(pos, items):
+	with CaptureQueriesContext(connection) as ctx:
+		create_order(pos, items)
+	return len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_create_order_merges_duplicate_barcodes():
+	pos = PointOfSaleFactory()
+	stock = StockFactory(pos=pos, quantity=10)
+	barcode = stock.product.barcode
+	order = create_order(pos, [{"barcode": barcode, "quantity": 1}, {"barcode": barcode, "quantity": 2}])
+	items = list(order.items.all())
+	assert len(items) == 1
+	assert items[0].quantity == 3
+	assert items[0].total_price == stock.product.price * 3
+	order.refresh_from_db()
+	assert order.total_price == stock.product.price * 3
+	assert reserved_quantities(pos.id, [stock.product_id]) == {stock.product_id: 3}
+
+
+@pytest.mark.django_db
+def test_create_order_query_budget_independent_of_basket_size():
+	pos = PointOfSaleFactory()
+	_, small = basket(pos, 1)
+	_, large = basket(pos, 25)
+	assert count_queries(pos, small) == count_queries(pos, large)
+
+
+@pytest.mark.django_db
+def test_create_order_totals_and_stock():
+	pos = PointOfSaleFactory()
+	stocks, items = basket(pos, 5)
+	order = create_order(pos, items)
+	order.refresh_from_db()
+	assert order.total_price == Decimal("105.00")
+	assert set(Stock.objects.filter(id__in=[s.id for s in stocks]).values_list("quantity", flat=True)) == {10}
+	assert set(reserved_quantities(pos.id, [s.product_id for s in stocks]).values()) == {2}
+
+
+@pytest.mark.django_db
+def test_create_order_unknown_barcode_rolls_back():
+	pos = PointOfSaleFactory()
+	stock = StockFactory(pos=pos, quantity=10)
+	with pytest.raises(CheckoutError):
+		create_order(pos, [{"barcode": stock.product.barcode, "quantity": 1}, {"barcode": "missing", "quantity": 1}])
+	stock.refresh_from_db()
+	assert stock.quantity == 10
+	assert not pos.orders.exists()
+
+
+@pytest.mark.django_db
+def test_create_order_insufficient_stock_rolls_back():
+	pos = PointOfSaleFactory()
+	plenty = StockFactory(pos=pos, quantity=10)
+	scarce = StockFactory(pos=pos, quantity=1)
+	items = [{"barcode": plenty.product.barcode, "quantity": 2}, {"barcode": scarce.product.barcode, "quantity": 2}]
+	with pytest.raises(CheckoutError, match=scarce.product.name):
+		create_order(pos, items)
+	assert reserved_quantities(pos.id, [plenty.product_id, scarce.product_id]) == {plenty.product_id: 0, scarce.product_id: 0}
+	assert not pos.orders.exists()
+
+
+@pytest.mark.django_db
+def test_create_order_respects_existing_holds():
+	pos = PointOfSaleFactory()
+	stock = StockFactory(pos=pos, quantity=3)
+	create_order(pos, [{"barcode": stock.product.barcode, "quantity": 2}])
+	with pytest.raises(CheckoutError):
+		create_order(pos, [{"barcode": stock.product.barcode, "quantity": 2}])
+	create_order(pos, [{"barcode": stock.product.barcode, "quantity": 1}])
+	assert reserved_quantities(pos.id, [stock.product_id]) == {stock.product_id: 3}
@@ -0,0 +1,16 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_db_connections_restores_settings():
+	original = connection.settings_dict["CONN_MAX_AGE"]
+	out = StringIO()
+	call_command("bench_db_connections", "--requests", "5", stdout=out)
+	assert "Новое соединение" in out.getvalue()
+	assert "Постоянное соединение" in out.getvalue()
+	assert "Установка соединения" in out.getvalue()
+	assert connection.settings_dict["CONN_MAX_AGE"] == original
+
@@ -0,0 +1,74 @@
+import json
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import Client
+from django.urls import reverse
+from api import streams
+from core.utils.redis_client import get_async_redis, get_redis
+from pos.events import order_channel
+from pos.flow import OrderFlow
+from pos.tests.factories import OrderFactory, PointOfSaleTokenFactory
+
+
+@pytest.fixture
+def token_client(db):
+	pos_token = PointOfSaleTokenFactory()
+	return Client(HTTP_AUTHORIZATION=f"Token {pos_token.token}")
+
+
+@pytest.mark.django_db
+def test_transition_publishes_state(django_capture_on_commit_callbacks):
+	order = OrderFactory()
+	pubsub = get_redis().pubsub()
+	pubsub.subscribe(order_channel(order.id))
+	pubsub.get_message(timeout=1)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		OrderFlow(order).mark_paid()
+
+	message = pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+	pubsub.close()
+	assert json.loads(message["data"]) == {"state": "PAID"}
+
+
+@pytest.mark.django_db
+@pytest.mark.filterwarnings("ignore:StreamingHttpResponse must consume asynchronous iterators")
+def test_order_events_final_state(token_client):
+	order = OrderFactory(state="PAID")
+	res = token_client.get(reverse("order-events", args=[order.id]))
+	assert res.status_code == 200
+	assert res["Content-Type"] == "text/event-stream"
+	assert b"".join(res).decode() == 'event: state\ndata: {"state": "PAID"}\n\n'
+
+
+@pytest.mark.django_db
+def test_order_events_requires_auth():
+	order = OrderFactory()
+	res = Client(HTTP_AUTHORIZATION="Token invalid").get(reverse("order-events", args=[order.id]))
+	assert res.status_code == 401
+
+
+@pytest.mark.django_db
+def test_order_events_not_found(token_client):
+	res = token_client.get(reverse("order-events", args=[999999]))
+	assert res.status_code == 404
+	assert res.json() == {"error": "Заказ не найден"}
+
+
+@pytest.mark.django_db
+def test_order_events_share_one_subscriber():
+	order = OrderFactory()
+
+	async def listen():
+		first, second = streams._order_states(order.id), streams._order_states(order.id)
+		assert await anext(first) == await anext(second) == 'event: state\ndata: {"state": "CREATED"}\n\n'
+		assert len(streams._subscribers) == 1
+
+		await get_async_redis().publish(order_channel(order.id), json.dumps({"state": "PAID"}))
+		assert await anext(first) == await anext(second) == 'event: state\ndata: {"state": "PAID"}\n\n'
+		for stream in (first, second):
+			with pytest.raises(StopAsyncIteration):
+				await anext(stream)
+		assert len(streams._subscribers) == 0
+
+	async_to_sync(listen)()
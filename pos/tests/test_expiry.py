@@ -0,0 +1,59 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from pos import expiry
+from pos.checkout import create_order
+from pos.flow import OrderFlow
+from pos.models import Order
+from pos.tests.factories import OrderFactory, PaymentFactory, StockFactory
+from core.utils.redis_client import get_redis
+
+
+def scheduled():
+	return [int(order_id) for order_id in get_redis().zrange(expiry.SCHEDULE_KEY, 0, -1)]
+
+
+@pytest.mark.django_db
+def test_create_order_schedules_expiry(settings, django_capture_on_commit_callbacks):
+	settings.ORDER_TTL = 300
+	stock = StockFactory(quantity=10)
+	with django_capture_on_commit_callbacks(execute=True):
+		order = create_order(stock.pos, [{"barcode": stock.product.barcode, "quantity": 1}])
+	assert order.expires_at > timezone.now() + timedelta(seconds=290)
+	assert scheduled() == [order.id]
+	assert expiry.expire_due() == []
+
+
+@pytest.mark.django_db
+def test_expire_due_archives_only_due_orders():
+	due = PaymentFactory(state="PENDING", order__expires_at=timezone.now() - timedelta(seconds=1))
+	live = OrderFactory(expires_at=timezone.now() + timedelta(minutes=5))
+	paid = OrderFactory(state="PAID", expires_at=timezone.now() - timedelta(seconds=1))
+	for order in (due.order, live, paid):
+		expiry.schedule(order)
+
+	assert expiry.expire_due() == [due.order_id]
+
+	due.refresh_from_db()
+	assert due.state == "FAILED"
+	assert Order.objects.get(id=due.order_id).state == "ARCHIEVE"
+	assert Order.objects.get(id=live.id).state == "CREATED"
+	assert scheduled() == [live.id]
+
+
+@pytest.mark.django_db
+def test_expire_due_drops_deleted_orders():
+	order = OrderFactory(expires_at=timezone.now() - timedelta(seconds=1))
+	expiry.schedule(order)
+	Order.objects.filter(id=order.id).delete()
+	assert expiry.expire_due() == []
+	assert scheduled() == []
+
+
+@pytest.mark.django_db
+def test_paid_order_unscheduled(django_capture_on_commit_callbacks):
+	order = OrderFactory(expires_at=timezone.now() + timedelta(minutes=5))
+	expiry.schedule(order)
+	with django_capture_on_commit_callbacks(execute=True):
+		OrderFlow(order).mark_paid()
+	assert scheduled() == []
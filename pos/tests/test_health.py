@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from django.urls import reverse
+from core.utils import health
+
+
+@pytest.fixture(autouse=True)
+def fresh_results():
+	health.clear_cache()
+	yield
+	health.clear_cache()
+
+
+def test_liveness_touches_nothing(client):
+	res = client.get(reverse("health-live"))
+	assert res.status_code == 200
+	assert res.json() == {"status": "ok"}
+
+
+@pytest.mark.django_db
+def test_readiness_reports_latency(client):
+	res = client.get(reverse("health-ready"))
+	assert res.status_code == 200
+	checks = res.json()["checks"]
+	assert set(checks) == {"db", "redis"}
+	assert all(check["ok"] and check["ms"] >= 0 for check in checks.values())
+
+
+@pytest.mark.django_db
+def test_readiness_fails_and_is_cached(client, monkeypatch):
+	calls = []
+
+	async def broken():
+		calls.append(1)
+		raise ConnectionError("down")
+
+	monkeypatch.setitem(health.CHECKS, "redis", broken)
+	first = client.get(reverse("health-ready"))
+	second = client.get(reverse("health-ready"))
+	assert first.status_code == second.status_code == 503
+	assert first.json()["checks"]["redis"]["error"] == "down"
+	assert first.json()["checks"]["db"]["ok"]
+	assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_checks_run_concurrently_with_deadline(client, settings, monkeypatch):
+	settings.HEALTH_CHECK_TIMEOUT = 0.2
+
+	async def hanging():
+		await asyncio.sleep(5)
+
+	monkeypatch.setitem(health.CHECKS, "db", hanging)
+	monkeypatch.setitem(health.CHECKS, "redis", hanging)
+	res = client.get(reverse("health-ready"))
+	checks = res.json()["checks"]
+	assert res.status_code == 503
+	assert checks["db"]["error"] == checks["redis"]["error"] == "timeout"
+	assert checks["db"]["ms"] < 1000
+
+
+@pytest.mark.django_db
+def test_celery_checked_by_heartbeat(client, settings):
+	res = client.get(reverse("health"))
+	assert res.json()["celery"] is False
+	assert res.json()["status"] == "error"
+
+	health.beat("celery@worker-1")
+	health.clear_cache()
+	res = client.get(reverse("health"))
+	assert res.json()["celery"] is True
+	assert res.json()["status"] == "ok"
+	assert "pos_auth" in res.json()["cache"]
+
+	settings.HEALTH_HEARTBEAT_TTL = 0
+	health.clear_cache()
+	assert client.get(reverse("health")).json()["celery"] is False
+
+
+def test_worker_heartbeat_thread():
+	redis = health.get_redis()
+	health.start_heartbeat("celery@worker-2")
+	for _ in range(50):
+		if redis.zscore(health.HEARTBEAT_KEY, "celery@worker-2"):
+			break
+		time.sleep(0.01)
+	assert redis.zscore(health.HEARTBEAT_KEY, "celery@worker-2")
+	health.stop_heartbeat()
+	assert redis.zscore(health.HEARTBEAT_KEY, "celery@worker-2") is None
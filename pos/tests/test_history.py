@@ -0,0 +1,103 @@
+import pytest
+from datetime import timedelta
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.tasks import snapshot_stocks
+from core.utils import metrics
+from core.utils.history import deferred_history
+from pos.models import Order, Payment, Stock, StockSnapshot
+from pos.tests.factories import OrderFactory, PaymentFactory, StockFactory
+
+
+def history_inserts(queries, table):
+	return [query for query in queries if query["sql"].startswith(f'INSERT INTO "{table}"')]
+
+
+@pytest.mark.django_db
+def test_history_written_after_commit(django_capture_on_commit_callbacks):
+	with django_capture_on_commit_callbacks() as callbacks:
+		order = OrderFactory()
+		assert not Order.history.filter(id=order.id).exists()
+	for callback in callbacks:
+		callback()
+	assert Order.history.filter(id=order.id).get().history_type == "+"
+
+
+@pytest.mark.django_db
+def test_history_rolled_back_with_savepoint(django_capture_on_commit_callbacks):
+	with django_capture_on_commit_callbacks(execute=True):
+		order = OrderFactory()
+		try:
+			with transaction.atomic():
+				order.state = Order.OrderState.CANCELLED
+				order.save()
+				raise RuntimeError
+		except RuntimeError:
+			pass
+	assert list(Order.history.filter(id=order.id).values_list("state", flat=True)) == [Order.OrderState.CREATED]
+
+
+@pytest.mark.django_db
+def test_deferred_history_batches_inserts(django_capture_on_commit_callbacks):
+	with CaptureQueriesContext(connection) as ctx:
+		with deferred_history():
+			with django_capture_on_commit_callbacks(execute=True):
+				orders = [OrderFactory() for _ in range(5)]
+				for order in orders:
+					PaymentFactory(order=order)
+	assert len(history_inserts(ctx.captured_queries, "pos_historicalorder")) == 1
+	assert len(history_inserts(ctx.captured_queries, "pos_historicalpayment")) == 1
+	assert Order.history.filter(id__in=[order.id for order in orders]).count() == 5
+
+
+@pytest.mark.django_db
+def test_failed_history_flush_is_reported(monkeypatch, django_capture_on_commit_callbacks):
+	def fail(rows):
+		raise RuntimeError("history insert failed")
+
+	monkeypatch.setattr(Order.history.model.objects, "bulk_create", fail)
+	lost = []
+	monkeypatch.setattr(metrics.history_rows_lost, "inc", lambda amount, **labels: lost.append((amount, labels)))
+	after = []
+	with django_capture_on_commit_callbacks(execute=True):
+		order = OrderFactory()
+		PaymentFactory(order=order)
+		transaction.on_commit(lambda: after.append(order.id))
+	assert not Order.history.filter(id=order.id).exists()
+	assert Payment.history.filter(order_id=order.id).exists()
+	assert after == [order.id]
+	assert lost == [(1, {"model": "HistoricalOrder"})]
+
+
+@pytest.mark.django_db
+def test_stock_history_skips_quantity(django_capture_on_commit_callbacks):
+	with django_capture_on_commit_callbacks(execute=True):
+		stock = StockFactory(quantity=10)
+	Stock.objects.filter(id=stock.id).update(quantity=3)
+	stock.refresh_from_db()
+	with django_capture_on_commit_callbacks(execute=True):
+		stock.save()
+	assert stock.history.count() == 2
+	assert not hasattr(stock.history.first(), "quantity")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_request_history_flushed_once(auth_client):
+	stock = StockFactory(quantity=10)
+	data = {"pos_code": stock.pos.code, "order": [{"barcode": stock.product.barcode, "quantity": 2}]}
+	with CaptureQueriesContext(connection) as ctx:
+		response = auth_client.post(reverse("create-order"), data, format="json")
+	assert response.status_code == 200
+	assert len(history_inserts(ctx.captured_queries, "pos_historicalorder")) == 1
+	assert Order.history.filter(id=response.data["order_id"]).exists()
+
+
+@pytest.mark.django_db
+def test_snapshot_stocks_task():
+	stocks = [StockFactory(quantity=quantity) for quantity in (5, 7)]
+	old = StockSnapshot.objects.create(stock=stocks[0], quantity=1, taken_at=timezone.now() - timedelta(days=365))
+	snapshot_stocks()
+	assert not StockSnapshot.objects.filter(id=old.id).exists()
+	assert sorted(StockSnapshot.objects.values_list("quantity", flat=True)) == [5, 7]
@@ -0,0 +1,88 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from redis.exceptions import ConnectionError
+from unittest.mock import patch
+from api.models import IdempotencyKey
+from pos.models import Order, Payment
+from pos.tests.factories import OrderFactory, StockFactory
+
+
+def post_order(client, stock, key, quantity=1):
+	url = reverse("create-order")
+	data = {"pos_code": stock.pos.code, "order": [{"barcode": stock.product.barcode, "quantity": quantity}]}
+	return client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+
+@pytest.mark.django_db
+def test_create_order_replayed(auth_client):
+	stock = StockFactory(quantity=10)
+	first = post_order(auth_client, stock, "key-1")
+	second = post_order(auth_client, stock, "key-1")
+	assert first.status_code == second.status_code == 200
+	assert first.json() == second.json()
+	assert second["Idempotent-Replayed"] == "true"
+	assert Order.objects.filter(pos=stock.pos).count() == 1
+
+
+@pytest.mark.django_db
+def test_create_order_different_keys(auth_client):
+	stock = StockFactory(quantity=10)
+	post_order(auth_client, stock, "key-1")
+	post_order(auth_client, stock, "key-2")
+	assert Order.objects.filter(pos=stock.pos).count() == 2
+
+
+@pytest.mark.django_db
+def test_key_reused_with_different_body(auth_client):
+	stock = StockFactory(quantity=10)
+	post_order(auth_client, stock, "key-1")
+	res = post_order(auth_client, stock, "key-1", quantity=2)
+	assert res.status_code == 422
+
+
+@pytest.mark.django_db
+def test_in_flight_duplicate_gets_conflict(auth_client, settings):
+	settings.IDEMPOTENCY_WAIT = 0
+	stock = StockFactory(quantity=10)
+	with patch("api.idempotency._acquire", return_value=False):
+		res = post_order(auth_client, stock, "key-1")
+	assert res.status_code == 409
+	assert not Order.objects.filter(pos=stock.pos).exists()
+
+
+@pytest.mark.django_db
+def test_create_payment_db_fallback(auth_client):
+	order = OrderFactory()
+	url = reverse("create-payment")
+	with patch.object(cache, "get", side_effect=ConnectionError), \
+			patch.object(cache, "add", side_effect=ConnectionError), \
+			patch.object(cache, "set", side_effect=ConnectionError):
+		first = auth_client.post(url, {"order_id": order.id, "payment_type": "card"}, HTTP_IDEMPOTENCY_KEY="pay-1")
+		second = auth_client.post(url, {"order_id": order.id, "payment_type": "card"}, HTTP_IDEMPOTENCY_KEY="pay-1")
+	assert first.json() == second.json()
+	assert Payment.objects.filter(order=order).count() == 1
+	assert IdempotencyKey.objects.get().status_code == 200
+
+
+@pytest.mark.django_db
+def test_retry_after_first_request_finished_is_replayed(auth_client):
+	from api import idempotency
+
+	stock = StockFactory(quantity=10)
+	first = post_order(auth_client, stock, "key-1")
+	load = idempotency._load
+	calls = []
+
+	def stale_first_read(key):
+		# Повтор не видит ответ, потому что первый запрос сохранил его сразу после чтения
+		calls.append(key)
+		return None if len(calls) == 1 else load(key)
+
+	with patch("api.idempotency._load", side_effect=stale_first_read):
+		second = post_order(auth_client, stock, "key-1")
+	assert second.status_code == 200
+	assert second["Idempotent-Replayed"] == "true"
+	assert second.json() == first.json()
+	assert Order.objects.filter(pos=stock.pos).count() == 1
+	assert cache.add(f"idem-lock:{calls[0]}", "x")
@@ -0,0 +1,82 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pos import ledger
+from pos.models import Stock, StockMovement
+from pos.tests.factories import OrderFactory, StockFactory
+from core.tasks import compact_stock_movements
+
+
+def sell(stock, quantity, order=None):
+	order = order or OrderFactory(pos=stock.pos)
+	return ledger.record_sales({(stock.id, order.id): quantity})
+
+
+@pytest.mark.django_db
+def test_sales_only_insert_movements(django_assert_num_queries):
+	stock = StockFactory(quantity=10)
+	orders = [OrderFactory(pos=stock.pos) for _ in range(3)]
+	with django_assert_num_queries(1):
+		ledger.record_sales({(stock.id, order.id): 2 for order in orders})
+	stock.refresh_from_db()
+	assert stock.quantity == 10
+	assert stock.current_quantity == 4
+	assert ledger.with_pending(Stock.objects.filter(id=stock.id)).get().pending_quantity == -6
+
+
+@pytest.mark.django_db
+def test_compaction_folds_movements():
+	stocks = [StockFactory(quantity=10) for _ in range(2)]
+	sell(stocks[0], 3)
+	sell(stocks[1], 1)
+	StockMovement.objects.create(stock=stocks[0], kind=StockMovement.MovementKind.RESTOCK, delta=5)
+
+	assert compact_stock_movements() == {"movements": 3, "stocks": 2}
+	assert compact_stock_movements() == {"movements": 0, "stocks": 0}
+	assert list(Stock.objects.order_by("id").values_list("quantity", flat=True)) == [12, 9]
+	assert not StockMovement.objects.filter(compacted=False).exists()
+	assert StockMovement.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_compaction_in_batches():
+	stock = StockFactory(quantity=10)
+	for _ in range(5):
+		sell(stock, 1)
+	assert ledger.compact(batch_size=2)["movements"] == 2
+	stock.refresh_from_db()
+	assert (stock.quantity, stock.current_quantity) == (8, 5)
+
+
+@pytest.mark.django_db
+def test_oversold_stock_goes_negative_and_is_flagged():
+	stock = StockFactory(quantity=1)
+	sell(stock, 2)
+	ledger.compact()
+	stock.refresh_from_db()
+	assert stock.quantity == -1
+	assert stock.oversold
+
+
+@pytest.mark.django_db
+def test_catalog_shows_current_quantity(auth_client, django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=10)
+	with django_capture_on_commit_callbacks(execute=True):
+		StockMovement.objects.create(stock=stock, kind=StockMovement.MovementKind.CORRECTION, delta=-4)
+	res = auth_client.get(reverse("product-by-barcode", args=[stock.product.barcode]), {"pos_code": stock.pos.code})
+	assert res.json()["quantity"] == 6
+
+
+@pytest.mark.django_db
+def test_movement_changelist_queries_do_not_grow(admin_client):
+	url = reverse("admin:pos_stockmovement_changelist")
+	stock = StockFactory(quantity=10)
+	sell(stock, 1)
+	with CaptureQueriesContext(connection) as few:
+		assert admin_client.get(url).status_code == 200
+	for _ in range(5):
+		sell(StockFactory(quantity=10), 1)
+	with CaptureQueriesContext(connection) as many:
+		assert admin_client.get(url).status_code == 200
+	assert len(many) == len(few)
@@ -0,0 +1,111 @@
+import pytest
+import redis
+from django.conf import settings as django_settings
+from django.urls import reverse
+from core import tasks
+from core.utils import metrics
+from pos.tests.factories import OrderFactory, PaymentFactory, PointOfSaleFactory, ProductFactory, StockFactory
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+	metrics.reset()
+	yield
+	metrics.reset()
+
+
+def scrape(client, **headers):
+	res = client.get(reverse("metrics"), headers=headers)
+	assert res.status_code == 200
+	assert res["Content-Type"].startswith("text/plain")
+	return res.content.decode()
+
+
+def test_counter_increments_add_up_across_flushes():
+	counter = metrics.Counter("test_events_total", "Test events", labels=("kind",))
+	try:
+		counter.inc(kind="a")
+		metrics.flush()
+		counter.inc(2, kind="a")
+		counter.inc(kind='b"c')
+		metrics.flush()
+		text = metrics.render()
+	finally:
+		metrics.REGISTRY.pop("test_events_total")
+	assert "# TYPE test_events_total counter" in text
+	assert 'test_events_total{kind="a"} 3' in text
+	assert 'test_events_total{kind="b\\"c"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+	histogram = metrics.Histogram("test_seconds", "Test latency", labels=("view",), buckets=(0.1, 1.0))
+	try:
+		for value in (0.05, 0.5, 0.7, 3.0):
+			histogram.observe(value, view="x")
+		metrics.flush()
+		text = metrics.render()
+	finally:
+		metrics.REGISTRY.pop("test_seconds")
+	assert 'test_seconds_bucket{view="x",le="0.1"} 1' in text
+	assert 'test_seconds_bucket{view="x",le="1.0"} 3' in text
+	assert 'test_seconds_bucket{view="x",le="+Inf"} 4' in text
+	assert 'test_seconds_count{view="x"} 4' in text
+	assert 'test_seconds_sum{view="x"} 4.25' in text
+
+
+def test_forked_process_drops_parent_buffer(monkeypatch):
+	metrics.db_queries.inc(5, target="parent")
+	monkeypatch.setattr(metrics.os, "getpid", lambda: -1)
+	metrics.db_queries.inc(1, target="child")
+	metrics.flush()
+	text = metrics.render()
+	assert 'target="parent"' not in text
+	assert 'db_queries_total{target="child"} 1' in text
+
+
+@pytest.mark.django_db
+def test_request_metrics(auth_client, client):
+	pos = PointOfSaleFactory()
+	product = ProductFactory()
+	StockFactory(pos=pos, product=product)
+	auth_client.get(reverse("product-by-barcode", args=[product.barcode]), {"pos_code": pos.code})
+	auth_client.get("/not-a-page/")
+
+	text = scrape(client)
+	assert 'http_request_duration_seconds_count{view="product-by-barcode",method="GET",status="200"} 1' in text
+	assert 'http_request_duration_seconds_count{view="unmatched",method="GET",status="404"} 1' in text
+	assert 'db_queries_total{target="product-by-barcode"}' in text
+	assert 'db_query_duration_seconds_total{target="product-by-barcode"}' in text
+	assert 'cache_requests_total{cache="pos_auth",result="miss"}' in text
+
+
+@pytest.mark.django_db
+def test_fsm_transitions_counted(api_client, client):
+	order = OrderFactory(state="CREATED")
+	PaymentFactory(order=order, state="PENDING")
+	res = api_client.post(reverse("mark-payment-paid"), {"order_id": order.id}, format="json")
+	assert res.status_code == 200
+
+	text = scrape(client)
+	assert 'fsm_transitions_total{model="order",source="CREATED",target="PAID"} 1' in text
+	assert 'fsm_transitions_total{model="payment",source="PENDING",target="PAID"} 1' in text
+
+
+@pytest.mark.django_db
+def test_celery_task_runtime_and_queue_length(client):
+	tasks.purge_idempotency_keys.apply()
+	broker = redis.Redis.from_url(django_settings.CELERY_BROKER_URL)
+	broker.lpush("celery", "a", "b")
+	broker.lpush("notifications\x06\x163", "c")
+
+	text = scrape(client)
+	assert 'celery_task_duration_seconds_count{task="purge_idempotency_keys",state="SUCCESS"} 1' in text
+	assert 'db_queries_total{target="purge_idempotency_keys"} 1' in text
+	assert 'celery_queue_length{queue="celery"} 2' in text
+	assert 'celery_queue_length{queue="notifications"} 1' in text
+
+
+def test_metrics_token(client, settings):
+	settings.METRICS_TOKEN = "secret"
+	assert client.get(reverse("metrics")).status_code == 403
+	assert "# TYPE celery_queue_length gauge" in scrape(client, authorization="Bearer secret")
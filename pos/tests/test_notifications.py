@@ -0,0 +1,96 @@
+import time
+import pytest
+from core import tasks
+from core.utils import notifications
+from core.utils.notifications import split_message
+from core.utils.stubs import StubServer
+
+
+@pytest.fixture
+def telegram(settings):
+	def connect(stub):
+		settings.TELEGRAM_API_URL = stub.url
+		settings.TELEGRAM_BOT_TOKEN = "test-token"
+		settings.NOTIFY_CONNECT_TIMEOUT = 0.5
+		settings.NOTIFY_READ_TIMEOUT = 0.2
+		notifications.reset_client()
+		return stub
+
+	yield connect
+	notifications.reset_client()
+
+
+def test_split_message_keeps_lines():
+	text = "\n".join(f"строка {i}" for i in range(100))
+	parts = split_message(text, limit=100)
+	assert all(len(part) <= 100 for part in parts)
+	assert "\n".join(parts) == text
+	assert split_message("x" * 250, limit=100) == ["x" * 100, "x" * 100, "x" * 50]
+	assert split_message("") == []
+
+
+def test_send_notification_delivers_parts_in_order(telegram):
+	with telegram(StubServer(lambda method, path, payload: (200, {"ok": True}))) as stub:
+		assert tasks.send_notification.apply(args=["42", ["первая", "вторая"]]).get() == 2
+	assert stub.calls == [
+		("POST", "/bottest-token/sendMessage", {"chat_id": "42", "text": "первая"}),
+		("POST", "/bottest-token/sendMessage", {"chat_id": "42", "text": "вторая"}),
+	]
+
+
+def test_send_notification_retries_from_failed_part(telegram, monkeypatch):
+	monkeypatch.setattr(notifications, "retry_delay", lambda retries: 0)
+	responses = iter([(200, {"ok": True}), (502, {}), (429, {"ok": False, "parameters": {"retry_after": 1}}), (200, {"ok": True})])
+	with telegram(StubServer(lambda method, path, payload: next(responses))) as stub:
+		result = tasks.send_notification.apply(args=["42", ["первая", "вторая"]])
+	assert result.successful()
+	assert [payload["text"] for _, _, payload in stub.calls] == ["первая", "вторая", "вторая", "вторая"]
+
+
+def test_send_notification_timeout_is_retryable(telegram):
+	def hanging(method, path, payload):
+		time.sleep(0.5)
+		return 200, {"ok": True}
+
+	with telegram(StubServer(hanging)):
+		started = time.monotonic()
+		with pytest.raises(notifications.NotificationError):
+			notifications.get_client().send_message("42", "текст")
+		assert time.monotonic() - started < 0.45
+
+
+def test_send_notification_rejected_is_not_retried(telegram):
+	with telegram(StubServer(lambda method, path, payload: (400, {"ok": False}))) as stub:
+		assert tasks.send_notification.apply(args=["42", ["первая", "вторая"]]).get() == 0
+	assert len(stub.calls) == 1
+
+
+def test_notify_fans_out_to_chats(settings, monkeypatch):
+	settings.TELEGRAM_BOT_TOKEN = "test-token"
+	settings.TELEGRAM_CHAT_IDS = ["1", "2"]
+	queued = []
+	monkeypatch.setattr(tasks.send_notification, "delay", lambda chat_id, parts: queued.append((chat_id, parts)))
+	assert notifications.notify("a" * 5000) == 2
+	assert [chat_id for chat_id, _ in queued] == ["1", "2"]
+	assert [len(part) for part in queued[0][1]] == [4096, 904]
+
+
+def test_notify_skipped_without_chats(settings, monkeypatch):
+	settings.TELEGRAM_CHAT_IDS = []
+	monkeypatch.setattr(tasks.send_notification, "delay", pytest.fail)
+	assert notifications.notify("текст") == 0
+
+
+def test_notify_queues_without_token_on_producer(settings, monkeypatch):
+	settings.TELEGRAM_BOT_TOKEN = ""
+	settings.TELEGRAM_CHAT_IDS = ["1"]
+	queued = []
+	monkeypatch.setattr(tasks.send_notification, "delay", lambda chat_id, parts: queued.append(chat_id))
+	assert notifications.notify("текст") == 1
+	assert queued == ["1"]
+
+
+def test_send_notification_skipped_without_token(settings, monkeypatch):
+	settings.TELEGRAM_BOT_TOKEN = ""
+	monkeypatch.setattr(notifications, "get_client", pytest.fail)
+	assert tasks.send_notification.apply(args=["42", ["текст"]]).get() == 0
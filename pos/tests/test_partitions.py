@@ -0,0 +1,55 @@
+import pytest
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import connection
+from pos import partitions
+from pos.models import Order
+from pos.tests.factories import OrderFactory
+
+postgres_only = pytest.mark.skipif(connection.vendor != "postgresql", reason="Секционирование есть только в PostgreSQL")
+
+
+def test_month_arithmetic():
+	assert partitions.month_start(date(2025, 3, 17)) == date(2025, 3, 1)
+	assert partitions.add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+	assert partitions.add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+	assert partitions.partition_name("pos_historicalorder", date(2025, 2, 1)) == "pos_historicalorder_p202502"
+
+
+@pytest.mark.django_db
+def test_partition_maintenance_is_noop_without_postgres():
+	if connection.vendor == "postgresql":
+		pytest.skip("Проверяется в тестах PostgreSQL")
+	assert partitions.ensure_partitions(3) == []
+	assert partitions.drop_partitions_before(date(2020, 1, 1)) == []
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_history_rows_land_in_month_partition(django_capture_on_commit_callbacks):
+	with django_capture_on_commit_callbacks(execute=True):
+		order = OrderFactory()
+	with connection.cursor() as cursor:
+		for table in partitions.HISTORY_TABLES:
+			assert partitions.is_partitioned(cursor, table)
+		cursor.execute("SELECT tableoid::regclass::text FROM pos_historicalorder WHERE id = %s", [order.id])
+		assert cursor.fetchone()[0] == partitions.partition_name("pos_historicalorder", partitions.month_start(date.today()))
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_ensure_and_drop_partitions(django_capture_on_commit_callbacks):
+	today = date.today()
+	assert partitions.ensure_partitions(2, today) == []
+
+	old = partitions.add_months(partitions.month_start(today), -14)
+	with django_capture_on_commit_callbacks(execute=True):
+		order = OrderFactory()
+	Order.history.filter(id=order.id).update(history_date=datetime(old.year, old.month, 5, tzinfo=dt_timezone.utc))
+	created = partitions.ensure_partitions(0, old)
+	assert created == [partitions.partition_name(table, old) for table in partitions.HISTORY_TABLES]
+	assert Order.history.filter(id=order.id).exists()
+
+	dropped = partitions.drop_partitions_before(partitions.add_months(old, 1))
+	assert partitions.partition_name("pos_historicalorder", old) in dropped
+	assert not Order.history.filter(id=order.id).exists()
+	assert Order.objects.filter(id=order.id).exists()
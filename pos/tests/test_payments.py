@@ -0,0 +1,91 @@
+import pytest
+from django.urls import reverse
+from pos import reservations
+from pos.models import Order, Payment, Receipt
+from pos.payments import settle_outcomes
+from pos.tests.factories import OrderFactory, OrderItemFactory, PaymentFactory, StockFactory
+
+
+@pytest.mark.django_db
+def test_settle_outcomes_results_in_input_order():
+	paid = PaymentFactory(state="PENDING")
+	failed = PaymentFactory(state="PENDING")
+	already_paid = PaymentFactory(state="PAID", order__state="PAID")
+	no_pending = OrderFactory()
+
+	results = settle_outcomes([
+		{"order_id": paid.order_id, "status": "paid"},
+		{"order_id": failed.order_id, "status": "failed"},
+		{"order_id": already_paid.order_id, "status": "paid"},
+		{"order_id": already_paid.order_id, "status": "failed"},
+		{"order_id": no_pending.id, "status": "paid"},
+		{"order_id": 999999, "status": "paid"},
+	])
+
+	assert [r["result"] for r in results] == ["paid", "failed", "already_paid", "conflict", "no_pending", "not_found"]
+	paid.refresh_from_db()
+	failed.refresh_from_db()
+	assert paid.state == "PAID" and paid.order.state == "PAID"
+	assert failed.state == "FAILED" and failed.order.state == "CANCELLED"
+	assert paid.order.history.first().state == "PAID"
+	assert failed.history.first().state == "FAILED"
+
+
+@pytest.mark.django_db
+def test_settle_outcomes_duplicates_in_batch():
+	payment = PaymentFactory(state="PENDING")
+	results = settle_outcomes([
+		{"order_id": payment.order_id, "status": "paid"},
+		{"order_id": payment.order_id, "status": "paid"},
+		{"order_id": payment.order_id, "status": "failed"},
+	])
+	assert [r["result"] for r in results] == ["paid", "already_paid", "conflict"]
+	assert Receipt.objects.filter(payment=payment).count() == 1
+
+
+@pytest.mark.django_db
+def test_settle_outcomes_bulk_receipts_and_stock(settings, django_assert_max_num_queries):
+	settings.PAYMENT_WEBHOOK_CHUNK_SIZE = 50
+	stock = StockFactory(quantity=500)
+	payments = []
+	for _ in range(120):
+		order = OrderFactory(pos=stock.pos)
+		OrderItemFactory(order=order, product=stock.product, quantity=2)
+		reservations.reserve(order, {stock.product_id: 2}, lambda: {stock.product_id: stock.quantity})
+		payments.append(PaymentFactory(order=order, state="PENDING"))
+
+	# Количество запросов зависит от числа чанков, а не заказов
+	with django_assert_max_num_queries(60):
+		results = settle_outcomes([{"order_id": p.order_id, "status": "paid"} for p in payments])
+
+	assert {r["result"] for r in results} == {"paid"}
+	assert Order.objects.filter(state="PAID").count() == 120
+	assert Payment.objects.filter(state="PAID").count() == 120
+	receipt = Receipt.objects.get(payment=payments[0])
+	assert receipt.fiscal_data == [{"name": stock.product.name, "qty": 2, "price": 100.0}]
+	stock.refresh_from_db()
+	assert stock.current_quantity == 260
+
+
+@pytest.mark.django_db
+def test_mark_payments_batch_view(webhook_client):
+	payment = PaymentFactory(state="PENDING")
+	url = reverse("mark-payments-batch")
+	res = webhook_client.post(url, {"outcomes": [
+		{"order_id": payment.order_id, "status": "paid"},
+		{"order_id": 999999, "status": "failed"},
+	]}, format="json")
+	assert res.status_code == 200
+	assert res.json()["results"] == [
+		{"order_id": payment.order_id, "result": "paid"},
+		{"order_id": 999999, "result": "not_found"},
+	]
+
+
+@pytest.mark.django_db
+def test_mark_payments_batch_view_invalid(webhook_client):
+	url = reverse("mark-payments-batch")
+	res = webhook_client.post(url, {"outcomes": [{"order_id": 1, "status": "unknown"}]}, format="json")
+	assert res.status_code == 400
+	res = webhook_client.post(url, {"outcomes": []}, format="json")
+	assert res.status_code == 400
@@ -0,0 +1,128 @@
+import re
+import random
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.utils.reports import build_daily_report
+from pos import archival, expiry, rollups
+from pos.models import Order, OrderItem, Payment
+from pos.tests.factories import PointOfSaleFactory, ProductFactory
+
+pytestmark = pytest.mark.skipif(
+	connection.vendor not in ("postgresql", "sqlite"), reason="Планы запросов проверяются на PostgreSQL и SQLite"
+)
+
+LARGE_TABLES = {"pos_order", "pos_payment", "pos_orderitem"}
+ORDERS = 20000
+DAYS = 60
+
+
+def seed():
+	"""20 точек и 20 000 заказов за 60 дней: открыт 1%, остальные закрыты, как в проде."""
+	rng = random.Random(1)
+	points = [PointOfSaleFactory() for _ in range(20)]
+	products = [ProductFactory() for _ in range(50)]
+	states = rng.choices(
+		[Order.OrderState.CREATED, Order.OrderState.PAID, Order.OrderState.CANCELLED, Order.OrderState.ARCHIEVE],
+		weights=[1, 80, 10, 9],
+		k=ORDERS,
+	)
+	orders = Order.objects.bulk_create(
+		[Order(pos=rng.choice(points), state=state, total_price=100) for state in states], batch_size=2000
+	)
+	payment_states = {
+		Order.OrderState.CREATED: Payment.PaymentState.PENDING,
+		Order.OrderState.PAID: Payment.PaymentState.PAID,
+	}
+	Payment.objects.bulk_create([
+		Payment(order=order, type="card", state=payment_states.get(order.state, Payment.PaymentState.FAILED))
+		for order in orders
+	], batch_size=2000)
+	OrderItem.objects.bulk_create([
+		OrderItem(order=order, product=rng.choice(products), quantity=1, price=100, total_price=100) for order in orders
+	], batch_size=2000)
+
+	now = timezone.now()
+	ids = [order.id for order in orders]
+	for day in range(DAYS):
+		Order.objects.filter(id__in=ids[day::DAYS]).update(
+			created_at=now - timedelta(days=day, minutes=5),
+			expires_at=now - timedelta(days=day),
+		)
+	with connection.cursor() as cursor:
+		cursor.execute("ANALYZE")
+	return points, [order for order in orders if order.state == Order.OrderState.CREATED]
+
+
+def explain(sql):
+	with connection.cursor() as cursor:
+		if connection.vendor == "postgresql":
+			# На 20 000 строк полный проход дешевле индекса, а проверяется наличие индексного пути.
+			# Без подходящего индекса PostgreSQL всё равно выберет Seq Scan
+			cursor.execute("SET LOCAL enable_seqscan = off")
+			cursor.execute(f"EXPLAIN {sql}")
+		else:
+			cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+		return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+
+def full_scans(plan):
+	if connection.vendor == "postgresql":
+		return set(re.findall(r"Seq Scan on (\w+)", plan)) & LARGE_TABLES
+	return set(re.findall(r"\bSCAN (\w+)(?!\s+USING)", plan)) & LARGE_TABLES
+
+
+def assert_index_scans(queries):
+	checked = 0
+	for query in queries:
+		sql = query["sql"]
+		if not re.match(r"\s*(SELECT|UPDATE|DELETE|WITH)\b", sql, re.I):
+			continue
+		if not any(f'"{table}"' in sql for table in LARGE_TABLES):
+			continue
+		plan = explain(sql)
+		assert not full_scans(plan), f"Полный проход таблицы:\n{sql}\n{plan}"
+		checked += 1
+	assert checked, "Ни одного запроса к большим таблицам"
+
+
+@pytest.mark.django_db
+def test_payment_endpoints_use_indexes(auth_client, api_client, webhook_client):
+	_, open_orders = seed()
+	orders = open_orders[:4]
+	with CaptureQueriesContext(connection) as ctx:
+		auth_client.post(reverse("create-payment"), {"order_id": orders[0].id, "payment_type": "sbp"}, format="json")
+		auth_client.get(reverse("order-status", args=[orders[0].id]))
+		api_client.post(reverse("mark-payment-paid"), {"order_id": orders[1].id}, format="json")
+		api_client.post(reverse("mark-payment-failed"), {"order_id": orders[2].id}, format="json")
+		webhook_client.post(reverse("mark-payments-batch"), {"outcomes": [
+			{"order_id": orders[3].id, "status": "paid"},
+			{"order_id": orders[1].id, "status": "paid"},
+		]}, format="json")
+	assert_index_scans(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_archival_queries_use_indexes():
+	_, open_orders = seed()
+	for order in open_orders[:10]:
+		order.expires_at = timezone.now() - timedelta(seconds=1)
+		expiry.schedule(order)
+	with CaptureQueriesContext(connection) as ctx:
+		expiry.expire_due()
+		archival.archive_created_orders(batch_size=50)
+	assert_index_scans(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_report_queries_use_indexes():
+	points, _ = seed()
+	today = timezone.localdate()
+	with CaptureQueriesContext(connection) as ctx:
+		rollups.rebuild(today - timedelta(days=1), today, [points[0].id])
+		rollups.rebuild(today, today)
+		build_daily_report(today - timedelta(days=6), today, [point.id for point in points[:3]])
+	assert_index_scans(ctx.captured_queries)
@@ -0,0 +1,94 @@
+import pytest
+from datetime import timedelta
+from django.conf import settings as django_settings
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from core import tasks
+from core.utils import querystats
+from core.utils.querystats import QueryBudget, signature, take_violations, track
+from pos import expiry, ledger, reservations
+from pos.models import Order
+from pos.tests.factories import OrderFactory, PaymentFactory, PointOfSaleFactory, ProductFactory, StockFactory
+
+
+def test_signature_collapses_lists():
+	assert signature('SELECT 1 FROM "t" WHERE "id" IN (%s, %s, %s)') == signature('SELECT 1 FROM "t" WHERE "id" IN (%s)')
+	assert signature('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)') == 'INSERT INTO "t" ("a", "b") VALUES (...)'
+
+
+@pytest.mark.django_db
+def test_track_counts_queries_and_duplicates():
+	products = [ProductFactory() for _ in range(3)]
+	with track() as stats:
+		for product in products:
+			product.refresh_from_db()
+	assert stats.count == 3
+	assert stats.time_ms > 0
+	assert list(stats.duplicates.values()) == [3]
+
+
+@pytest.mark.django_db
+def test_budget_exceeded_is_collected():
+	products = [ProductFactory() for _ in range(3)]
+	with track() as stats:
+		for product in products:
+			product.refresh_from_db()
+	problems = querystats.check("products", QueryBudget(2), stats)
+	assert problems[0] == "3 queries, budget 2"
+	assert len(problems) == 2
+	assert take_violations() == [f"products: {'; '.join(problems)}"]
+	assert querystats.check("products", QueryBudget(3, duplicates=True), stats) == []
+
+
+@pytest.mark.django_db
+def test_request_budget_and_header(auth_client, settings):
+	settings.QUERY_STATS_HEADER = True
+	order = OrderFactory()
+	res = auth_client.get(reverse("order-status", args=[order.id]))
+	assert int(res["X-DB-Queries"]) >= 1
+	assert float(res["X-DB-Time"]) >= 0
+	assert res["X-DB-Duplicates"] == "0"
+
+
+@pytest.mark.django_db
+def test_request_over_budget_fails(auth_client, monkeypatch):
+	from api import views
+
+	monkeypatch.setattr(views.order_status, "query_budget", QueryBudget(0))
+	order = OrderFactory()
+	auth_client.get(reverse("order-status", args=[order.id]))
+	assert take_violations()[0].startswith("order-status: ")
+
+
+def test_header_disabled_by_default(client):
+	assert not django_settings.QUERY_STATS_HEADER
+	assert "X-DB-Queries" not in client.get(reverse("health-live"))
+
+
+def test_every_api_view_and_task_has_budget():
+	api = [pattern for pattern in get_resolver().url_patterns if str(pattern.pattern) == "api/"][0]
+	views = {pattern.name: pattern.callback for pattern in api.url_patterns if pattern.name != "order-events"}
+	assert [name for name, view in views.items() if not hasattr(view, "query_budget")] == []
+	names = {entry["task"] for entry in django_settings.CELERY_BEAT_SCHEDULE.values()} | {"send_notification"}
+	assert [name for name in names if not hasattr(getattr(tasks, name).run, "query_budget")] == []
+
+
+@pytest.mark.django_db
+def test_scheduled_tasks_stay_within_budget(settings):
+	settings.TELEGRAM_BOT_TOKEN = ""
+	pos = PointOfSaleFactory()
+	stocks = [StockFactory(pos=pos, product=ProductFactory(), quantity=10) for _ in range(5)]
+	for stock in stocks:
+		order = OrderFactory(pos=pos, state="CREATED", expires_at=timezone.now() - timedelta(minutes=1))
+		PaymentFactory(order=order, state="PENDING")
+		reservations.reserve(order, {stock.product_id: 1}, lambda: {stock.product_id: 10})
+		ledger.record_sales({(stock.id, order.id): 1})
+		expiry.schedule(order)
+
+	names = [entry["task"] for entry in settings.CELERY_BEAT_SCHEDULE.values()]
+	# Сначала истечение по расписанию, иначе заказы заберёт страховочная архивация
+	for name in sorted(names, key=lambda name: name != "expire_due_orders"):
+		getattr(tasks, name).apply().get()
+
+	assert Order.objects.filter(state="ARCHIEVE").count() == 5
+	assert take_violations() == []
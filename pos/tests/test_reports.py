@@ -1,16 +1,116 @@
 import pytest
-from core.utils.reports import build_daily_report
-from pos.tests.factories import OrderFactory, OrderItemFactory, PointOfSaleFactory
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from core.utils.reports import build_daily_report, local_day_range
+from pos import rollups
+from pos.checkout import create_order
+from pos.flow import OrderFlow
+from pos.models import Order, PosDailySales, ProductDailySales
+from pos.tests.factories import OrderFactory, OrderItemFactory, PointOfSaleFactory, StockFactory
 
 @pytest.mark.django_db
-def test_build_daily_report_counts_and_pos():
+def test_build_daily_report_counts_and_pos(django_capture_on_commit_callbacks):
 	pos1 = PointOfSaleFactory(name="POS A")
 	pos2 = PointOfSaleFactory(name="POS B")
-	order1 = OrderFactory(pos=pos1, state="PAID")
-	OrderItemFactory(order=order1, total_price=200)
-	order2 = OrderFactory(pos=pos2, state="CANCELLED")
-	OrderItemFactory(order=order2, total_price=100)
+	with django_capture_on_commit_callbacks(execute=True):
+		order1 = OrderFactory(pos=pos1, state="PAID")
+		OrderItemFactory(order=order1, total_price=200)
+		order2 = OrderFactory(pos=pos2, state="CANCELLED")
+		OrderItemFactory(order=order2, total_price=100)
 	report = build_daily_report()
 	assert report["total_orders"] == 2
 	assert report["total_paid"] == 1
 	assert any("POS A" in s["pos_name"] for s in report["pos_stats"])
+
+
+@pytest.mark.django_db
+def test_build_daily_report_query_count(django_assert_num_queries, django_capture_on_commit_callbacks):
+	with django_capture_on_commit_callbacks(execute=True):
+		for _ in range(5):
+			pos = PointOfSaleFactory()
+			OrderItemFactory(order=OrderFactory(pos=pos, state="PAID", total_price=100))
+			OrderFactory(pos=pos, state="CANCELLED")
+	with django_assert_num_queries(2):
+		report = build_daily_report()
+	assert report["total_orders"] == 10
+	assert report["total_paid"] == 5
+	assert report["total_cancelled"] == 5
+	assert report["total_revenue"] == 500
+	assert report["cancel_pct"] == 50.0
+	assert len(report["pos_stats"]) == 5
+
+
+@pytest.mark.django_db
+def test_build_daily_report_range_and_pos_subset():
+	pos1 = PointOfSaleFactory(name="POS A")
+	pos2 = PointOfSaleFactory(name="POS B")
+	today = timezone.localdate()
+	old = OrderFactory(pos=pos1, state="PAID", total_price=300)
+	start, _ = local_day_range(today - timedelta(days=1))
+	Order.objects.filter(id=old.id).update(created_at=start)
+	OrderFactory(pos=pos1, state="PAID", total_price=100)
+	OrderFactory(pos=pos2, state="PAID", total_price=50)
+	rollups.rebuild(today - timedelta(days=1), today)
+
+	report = build_daily_report(pos_ids=[pos1.id])
+	assert report["total_orders"] == 1
+	assert report["total_revenue"] == 100
+
+	report = build_daily_report(date=today - timedelta(days=1), end_date=today, pos_ids=[pos1.id])
+	assert report["total_orders"] == 2
+	assert report["total_revenue"] == 400
+	assert [s["pos_name"] for s in report["pos_stats"]] == ["POS A"]
+
+	report = build_daily_report(date=today - timedelta(days=2))
+	assert report["total_orders"] == 0
+	assert report["pos_lines"] == "Нет заказов по POS"
+
+
+@pytest.mark.django_db
+def test_rollups_follow_transitions(django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=10, product__price=Decimal("25.00"))
+	with django_capture_on_commit_callbacks(execute=True):
+		order = create_order(stock.pos, [{"barcode": stock.product.barcode, "quantity": 2}])
+		cancelled = create_order(stock.pos, [{"barcode": stock.product.barcode, "quantity": 1}])
+	with django_capture_on_commit_callbacks(execute=True):
+		OrderFlow(order).mark_paid()
+		OrderFlow(cancelled).mark_cancelled()
+
+	sales = PosDailySales.objects.get(pos=stock.pos)
+	assert (sales.orders, sales.created, sales.paid, sales.cancelled) == (2, 0, 1, 1)
+	assert sales.revenue == Decimal("50.00")
+	assert sales.units == 2
+	product_sales = ProductDailySales.objects.get(product=stock.product)
+	assert (product_sales.orders, product_sales.units, product_sales.revenue) == (1, 2, Decimal("50.00"))
+
+	with django_capture_on_commit_callbacks(execute=True):
+		OrderFlow(order).mark_cancelled()
+	sales.refresh_from_db()
+	assert (sales.paid, sales.cancelled, sales.revenue, sales.units) == (0, 2, 0, 0)
+
+	before = list(PosDailySales.objects.values())
+	call_command("rebuild_sales_rollups", stdout=StringIO())
+	assert list(PosDailySales.objects.values("orders", "paid", "cancelled", "revenue", "units")) == [
+		{k: before[0][k] for k in ("orders", "paid", "cancelled", "revenue", "units")}
+	]
+
+	report = build_daily_report()
+	assert report["total_orders"] == 2
+	assert report["total_cancelled"] == 2
+	assert report["top_lines"] == "Нет продаж"
+
+
+@pytest.mark.django_db
+def test_rollups_written_after_commit(django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=10, product__price=Decimal("25.00"))
+	with django_capture_on_commit_callbacks() as callbacks:
+		order = create_order(stock.pos, [{"barcode": stock.product.barcode, "quantity": 2}])
+		OrderFlow(order).mark_paid()
+		assert not PosDailySales.objects.filter(pos=stock.pos).exists()
+	for callback in callbacks:
+		callback()
+	sales = PosDailySales.objects.get(pos=stock.pos)
+	assert (sales.orders, sales.created, sales.paid, sales.revenue) == (1, 0, 1, Decimal("50.00"))
@@ -0,0 +1,143 @@
+import time
+import pytest
+from django.urls import reverse
+from pos import ledger, reservations
+from pos.checkout import CheckoutError, create_order
+from pos.flow import OrderFlow
+from pos.models import Order, Stock, StockMovement
+from pos.tests.factories import PaymentFactory, StockFactory
+from core.tasks import archive_created_orders, rebuild_reservation_counters, release_expired_reservations
+from core.utils.redis_client import get_redis
+
+
+def reserved(stock):
+	return reservations.reserved_quantities(stock.pos_id, [stock.product_id])[stock.product_id]
+
+
+def place_order(stock, quantity=2):
+	return create_order(stock.pos, [{"barcode": stock.product.barcode, "quantity": quantity}])
+
+
+@pytest.mark.django_db
+def test_hold_converted_on_payment(api_client, django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=10)
+	order = place_order(stock)
+	PaymentFactory(order=order)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		res = api_client.post(reverse("mark-payment-paid"), {"order_id": order.id})
+	assert res.status_code == 200
+
+	stock.refresh_from_db()
+	assert stock.quantity == 10
+	assert stock.current_quantity == 8
+	assert stock.movements.get().kind == StockMovement.MovementKind.SALE
+	assert reserved(stock) == 0
+
+
+@pytest.mark.django_db
+def test_hold_released_on_payment_failure(api_client, django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=10)
+	order = place_order(stock)
+	PaymentFactory(order=order)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		api_client.post(reverse("mark-payment-failed"), {"order_id": order.id})
+
+	stock.refresh_from_db()
+	assert stock.quantity == 10
+	assert reserved(stock) == 0
+
+
+@pytest.mark.django_db
+def test_hold_released_on_archive(settings, django_capture_on_commit_callbacks):
+	settings.ORDER_TTL = 0
+	stock = StockFactory(quantity=10)
+	place_order(stock)
+	assert reserved(stock) == 2
+
+	with django_capture_on_commit_callbacks(execute=True):
+		archive_created_orders()
+	assert reserved(stock) == 0
+
+
+@pytest.mark.django_db
+def test_expired_holds_released_by_sweeper(settings):
+	stock = StockFactory(quantity=10)
+	settings.RESERVATION_TTL = 0
+	place_order(stock)
+	settings.RESERVATION_TTL = 900
+	fresh = place_order(stock, quantity=3)
+	time.sleep(0.01)
+
+	release_expired_reservations()
+	assert reserved(stock) == 3
+	assert reservations.release([fresh.id]) == [fresh.id]
+	assert reservations.release([fresh.id]) == []
+	assert reserved(stock) == 0
+
+
+@pytest.mark.django_db
+def test_paid_after_expiry_still_takes_stock(django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=10)
+	order = place_order(stock)
+	reservations.release([order.id])
+
+	with django_capture_on_commit_callbacks(execute=True):
+		OrderFlow(order).mark_paid()
+
+	stock.refresh_from_db()
+	assert stock.current_quantity == 8
+	assert reserved(stock) == 0
+
+
+@pytest.mark.django_db
+def test_paid_after_expiry_flags_oversold_stock(django_capture_on_commit_callbacks):
+	stock = StockFactory(quantity=3)
+	order = place_order(stock, quantity=3)
+	reservations.release([order.id])
+	Stock.objects.filter(id=stock.id).update(quantity=2)
+
+	with django_capture_on_commit_callbacks(execute=True):
+		OrderFlow(order).mark_paid()
+
+	stock.refresh_from_db()
+	assert stock.current_quantity == -1
+	assert stock.oversold
+
+
+@pytest.mark.django_db
+def test_counters_rebuilt_from_live_holds():
+	stock = StockFactory(quantity=10)
+	order = place_order(stock, quantity=3)
+	redis = get_redis()
+	redis.set(reservations._counter_key(stock.pos_id, stock.product_id), 7)
+	redis.set(reservations._counter_key(stock.pos_id, 0), 5)
+
+	rebuild_reservation_counters()
+	assert reserved(stock) == 3
+	assert not redis.exists(reservations._counter_key(stock.pos_id, 0))
+	assert reservations.rebuild_counters() == 0
+
+	reservations.release([order.id])
+	assert reserved(stock) == 0
+	assert reservations.rebuild_counters() == 0
+
+
+@pytest.mark.django_db
+def test_sale_paid_before_reserve_is_not_oversold(monkeypatch):
+	stock = StockFactory(quantity=2)
+	paid = place_order(stock)
+	reserve = reservations.reserve
+
+	def pay_then_reserve(order, quantities, available):
+		# Первый заказ оплачен, пока второй собирается: продажа записана, удержание снято
+		ledger.record_sales({(stock.id, paid.id): 2})
+		reservations.release([paid.id])
+		return reserve(order, quantities, available)
+
+	monkeypatch.setattr(reservations, "reserve", pay_then_reserve)
+	with pytest.raises(CheckoutError):
+		place_order(stock)
+	assert reserved(stock) == 0
+	assert not Order.objects.exclude(id=paid.id).exists()
@@ -1,10 +1,63 @@
+from datetime import timedelta
 import pytest
+from django.utils import timezone
 from core.tasks import archive_created_orders
-from pos.tests.factories import OrderFactory
+from pos import archival
+from pos.models import Order, Payment
+from pos.tests.factories import OrderFactory, PaymentFactory
+
+
+def expired():
+	return timezone.now() - timedelta(minutes=1)
+
 
 @pytest.mark.django_db
 def test_archive_created_orders_archives():
-	order = OrderFactory(state="CREATED")
+	order = OrderFactory(state="CREATED", expires_at=expired())
 	archive_created_orders()
 	order.refresh_from_db()
 	assert order.state == "ARCHIEVE"
+
+
+@pytest.mark.django_db
+def test_archive_created_orders_batches():
+	paid = OrderFactory(state="PAID")
+	live = OrderFactory(state="CREATED", expires_at=timezone.now() + timedelta(minutes=5))
+	orders = [OrderFactory(state="CREATED", expires_at=expired()) for _ in range(7)]
+	payments = [PaymentFactory(order=order, state="PENDING") for order in orders[:3]]
+
+	stats = archival.archive_created_orders(batch_size=3)
+
+	assert stats["orders"] == 7
+	assert stats["payments"] == 3
+	assert stats["batches"] == 3
+	assert Order.objects.filter(state="ARCHIEVE").count() == 7
+	assert set(Payment.objects.values_list("state", flat=True)) == {"FAILED"}
+	paid.refresh_from_db()
+	assert paid.state == "PAID"
+	live.refresh_from_db()
+	assert live.state == "CREATED"
+	assert orders[0].history.first().state == "ARCHIEVE"
+	assert payments[0].history.first().state == "FAILED"
+
+
+@pytest.mark.django_db
+def test_archive_created_orders_query_count(django_assert_max_num_queries):
+	for _ in range(50):
+		PaymentFactory(state="PENDING", order__expires_at=expired())
+	with django_assert_max_num_queries(25):
+		stats = archival.archive_created_orders(batch_size=25)
+	assert stats["orders"] == 50
+
+
+@pytest.mark.django_db
+def test_archive_created_orders_without_expiry(settings):
+	settings.ORDER_TTL = 600
+	stale = OrderFactory(state="CREATED")
+	Order.objects.filter(id=stale.id).update(created_at=timezone.now() - timedelta(minutes=11))
+	fresh = OrderFactory(state="CREATED")
+	archive_created_orders()
+	stale.refresh_from_db()
+	fresh.refresh_from_db()
+	assert stale.state == "ARCHIEVE"
+	assert fresh.state == "CREATED"
@@ -89,10 +89,21 @@ def test_create_order_insufficient_stock(auth_client):
     stock = StockFactory(pos=pos, product=product, quantity=0, is_active=True)
     url = reverse("create-order")
     res = auth_client.post(url, {"pos_code": pos.code, "order": [{"barcode": product.barcode, "quantity": 1}]}, format="json")
-    assert res.status_code == status.HTTP_200_OK
-    data = res.json()
-    assert "order_id" in data
-    assert "total_price" in data
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    assert res.json() == {"error": f"Недостаточно товара {product.name}"}
+    stock.refresh_from_db()
+    assert stock.quantity == 0
+
+
+@pytest.mark.django_db
+def test_create_order_inactive_stock(auth_client):
+    pos = PointOfSaleFactory()
+    product = ProductFactory()
+    StockFactory(pos=pos, product=product, quantity=10, is_active=False)
+    url = reverse("create-order")
+    res = auth_client.post(url, {"pos_code": pos.code, "order": [{"barcode": product.barcode, "quantity": 1}]}, format="json")
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    assert res.json() == {"error": f"Недостаточно товара {product.name}"}
 
 
 @pytest.mark.django_db
@@ -107,7 +118,9 @@ def test_create_order_success(auth_client):
 	assert "order_id" in data
 	assert data["total_price"] == Decimal(product.price * 2)
 	stock.refresh_from_db()
-	assert stock.quantity == 8
+	assert stock.quantity == 10
+	res = auth_client.get(reverse("product-by-barcode", args=[product.barcode]), {"pos_code": pos.code})
+	assert res.json()["quantity"] == 8
 
 
 @pytest.mark.django_db
@@ -269,6 +282,24 @@ def test_mark_payment_failed_order_not_found(api_client):
 	assert res.json()["error"] == "Заказ не найден"
 
 
+@pytest.mark.django_db
+def test_batch_webhook_requires_signature(webhook_client, settings):
+	order = OrderFactory()
+	payment = PaymentFactory(order=order, state="PENDING")
+	url = reverse("mark-payments-batch")
+	outcomes = {"outcomes": [{"order_id": order.id, "status": "paid"}]}
+	res = webhook_client.post(url, outcomes, format="json", HTTP_X_SIGNATURE="0" * 64)
+	assert res.status_code == status.HTTP_403_FORBIDDEN
+	res = webhook_client.post(url, outcomes, format="json", HTTP_X_SIGNATURE="")
+	assert res.status_code == status.HTTP_403_FORBIDDEN
+
+	settings.PAYMENT_WEBHOOK_SECRET = ""
+	res = webhook_client.post(url, outcomes, format="json")
+	assert res.status_code == status.HTTP_403_FORBIDDEN
+	payment.refresh_from_db()
+	assert payment.state == "PENDING"
+
+
 @pytest.mark.django_db
 def test_order_status_success(auth_client):
 	order = OrderFactory(state="NEW")
@@ -283,3 +314,57 @@ def test_order_status_not_found(auth_client):
 	res = auth_client.get(url)
 	assert res.status_code == status.HTTP_404_NOT_FOUND
 	assert res.json()["error"] == "Заказ не найден"
+
+
+@pytest.mark.django_db
+def test_product_batch_statuses(auth_client):
+	pos = PointOfSaleFactory()
+	stock = StockFactory(pos=pos, quantity=5)
+	inactive = StockFactory(pos=pos, is_active=False)
+	url = reverse("product-batch")
+	res = auth_client.post(url, {"pos_code": pos.code, "barcodes": [stock.product.barcode, inactive.product.barcode, "missing"]}, format="json")
+	assert res.status_code == status.HTTP_200_OK
+	results = res.json()["results"]
+	assert [r["status"] for r in results] == ["found", "unavailable", "unavailable"]
+	assert results[0]["product"]["name"] == stock.product.name
+	assert results[0]["product"]["category"] == stock.product.category.name
+	assert results[0]["product"]["quantity"] == 5
+
+
+@pytest.mark.django_db
+def test_product_batch_single_query(auth_client, django_assert_num_queries):
+	pos = PointOfSaleFactory()
+	barcodes = [StockFactory(pos=pos).product.barcode for _ in range(20)]
+	url = reverse("product-batch")
+	auth_client.post(url, {"pos_code": pos.code, "barcodes": barcodes[:1]}, format="json")
+	with django_assert_num_queries(1):
+		res = auth_client.post(url, {"pos_code": pos.code, "barcodes": barcodes}, format="json")
+	assert all(r["status"] == "found" for r in res.json()["results"])
+
+
+@pytest.mark.django_db
+def test_product_batch_pos_not_found(auth_client):
+	url = reverse("product-batch")
+	res = auth_client.post(url, {"pos_code": "invalid", "barcodes": ["1"]}, format="json")
+	assert res.status_code == status.HTTP_404_NOT_FOUND
+	assert res.json() == {"error": "Точка продаж не найдена"}
+
+
+@pytest.mark.django_db
+def test_product_batch_too_many_barcodes(auth_client):
+	pos = PointOfSaleFactory()
+	url = reverse("product-batch")
+	res = auth_client.post(url, {"pos_code": pos.code, "barcodes": [str(i) for i in range(301)]}, format="json")
+	assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_async_reads_require_auth(api_client):
+	order = OrderFactory()
+	res = api_client.get(reverse("order-status", args=[order.id]))
+	assert res.status_code == status.HTTP_403_FORBIDDEN
+	res = api_client.get(reverse("order-status", args=[order.id]), HTTP_AUTHORIZATION="Token invalid")
+	assert res.status_code == status.HTTP_403_FORBIDDEN
+	assert res.json() == {"detail": "Токен недействителен"}
+	res = api_client.post(reverse("product-by-barcode", args=["1"]))
+	assert res.status_code == status.HTTP_405_METHOD_NOT_ALLOWED